@@ -1,3 +1,3 @@
 from face_track.mockdjitellopy import Tello
-from face_track.pid import PID
+from face_track.pid import PID, PIDBank
 from face_track.tracker import FaceTracker
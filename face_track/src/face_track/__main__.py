@@ -1,49 +1,310 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import argparse
 import re
+import signal
 import sys
+from typing import Optional
 
 import cv2
 
-from face_track import tracker
+from face_track import (analyze, pipeline, pool, profiler, simulator, tracker,
+                        tune)
+from face_track.detector import DETECTORS
+from face_track.mockdjitellopy import Tello as MockTello
+from face_track.source import PACINGS
 
 request_run: bool = True
 
 
-def main(args=None) -> int:
-    """The main routine."""
-    if args is None:
-        args = sys.argv[1:]
+def stop_run(*args) -> None:
+    """Stop the main loop, e.g. on a signal or a POST to the preview /stop"""
+    global request_run
+    request_run = False
 
-    print(f"OpenCV version: {cv2.__version__}")
-    cv_info = [
-        re.sub('\s+', ' ', ci.strip())
-        for ci in cv2.getBuildInformation().strip().split('\n')
-        if len(ci) > 0 and re.search(r'(nvidia*:?)|(cuda*:)|(cudnn*:)',
-                                     ci.lower()) is not None
-    ]
-    if cv_info:
-        print(cv_info)
-
-    alpha = tracker.FaceTracker()
-    alpha.startVideoRecord()
+
+def run(alpha: tracker.FaceTracker,
+        profile: Optional[profiler.Profile] = None,
+        display: bool = True) -> None:
+    """Run capture, detect, control and render in sequence on one thread.
+    While profiling, the frames are not shown, waitKey would dominate.
+    """
+    frames = 0
     while request_run:
         img = alpha.readFrame()
+        if img is None:
+            if alpha.getFrameRead().stopped:
+                break  # end of the video source
+            continue
         img, info = alpha.findFace(img)
         alpha.trackFace(info)
-        alpha.putPID(img)
-        alpha.putFPS(img)
-        alpha.putBattery(img)
-        alpha.putTemperature(img)
-        alpha.putFlight(img)
+        with alpha.tracer.span('hud', alpha.frame_seq):
+            alpha.putHud(img)
         alpha.setAnnotatedImage(img)
-        cv2.imshow("Alpha Drone", img)
-        if cv2.waitKey(1) != -1:
+        frames += 1
+        if profile is not None:
+            if not profile.keep_running(frames):
+                break
+        if not display:
+            continue
+        with alpha.tracer.span('display', alpha.frame_seq):
+            cv2.imshow("Alpha Drone", img)
+            key = cv2.waitKey(1)
+        if key != -1:
             break
 
-    cv2.destroyAllWindows()
-    alpha.end()
+
+def keep_running(p: pipeline.Pipeline,
+                 profile: Optional[profiler.Profile]) -> bool:
+    """Return False when the pipeline processed the frames to profile"""
+    return profile is None or profile.keep_running(p.control_q.put_count)
+
+
+def main(args=None) -> int:
+    """The main routine."""
+    if args is None:
+        args = sys.argv[1:]
+    if args and args[0] == "analyze":
+        return analyze.main(args[1:])
+    if args and args[0] == "tune":
+        return tune.main(args[1:])
+    if args and args[0] == "simulate":
+        return simulator.main(args[1:])
+    if args and args[0] == "framebus":
+        # imported on use, multiprocessing.shared_memory needs Python 3.8
+        from face_track import framebus
+        return framebus.main(args[1:])
+
+    parser = argparse.ArgumentParser(
+        prog="face_track",
+        description="Tello control to track human face",
+        epilog="face_track analyze --help: detect faces in recorded videos, "
+        "face_track tune --help: rank PID gains for a flight log, "
+        "face_track simulate --help: run a Tello simulator on local UDP ports, "
+        "face_track framebus --help: read the frames of --frame-bus")
+    parser.add_argument(
+        "--build-info",
+        action="store_true",
+        help="print the OpenCV version and its GPU support, then exit")
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="run capture, detect, control and render on separate threads")
+    parser.add_argument(
+        "--roi",
+        action="store_true",
+        help="search faces around the last detected face, not the full frame")
+    parser.add_argument(
+        "--detect-every",
+        type=int,
+        default=1,
+        metavar="N",
+        help="run the face detector every N frames, track the face in between")
+    parser.add_argument(
+        "--detect-scale",
+        type=float,
+        default=1.0,
+        metavar="S",
+        help="run the face detector on an image downscaled by S, e.g. 0.5")
+    parser.add_argument("--detector",
+                        default="haar",
+                        choices=sorted(DETECTORS),
+                        help="the face detector backend")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        metavar="N",
+        help="detect faces on N worker processes, implies --pipeline")
+    parser.add_argument(
+        "--mock",
+        action="store_true",
+        help="fly the simulated Tello, its video is --source or the webcam")
+    parser.add_argument(
+        "--tello",
+        metavar="HOST[:PORT]",
+        help="fly the Tello at HOST, e.g. 127.0.0.1:9889 for face_track simulate")
+    parser.add_argument(
+        "--source",
+        help="video source instead of the Tello stream: tello, webcam:<index>, "
+        "a video file or an image directory")
+    parser.add_argument(
+        "--pacing",
+        default="original",
+        choices=PACINGS,
+        help="replay the source by its timestamps, at --fps, or unthrottled")
+    parser.add_argument("--fps",
+                        type=float,
+                        default=30.0,
+                        help="frame rate of fixed pacing and image directories")
+    parser.add_argument(
+        "--rc-rate",
+        type=float,
+        default=tracker.FaceTracker.RC_RATE,
+        metavar="HZ",
+        help="send the latest rc command HZ times per second")
+    parser.add_argument(
+        "--budget",
+        type=float,
+        metavar="MS",
+        help="adapt the detection settings to find faces within MS "
+        "milliseconds per frame, e.g. 33, overrides --detect-every and "
+        "--detect-scale")
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        help="write the latency spans of the frame stages to FILE.json, "
+        "a Chrome trace")
+    parser.add_argument(
+        "--profile",
+        choices=profiler.PROFILERS,
+        help="profile the main loop without display: sample the stacks of "
+        "all threads, or cProfile the main thread")
+    parser.add_argument("--profile-frames",
+                        type=int,
+                        default=0,
+                        metavar="N",
+                        help="stop the profiled run after N frames")
+    parser.add_argument(
+        "--profile-out",
+        metavar="FILE",
+        help="the profile output, default profile.folded (collapsed stacks) "
+        "or profile.prof (pstats)")
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="show no window, stop with SIGINT, SIGTERM or the preview stop")
+    parser.add_argument(
+        "--preview",
+        metavar="[HOST:]PORT",
+        help="serve the annotated frames as MJPEG over HTTP, "
+        "e.g. 8080 for http://127.0.0.1:8080/")
+    parser.add_argument("--preview-fps",
+                        type=float,
+                        default=5.0,
+                        help="frame rate of the preview stream")
+    parser.add_argument("--preview-quality",
+                        type=int,
+                        default=70,
+                        metavar="Q",
+                        help="JPEG quality of the preview stream, 0 to 100")
+    parser.add_argument(
+        "--frame-bus",
+        metavar="NAME",
+        help="publish the annotated frames and face boxes in the shared "
+        "memory NAME for other processes")
+    parser.add_argument(
+        "--log-flight",
+        metavar="FILE",
+        help="write the PID input and rc output of each control step to FILE.npz")
+    opts = parser.parse_args(args)
+
+    if opts.build_info:
+        print(f"OpenCV version: {cv2.__version__}")
+        cv_info = [
+            re.sub(r'\s+', ' ', ci.strip())
+            for ci in cv2.getBuildInformation().strip().split('\n')
+            if len(ci) > 0 and re.search(r'(nvidia*:?)|(cuda*:)|(cudnn*:)',
+                                         ci.lower()) is not None
+        ]
+        if cv_info:
+            print(cv_info)
+        return 0
+
+    drone, source = None, opts.source
+    if opts.mock:
+        drone = MockTello(source=opts.source or MockTello.VIDEO_SOURCE,
+                          pacing=opts.pacing,
+                          fps=opts.fps)
+        source = None
+    elif opts.tello:
+        host, _, port = opts.tello.partition(":")
+        drone = tracker.Tello(host=host, retry_count=1)
+        # djitellopy sends to the standard port, it binds 8889 itself
+        drone.address = (host, int(port or 8889))
+    alpha = tracker.FaceTracker(roi_search=opts.roi,
+                                detect_every=opts.detect_every,
+                                detect_scale=opts.detect_scale,
+                                detector=opts.detector,
+                                drone=drone,
+                                source=source,
+                                pacing=opts.pacing,
+                                fps=opts.fps,
+                                rc_rate=opts.rc_rate,
+                                budget=opts.budget / 1000
+                                if opts.budget else None)
+    if opts.budget and opts.workers:
+        tracker.FaceTracker.LOGGER.warning(
+            "--budget adapts the detection on the main process only, "
+            "not on the --workers")
+    alpha.startVideoRecord()
+    if opts.log_flight:
+        alpha.startFlightLog()
+    if opts.trace:
+        alpha.startTrace()
+    profile = None
+    if opts.profile:
+        profile = profiler.Profile(opts.profile, opts.profile_frames,
+                                   opts.profile_out)
+        if opts.profile == "cprofile" and (opts.pipeline or opts.workers):
+            tracker.FaceTracker.LOGGER.warning(
+                "cprofile sees the render thread only, use --profile sample")
+        profile.start()
+    if opts.frame_bus:
+        alpha.startFrameBus(opts.frame_bus)
+    if opts.preview:
+        host, _, port = opts.preview.rpartition(":")
+        alpha.startPreview(host=host or '127.0.0.1',
+                           port=int(port),
+                           fps=opts.preview_fps,
+                           quality=opts.preview_quality,
+                           on_stop=stop_run)
+    display = profile is None and not opts.headless
+    if opts.headless:
+        signal.signal(signal.SIGINT, stop_run)
+        signal.signal(signal.SIGTERM, stop_run)
+    try:
+        if opts.workers > 0:
+            with pool.DetectorPool(workers=opts.workers,
+                                   detector=opts.detector,
+                                   scale=opts.detect_scale,
+                                   ordered=False) as workers:
+                p = pipeline.Pipeline(alpha, workers, display)
+                p.run(lambda: request_run and keep_running(p, profile))
+        elif opts.pipeline:
+            p = pipeline.Pipeline(alpha, display=display)
+            p.run(lambda: request_run and keep_running(p, profile))
+        else:
+            run(alpha, profile, display)
+    except KeyboardInterrupt:
+        if profile is None:
+            raise
+    finally:
+        # stop the rc commands and land, also when the stream failed
+        alpha.end()
+    if profile is not None:
+        path, summary = profile.stop()
+        tracker.FaceTracker.LOGGER.info(
+            f"profile written to {path}\n{summary}")
+    tracker.FaceTracker.LOGGER.info(
+        f"hot path counters\n{profiler.hotpath_report()}")
+
+    if display:
+        cv2.destroyAllWindows()
+    for cost in alpha.path_cost.values():
+        tracker.FaceTracker.LOGGER.info(f"face {cost}")
+    if alpha.quality is not None:
+        tracker.FaceTracker.LOGGER.info(
+            f"quality {alpha.quality}, {alpha.quality.changes} changes")
+    if opts.log_flight:
+        alpha.flight_log.save(opts.log_flight)
+        tracker.FaceTracker.LOGGER.info(
+            f"{len(alpha.flight_log)} control steps written to {opts.log_flight}")
+    if opts.trace:
+        alpha.tracer.save(opts.trace)
+        tracker.FaceTracker.LOGGER.info(
+            f"trace written to {opts.trace}\n{alpha.tracer.report()}")
     return 0
 
 
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Adaptive detection quality, to hold a frame time budget.
+
+The cost of face detection depends on the scene and on the CPU clock, which
+drops when the CPU throttles with temperature. `QualityController` smooths
+the measured face finding time per frame and steps along a ladder of
+detection settings: down, to cheaper settings, while the smoothed time is
+over the budget, and back up when there is headroom.
+
+A step waits for the smoothed time to settle at the new setting, and going
+up waits longer than going down. When a step up goes over the budget again
+right away, the next step up waits twice as long, so the quality does not
+oscillate between two steps.
+"""
+import logging
+from typing import NamedTuple, Optional, Sequence
+
+
+class Quality(NamedTuple):
+    """The detection settings of a ladder step"""
+    scale: float  # the detection scale, see Detector.detect
+    scaleFactor: float  # the cascade image size reduction at each scale
+    margin: float  # the ROI window border, in units of the face size
+    every: int  # detect every N frames, track the face in between
+
+    def __str__(self) -> str:
+        return (f"scale {self.scale:.2f} factor {self.scaleFactor:.2f} "
+                f"margin {self.margin:.2f} every {self.every}")
+
+
+# from the best quality to the cheapest, each step cuts the detect time
+LADDER = (
+    Quality(1.0, 1.1, 1.0, 1),
+    Quality(1.0, 1.2, 1.0, 1),
+    Quality(1.0, 1.3, 1.0, 1),
+    Quality(0.75, 1.3, 0.75, 1),
+    Quality(0.75, 1.3, 0.75, 2),
+    Quality(0.5, 1.3, 0.5, 2),
+    Quality(0.5, 1.4, 0.5, 3),
+    Quality(0.5, 1.5, 0.5, 4),
+)
+
+
+class QualityController(object):
+    """Step the detection quality to hold the per frame face finding time
+    within a budget.
+
+    ```python
+    quality = QualityController(budget=0.033)
+    if quality.update(seconds) is not None:  # after each frame
+        apply(quality.quality)
+    ```
+    """
+    HANDLER = logging.StreamHandler()
+    FORMATTER = logging.Formatter(
+        '[%(levelname)s] %(filename)s - %(lineno)d - %(message)s')
+    HANDLER.setFormatter(FORMATTER)
+
+    LOGGER = logging.getLogger('adaptive')
+    LOGGER.addHandler(HANDLER)
+    LOGGER.setLevel(logging.INFO)
+
+    ALPHA: float = 0.1  # smoothing of the frame time
+    HEADROOM: float = 0.6  # step up below this fraction of the budget
+    DOWN_HOLD: int = 15  # frames at a step before stepping down
+    UP_HOLD: int = 90  # frames at a step before stepping up
+    MAX_UP_HOLD: int = 90 * 16  # the longest wait after failed steps up
+
+    def __init__(self,
+                 budget: float = 0.033,
+                 ladder: Sequence[Quality] = LADDER,
+                 level: int = 0) -> None:
+        """Initialize a QualityController instance
+        :param budget: the face finding time per frame in seconds
+        :param ladder: the quality steps, from the best to the cheapest
+        :param level: the initial step index in the ladder
+        :return: None
+        """
+        super().__init__()
+        self.budget: float = budget
+        self.ladder: Sequence[Quality] = ladder
+        self.level: int = max(0, min(level, len(ladder) - 1))
+        self.frame_time: float = 0.0  # smoothed seconds per frame
+        self.frames: int = 0  # frames measured at the current step
+        self.up_hold: int = QualityController.UP_HOLD
+        self.went_up: bool = False  # the last step was up
+        self.changes: int = 0
+
+    @property
+    def quality(self) -> Quality:
+        """The settings of the current step"""
+        return self.ladder[self.level]
+
+    def update(self, seconds: float) -> Optional[Quality]:
+        """Measure the face finding time of a frame
+        :param seconds: the time spent to find faces in the frame
+        :return: the settings of the new step, None if the step is unchanged
+        """
+        self.frames += 1
+        # exponential moving average, seeded by the first frame of a step
+        alpha = QualityController.ALPHA if self.frames > 1 else 1.0
+        self.frame_time += alpha * (seconds - self.frame_time)
+        if (self.frame_time > self.budget
+                and self.frames >= QualityController.DOWN_HOLD
+                and self.level < len(self.ladder) - 1):
+            return self.step(1)
+        if (self.frame_time < self.budget * QualityController.HEADROOM
+                and self.frames >= self.up_hold
+                and self.level > 0):
+            return self.step(-1)
+        return None
+
+    def step(self, delta: int) -> Quality:
+        frame_time = self.frame_time
+        if delta > 0 and self.went_up and self.frames < self.up_hold:
+            # the step up did not fit the budget, try it again later
+            self.up_hold = min(2 * self.up_hold, QualityController.MAX_UP_HOLD)
+        elif delta > 0:
+            self.up_hold = QualityController.UP_HOLD
+        self.went_up = delta < 0
+        self.level += delta
+        self.frames = 0
+        self.changes += 1
+        QualityController.LOGGER.info(
+            f"quality {'down' if delta > 0 else 'up'} to {self} after "
+            f"{frame_time * 1000:.1f} ms per frame, "
+            f"budget {self.budget * 1000:.0f} ms")
+        return self.quality
+
+    def __str__(self) -> str:
+        return f"{self.level}/{len(self.ladder) - 1}: {self.quality}"
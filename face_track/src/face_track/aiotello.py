@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""asyncio client for the Tello SDK 1.3 UDP protocol.
+
+* commands are sent to port 8889 from an ephemeral local port, the drone
+  answers to that port with "ok", "error ..." or the value of a read command
+* the state string, "pitch:0;roll:0;...;\\r\\n", arrives on port 8890
+* the raw H.264 video stream arrives on port 11111 after streamon
+
+Every command is awaitable with a timeout, so a slow takeoff never blocks the
+caller, and the state and video packets are async streams.
+
+```python
+async def fly():
+    tello = AsyncTello()
+    await tello.connect()
+    await tello.takeoff()
+    async for state in tello.states():
+        print(state['bat'], state['h'])
+```
+
+A synchronous program, like the face tracker, runs the client on a
+`LoopThread` and waits on the returned futures only when it needs to:
+
+```python
+loop = LoopThread()
+loop.start()
+tello = AsyncTello()
+loop.run(tello.connect()).result()
+takeoff = loop.run(tello.takeoff())  # concurrent.futures.Future
+...
+loop.call(tello.send_rc_control, 0, 10, 0, 0)
+```
+"""
+import asyncio
+import concurrent.futures
+import logging
+import threading
+import time
+from typing import (AsyncIterator, Awaitable, Callable, Dict, List, Optional,
+                    Set, Tuple)
+
+TELLO_IP: str = '192.168.10.1'
+CONTROL_PORT: int = 8889
+STATE_PORT: int = 8890
+VIDEO_PORT: int = 11111
+
+State = Dict[str, float]
+
+
+class TelloError(Exception):
+    """A command timed out or the drone answered with an error"""
+
+
+def parse_state(data: bytes) -> State:
+    """Parse the state string, e.g. b"pitch:0;roll:0;...;bat:87;...\\r\\n"
+    :param data: the state packet
+    :return: the values by field name, as floats unless not numeric
+    """
+    state: State = {}
+    for field in data.decode('ascii', errors='replace').strip().split(';'):
+        key, sep, value = field.partition(':')
+        if not sep:
+            continue
+        try:
+            state[key] = float(value)
+        except ValueError:
+            state[key] = value
+    return state
+
+
+class Datagrams(asyncio.DatagramProtocol):
+    """Pass the received datagrams of an endpoint to a callback"""
+    def __init__(self, received: Callable[[bytes, Tuple[str, int]],
+                                          None]) -> None:
+        super().__init__()
+        self.received = received
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        self.received(data, addr)
+
+    def error_received(self, exc: Exception) -> None:
+        AsyncTello.LOGGER.warning(f"udp error: {exc}")
+
+
+class _Stream(object):
+    """Fan out packets to the subscribed queues, dropping the oldest packet
+    of a queue that is full, so a slow consumer never delays the others"""
+    def __init__(self) -> None:
+        super().__init__()
+        self.queues: Set[asyncio.Queue] = set()
+        self.dropped: int = 0
+
+    def put(self, item) -> None:
+        for q in self.queues:
+            if q.full():
+                q.get_nowait()
+                self.dropped += 1
+            q.put_nowait(item)
+
+    async def subscribe(self, maxsize: int) -> AsyncIterator:
+        q: asyncio.Queue = asyncio.Queue(maxsize)
+        self.queues.add(q)
+        try:
+            while True:
+                yield await q.get()
+        finally:
+            self.queues.discard(q)
+
+
+class AsyncTello(object):
+    """Tello SDK 1.3 client on asyncio, see the module doc"""
+    HANDLER = logging.StreamHandler()
+    FORMATTER = logging.Formatter(
+        '[%(levelname)s] %(filename)s - %(lineno)d - %(message)s')
+    HANDLER.setFormatter(FORMATTER)
+
+    LOGGER = logging.getLogger('aiotello')
+    LOGGER.addHandler(HANDLER)
+    LOGGER.setLevel(logging.INFO)
+
+    RESPONSE_TIMEOUT: float = 7.0  # in seconds
+    TAKEOFF_TIMEOUT: float = 20.0  # in seconds
+    TIME_BTW_COMMANDS: float = 0.1  # the drone ignores faster commands
+
+    def __init__(self,
+                 host: str = TELLO_IP,
+                 control_port: int = CONTROL_PORT,
+                 state_port: int = STATE_PORT,
+                 video_port: int = VIDEO_PORT,
+                 retry_count: int = 1) -> None:
+        """Initialize an AsyncTello instance
+        :param host: the drone address
+        :param control_port: the command port of the drone
+        :param state_port: the local port the state arrives on, 0 for none
+        :param video_port: the local port the video arrives on
+        :param retry_count: the number of retries after a command timed out
+        :return: None
+        """
+        super().__init__()
+        self.address: Tuple[str, int] = (host, control_port)
+        self.state_port: int = state_port
+        self.video_port: int = video_port
+        self.retry_count: int = retry_count
+        self.control: Optional[asyncio.DatagramTransport] = None
+        self.transports: List[asyncio.BaseTransport] = []
+        self._command_lock: Optional[asyncio.Lock] = None
+        self._response: Optional[asyncio.Future] = None
+        self.last_command_time: float = 0.0  # time.monotonic()
+        self.state: State = {}  # the latest state
+        self.state_time: float = 0.0  # when it arrived, time.monotonic()
+        self._states = _Stream()
+        self._video = _Stream()
+
+    async def _open(self, local_port: int,
+                    received) -> asyncio.DatagramTransport:
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: Datagrams(received), local_addr=('0.0.0.0', local_port))
+        self.transports.append(transport)
+        return transport
+
+    async def connect(self, timeout: float = RESPONSE_TIMEOUT) -> None:
+        """Open the command and state ports and enter SDK mode"""
+        self._command_lock = asyncio.Lock()
+        self.control = await self._open(0, self._control_received)
+        if self.state_port:
+            await self._open(self.state_port, self._state_received)
+        await self.send_control_command('command', timeout)
+
+    async def open_video(self) -> None:
+        """Listen for the video stream, see video()"""
+        await self._open(self.video_port, self._video_received)
+
+    def close(self) -> None:
+        for transport in self.transports:
+            transport.close()
+        self.transports.clear()
+        self.control = None
+
+    def _control_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        response = data.decode('utf-8', errors='replace').strip()
+        if self._response is None or self._response.done():
+            # e.g. the late answer of a command that timed out
+            AsyncTello.LOGGER.debug(f"unexpected response {response!r}")
+            return
+        self._response.set_result(response)
+
+    def _state_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        self.state = parse_state(data)
+        self.state_time = time.monotonic()
+        self._states.put(self.state)
+
+    def _video_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        self._video.put(data)
+
+    def states(self, maxsize: int = 1) -> AsyncIterator[State]:
+        """Iterate over the state packets, only the latest if maxsize is 1"""
+        return self._states.subscribe(maxsize)
+
+    def video(self, maxsize: int = 256) -> AsyncIterator[bytes]:
+        """Iterate over the H.264 packets of the video stream"""
+        return self._video.subscribe(maxsize)
+
+    async def send_command_with_return(
+            self, command: str, timeout: float = RESPONSE_TIMEOUT) -> str:
+        """Send a command and wait for the response
+        :param command: the SDK command, e.g. "battery?"
+        :param timeout: the maximum wait for the response in seconds
+        :return: the response
+        """
+        if self.control is None:
+            raise TelloError("not connected")
+        # the responses carry no id, so one command is in flight at a time
+        async with self._command_lock:
+            loop = asyncio.get_running_loop()
+            for attempt in range(self.retry_count + 1):
+                wait = self.last_command_time + AsyncTello.TIME_BTW_COMMANDS \
+                    - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self._response = loop.create_future()
+                AsyncTello.LOGGER.debug(f"send {command!r}")
+                self.control.sendto(command.encode('utf-8'), self.address)
+                start = time.monotonic()
+                try:
+                    response = await asyncio.wait_for(self._response, timeout)
+                except asyncio.TimeoutError:
+                    AsyncTello.LOGGER.warning(
+                        f"{command!r} timed out, attempt {attempt + 1}")
+                    continue
+                finally:
+                    self._response = None
+                    self.last_command_time = time.monotonic()
+                AsyncTello.LOGGER.debug(
+                    f"{command!r}: {response!r} in "
+                    f"{time.monotonic() - start:.3f}s")
+                return response
+        raise TelloError(f"{command!r} timed out after {timeout}s")
+
+    async def send_control_command(
+            self, command: str, timeout: float = RESPONSE_TIMEOUT) -> None:
+        """Send a command, raise TelloError unless the response is ok"""
+        response = await self.send_command_with_return(command, timeout)
+        if response.lower() != 'ok':
+            raise TelloError(f"{command!r}: {response}")
+
+    async def send_read_command(self,
+                                command: str,
+                                timeout: float = RESPONSE_TIMEOUT) -> str:
+        """Send a read command, e.g. "battery?", and return the value"""
+        response = await self.send_command_with_return(command, timeout)
+        if response.lower().startswith('error'):
+            raise TelloError(f"{command!r}: {response}")
+        return response
+
+    def send_rc_control(self, lr: int, fb: int, ud: int, yaw: int) -> None:
+        """Send the rc velocities, -100..100, the drone does not answer.
+        Call from the thread of the event loop, see LoopThread.call.
+        """
+        if self.control is None:
+            return
+
+        def clamp(v: int) -> int:
+            return max(-100, min(100, int(v)))
+
+        command = f"rc {clamp(lr)} {clamp(fb)} {clamp(ud)} {clamp(yaw)}"
+        self.control.sendto(command.encode('utf-8'), self.address)
+
+    async def takeoff(self) -> None:
+        await self.send_control_command('takeoff', AsyncTello.TAKEOFF_TIMEOUT)
+
+    async def land(self) -> None:
+        await self.send_control_command('land', AsyncTello.TAKEOFF_TIMEOUT)
+
+    async def emergency(self) -> None:
+        """Stop the motors immediately, the drone does not answer"""
+        if self.control is not None:
+            self.control.sendto(b'emergency', self.address)
+
+    async def streamon(self) -> None:
+        await self.send_control_command('streamon')
+
+    async def streamoff(self) -> None:
+        await self.send_control_command('streamoff')
+
+    async def move(self, direction: str, x: int) -> None:
+        """Move x (20..500) cm, direction is up, down, left, right, forward
+        or back"""
+        await self.send_control_command(f"{direction} {x}")
+
+    async def move_up(self, x: int) -> None:
+        await self.move('up', x)
+
+    async def rotate_clockwise(self, x: int) -> None:
+        await self.send_control_command(f"cw {x}")
+
+    async def rotate_counter_clockwise(self, x: int) -> None:
+        await self.send_control_command(f"ccw {x}")
+
+    async def query_battery(self) -> int:
+        return int(await self.send_read_command('battery?'))
+
+    def get_battery(self) -> int:
+        """Return the battery percentage of the latest state"""
+        return int(self.state.get('bat', 0))
+
+    def get_highest_temperature(self) -> float:
+        """Return the highest temperature of the latest state"""
+        return self.state.get('temph', 0.0)
+
+
+class LoopThread(object):
+    """Run an asyncio event loop on a daemon thread, for synchronous callers"""
+    def __init__(self) -> None:
+        super().__init__()
+        self.loop = asyncio.new_event_loop()
+        self.worker = threading.Thread(target=self.update,
+                                       name='aiotello',
+                                       daemon=True)
+
+    def update(self) -> None:
+        """Thread worker function to run the loop until stop()"""
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+        self.loop.close()
+
+    def start(self) -> None:
+        self.worker.start()
+
+    def run(self, coro: Awaitable) -> concurrent.futures.Future:
+        """Schedule a coroutine on the loop, without waiting"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call(self, callback: Callable, *args) -> None:
+        """Call a function on the loop thread, without waiting"""
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.worker.is_alive():
+            self.worker.join(timeout)
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""Offline face detection on recorded flight videos.
+
+Videos are split into chunks of frames, and the chunks are processed on
+worker processes. Per-frame detections are written to a compressed numpy
+.npz file with one array per column:
+
+* videos: the video file names
+* video: the video index of each frame
+* frame: the frame index in its video
+* time: the frame timestamp in seconds from the start of its video
+* count: the number of faces in each frame
+* target: the index of the chosen (largest) face in the frame, -1 if none
+* boxes: all face boxes (x, y, w, h), frame by frame; the boxes of frame i
+  start at the sum of count[:i]
+
+Usage:
+```
+face_track analyze vid-*.avi -o detections.npz --workers 4
+```
+"""
+import argparse
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+from face_track.detector import DETECTORS, create_detector
+from face_track.tracker import FaceTracker
+
+HANDLER = logging.StreamHandler()
+FORMATTER = logging.Formatter(
+    '[%(levelname)s] %(filename)s - %(lineno)d - %(message)s')
+HANDLER.setFormatter(FORMATTER)
+
+LOGGER = logging.getLogger('analyze')
+LOGGER.addHandler(HANDLER)
+LOGGER.setLevel(logging.INFO)
+
+Chunk = Tuple[int, str, int, int]  # (file index, path, first frame, end frame)
+
+
+def split(paths: List[str], chunk: int) -> List[Chunk]:
+    """Split videos into chunks of frames.
+    :param paths: the video files
+    :param chunk: the number of frames per chunk, 0 for one chunk per file
+    :return: the chunks
+    """
+    chunks = []
+    for i, path in enumerate(paths):
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise FileNotFoundError(f"Error opening video {path}")
+        count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        if chunk <= 0 or count <= 0:
+            chunks.append((i, path, 0, -1))
+            continue
+        for start in range(0, count, chunk):
+            # the last chunk reads to the end, the frame count may be an estimate
+            end = start + chunk if start + chunk < count else -1
+            chunks.append((i, path, start, end))
+    return chunks
+
+
+def detect_chunk(chunk: Chunk, detector: str, scale: float, w: int,
+                 h: int) -> dict:
+    """Detect faces in a chunk of frames. Runs on a worker process.
+    :param chunk: the (file index, path, first frame, end frame) to process
+    :param detector: the face detector backend name
+    :param scale: the detection scale
+    :param w: the frame width the detection runs at, as FaceTracker.readFrame
+    :param h: the frame height the detection runs at
+    :return: the detection columns of the chunk
+    """
+    cv2.setNumThreads(1)
+    index, path, start, end = chunk
+    det = create_detector(detector)
+    minSize = (FaceTracker.MIN_FACE_SIZE, FaceTracker.MIN_FACE_SIZE)
+    maxSize = (FaceTracker.MAX_FACE_SIZE, FaceTracker.MAX_FACE_SIZE)
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    if start > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    frames, times, counts, targets, boxes = [], [], [], [], []
+    n = start
+    try:
+        while end < 0 or n < end:
+            grabbed, frame = cap.read()
+            if not grabbed:
+                break
+            pos = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            img = cv2.resize(frame, (w, h))
+            faces = det.detect(det.prepare(img), minSize, maxSize, scale)
+            frames.append(n)
+            times.append(pos if pos > 0 or fps <= 0 else n / fps)
+            counts.append(len(faces))
+            targets.append(
+                max(range(len(faces)), key=lambda k: faces[k][2] * faces[k][3])
+                if faces else -1)
+            boxes.extend(faces)
+            n += 1
+    finally:
+        cap.release()
+    return {
+        'video': np.full(len(frames), index, dtype=np.uint16),
+        'frame': np.asarray(frames, dtype=np.int32),
+        'time': np.asarray(times, dtype=np.float64),
+        'count': np.asarray(counts, dtype=np.uint16),
+        'target': np.asarray(targets, dtype=np.int16),
+        'boxes': np.asarray(boxes, dtype=np.int16).reshape(-1, 4),
+    }
+
+
+def analyze(paths: List[str],
+            output: str,
+            workers: int = 0,
+            chunk: int = 1800,
+            detector: str = 'haar',
+            scale: float = 1.0,
+            w: int = 640,
+            h: int = 480) -> dict:
+    """Detect faces in recorded videos and write the detections to an .npz file.
+    :param paths: the video files
+    :param output: the .npz file to write
+    :param workers: the number of worker processes, 0 for one per CPU
+    :param chunk: the number of frames per work item, 0 for one per file
+    :param detector: the face detector backend name
+    :param scale: the detection scale
+    :param w: the frame width the detection runs at
+    :param h: the frame height the detection runs at
+    :return: the detection columns
+    """
+    chunks = split(paths, chunk)
+    workers = workers or os.cpu_count() or 1
+    LOGGER.info(f"{len(paths)} videos, {len(chunks)} chunks, {workers} workers")
+    start = time.perf_counter()
+    ctx = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(workers,
+                                                mp_context=ctx) as executor:
+        parts = list(
+            executor.map(detect_chunk, chunks, [detector] * len(chunks),
+                         [scale] * len(chunks), [w] * len(chunks),
+                         [h] * len(chunks)))
+    columns = {
+        key: np.concatenate([p[key] for p in parts])
+        for key in ('video', 'frame', 'time', 'count', 'target', 'boxes')
+    }
+    columns['videos'] = np.asarray([os.path.basename(p) for p in paths])
+    np.savez_compressed(output, **columns)
+    elapsed = time.perf_counter() - start
+    frames = len(columns['frame'])
+    LOGGER.info(f"{frames} frames in {elapsed:.1f} s "
+                f"({frames / elapsed if elapsed > 0 else 0.0:.1f} fps), "
+                f"written to {output}")
+    return columns
+
+
+def load(path: str) -> dict:
+    """Load the detection columns written by analyze()"""
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def frame_boxes(columns: dict, i: int) -> np.ndarray:
+    """Return the face boxes of row i of the detection columns"""
+    offsets = np.concatenate(([0], np.cumsum(columns['count'], dtype=np.int64)))
+    return columns['boxes'][offsets[i]:offsets[i + 1]]
+
+
+def main(args=None) -> int:
+    if args is None:
+        args = sys.argv[1:]
+    parser = argparse.ArgumentParser(
+        prog="face_track analyze",
+        description="detect faces in recorded flight videos")
+    parser.add_argument("videos", nargs="+", help="the recorded video files")
+    parser.add_argument("-o",
+                        "--output",
+                        default="detections.npz",
+                        help="the detections file, default detections.npz")
+    parser.add_argument("--workers",
+                        type=int,
+                        default=0,
+                        help="the number of worker processes, default one per CPU")
+    parser.add_argument("--chunk",
+                        type=int,
+                        default=1800,
+                        help="frames per work item, 0 for one per file")
+    parser.add_argument("--detector", default="haar", choices=sorted(DETECTORS))
+    parser.add_argument("--detect-scale", type=float, default=1.0)
+    opts = parser.parse_args(args)
+    analyze(opts.videos, opts.output, opts.workers, opts.chunk, opts.detector,
+            opts.detect_scale)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
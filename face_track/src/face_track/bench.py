@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks for face detection, run headless without a drone.
+
+Usage:
+```
+python -m face_track.bench scale [--video vid-YYYYMMDD_HHMMSS.avi] [--frames 200]
+python -m face_track.bench pool [--video vid-YYYYMMDD_HHMMSS.avi] [--workers 1 2 3 4]
+python -m face_track.bench hotpath [--save baseline.json | --baseline baseline.json]
+```
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+import cv2
+import numpy as np
+
+from face_track.detector import DETECTORS, create_detector
+from face_track.mockdjitellopy import Tello as MockTello
+from face_track.pid import PID
+from face_track.pool import DetectorPool
+from face_track.source import ArraySource
+from face_track.tracker import FaceTracker
+
+# the sample face used by the simulation, see README.md
+DEFAULT_FACE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                            '..', 'pngegg.png')
+
+
+def synthetic_frames(face_path: str = DEFAULT_FACE,
+                     count: int = 200,
+                     w: int = 640,
+                     h: int = 480,
+                     seed: int = 0) -> Iterator[np.ndarray]:
+    """Generate frames with a face image moving and zooming over a noisy background.
+    :param face_path: the face image file
+    :param count: the number of frames
+    :param w: the frame width in pixel
+    :param h: the frame height in pixel
+    :param seed: the random seed of the background noise
+    :return: an iterator of BGR frames
+    """
+    face = cv2.imread(face_path)
+    if face is None:
+        raise FileNotFoundError(f"Error loading face image {face_path}")
+    rng = np.random.default_rng(seed)
+    background = rng.integers(60, 120, (h, w, 3), dtype=np.uint8)
+    fh, fw = face.shape[:2]
+    for i in range(count):
+        phase = 2 * np.pi * i / count
+        size = int(h * (0.45 + 0.2 * np.sin(2 * phase)))
+        sw, sh = size * fw // fh, size
+        patch = cv2.resize(face, (sw, sh), interpolation=cv2.INTER_AREA)
+        x = int((w - sw) * (0.5 + 0.4 * np.sin(phase)))
+        y = int((h - sh) * (0.5 + 0.4 * np.cos(phase)))
+        img = background.copy()
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(w, x + sw), min(h, y + sh)
+        img[y0:y1, x0:x1] = patch[y0 - y:y1 - y, x0 - x:x1 - x]
+        yield img
+
+
+def video_frames(path: str,
+                 count: int = 0,
+                 w: int = 640,
+                 h: int = 480) -> Iterator[np.ndarray]:
+    """Read frames from a recorded video, resized to (w, h).
+    :param path: the video file
+    :param count: the maximum number of frames, 0 reads all frames
+    :return: an iterator of BGR frames
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Error opening video {path}")
+    n = 0
+    try:
+        while count <= 0 or n < count:
+            grabbed, frame = cap.read()
+            if not grabbed:
+                break
+            n += 1
+            yield cv2.resize(frame, (w, h))
+    finally:
+        cap.release()
+
+
+def iou(a, b) -> float:
+    """intersection over union of two boxes (x, y, w, h)"""
+    ix = max(0, min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def largest(faces) -> Optional[tuple]:
+    return max(faces, key=lambda f: f[2] * f[3]) if len(faces) else None
+
+
+def bench_scale(frames: List[np.ndarray],
+                scales: List[float],
+                detector: str = 'haar') -> List[dict]:
+    """Measure detection time and accuracy at each detection scale.
+    The full resolution (scale 1.0) detection of the largest face is the reference.
+    :param frames: the BGR frames
+    :param scales: the detection scales
+    :param detector: the face detector backend name
+    :return: one result row per scale
+    """
+    minSize = (FaceTracker.MIN_FACE_SIZE, FaceTracker.MIN_FACE_SIZE)
+    maxSize = (FaceTracker.MAX_FACE_SIZE, FaceTracker.MAX_FACE_SIZE)
+    det = create_detector(detector)
+    images = [det.prepare(f).copy() for f in frames]
+    ref = [largest(det.detect(g, minSize, maxSize)) for g in images]
+    rows = []
+    for scale in scales:
+        times, hits, misses, extra, err = [], 0, 0, 0, []
+        for image, r in zip(images, ref):
+            start = time.perf_counter()
+            faces = det.detect(image, minSize, maxSize, scale)
+            times.append(time.perf_counter() - start)
+            face = largest(faces)
+            if r is None:
+                extra += face is not None
+            elif face is not None and iou(face, r) >= 0.5:
+                hits += 1
+                err.append(
+                    np.hypot(face[0] + face[2] / 2 - r[0] - r[2] / 2,
+                             face[1] + face[3] / 2 - r[1] - r[3] / 2))
+            else:
+                misses += 1
+        refs = hits + misses
+        rows.append({
+            'scale': scale,
+            'mean_ms': 1000 * float(np.mean(times)),
+            'p95_ms': 1000 * float(np.percentile(times, 95)),
+            'recall': hits / refs if refs else 1.0,
+            'extra': extra,
+            'center_err_px': float(np.mean(err)) if err else 0.0,
+        })
+    return rows
+
+
+def bench_pool(frames: List[np.ndarray],
+               workers: List[int],
+               detector: str = 'haar',
+               scale: float = 1.0) -> List[dict]:
+    """Measure detection throughput of the worker pool against a single thread.
+    Worker startup and model loading are not included.
+    :param frames: the BGR frames
+    :param workers: the numbers of worker processes, 0 is the single thread baseline
+    :param detector: the face detector backend name
+    :param scale: the detection scale
+    :return: one result row per number of workers
+    """
+    minSize = (FaceTracker.MIN_FACE_SIZE, FaceTracker.MIN_FACE_SIZE)
+    maxSize = (FaceTracker.MAX_FACE_SIZE, FaceTracker.MAX_FACE_SIZE)
+    rows = []
+    for n in workers:
+        if n == 0:
+            det = create_detector(detector)
+            det.load()
+            start = time.perf_counter()
+            for img in frames:
+                det.detect(det.prepare(img), minSize, maxSize, scale)
+            elapsed = time.perf_counter() - start
+        else:
+            with DetectorPool(n, detector, scale, minSize, maxSize) as pool:
+                start = time.perf_counter()
+                for img in frames:
+                    pool.submit(img)
+                    # keep the input queue short, results are drained as they come
+                    while pool.next_seq - pool.next_out > 2 * n:
+                        pool.get()
+                while pool.next_out < pool.next_seq:
+                    pool.get()
+                elapsed = time.perf_counter() - start
+        rows.append({
+            'workers': n,
+            'fps': len(frames) / elapsed,
+        })
+    for r in rows:
+        r['speedup'] = r['fps'] / rows[0]['fps']
+    return rows
+
+
+def load_frames(opts, w: int = 640, h: int = 480) -> List[np.ndarray]:
+    if opts.video:
+        return list(video_frames(opts.video, opts.frames, w, h))
+    return list(synthetic_frames(opts.face, opts.frames, w, h))
+
+
+def measure(func: Callable[[int], None], count: int) -> dict:
+    """Time count calls of func(i) and return the statistics in microseconds."""
+    times = np.empty(count)
+    for i in range(count):
+        start = time.perf_counter()
+        func(i)
+        times[i] = time.perf_counter() - start
+    times *= 1e6
+    return {
+        'median_us': float(np.median(times)),
+        'mean_us': float(np.mean(times)),
+        'min_us': float(np.min(times)),
+    }
+
+
+def bench_hotpath(frames: List[np.ndarray], count: int = 100) -> Dict[str, dict]:
+    """Time the hot functions of the main loop with the mock Tello, headless.
+    putHud draws everything the other put* functions draw.
+    :param frames: the camera frames at the Tello resolution (960x720)
+    :param count: the number of calls of each function
+    :return: the timing statistics by function name
+    """
+    drone = MockTello(source=ArraySource(frames), pacing="fixed")
+    alpha = FaceTracker(drone=drone)
+    alpha.airborne.wait(5.0)  # trackFace holds the controllers until then
+    n = len(frames)
+    images = [cv2.resize(f, (alpha.w, alpha.h)) for f in frames]
+    infos = [alpha.findFace(img.copy())[1] for img in images]
+    pid = PID('bench', kP=0.5, kI=0.01, kD=0.1, SP=alpha.h / 2)
+    canvas = [img.copy() for img in images]
+    results = {}
+    try:
+        def read_latest(i):
+            # take the latest frame again instead of waiting for the next one
+            alpha.frame_seq = -1
+            return alpha.readFrame()
+
+        results['readFrame'] = measure(read_latest, count)
+        results['resize'] = measure(
+            lambda i: cv2.resize(frames[i % n], (alpha.w, alpha.h)), count)
+        copies = [images[i % n].copy() for i in range(count)]
+        results['findFace'] = measure(lambda i: alpha.findFace(copies[i]),
+                                      count)
+        results['trackFace'] = measure(lambda i: alpha.trackFace(infos[i % n]),
+                                       count)
+        results['PID.update'] = measure(
+            lambda i: pid.update(infos[i % n][0][1]), count)
+        pvs = [(float(info[0][1]), ) * 4 for info in infos]  # as trackFace
+        results['PIDBank.update'] = measure(
+            lambda i: alpha.pid.update(pvs[i % n]), count)
+        for put in (alpha.putFPS, alpha.putPID, alpha.putBattery,
+                    alpha.putTemperature, alpha.putFlight, alpha.putHud):
+            results[put.__name__] = measure(lambda i: put(canvas[i % n]),
+                                            count)
+        with tempfile.TemporaryDirectory() as tmp:
+            video = cv2.VideoWriter(os.path.join(tmp, "bench.avi"),
+                                    cv2.VideoWriter_fourcc(*'XVID'),
+                                    FaceTracker.RECORD_FRAME_RATE,
+                                    (alpha.w, alpha.h))
+            results['VideoWriter.write'] = measure(
+                lambda i: video.write(images[i % n]), count)
+            video.release()
+    finally:
+        alpha.end()
+    return results
+
+
+def save_baseline(path: str, results: Dict[str, dict]) -> None:
+    baseline = {
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def compare_baseline(path: str,
+                     results: Dict[str, dict],
+                     threshold: float = 0.25) -> List[str]:
+    """Compare results to a saved baseline.
+    :param path: the baseline json file
+    :param results: the timing statistics by function name
+    :param threshold: the allowed relative slowdown of the median, 0.25 is 25%
+    :return: a message for each regressed function
+    """
+    with open(path) as f:
+        baseline = json.load(f)['results']
+    regressions = []
+    for name, r in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]['median_us']
+        if r['median_us'] > base * (1.0 + threshold):
+            regressions.append(
+                f"{name} {r['median_us']:.1f} us, baseline {base:.1f} us "
+                f"(+{100 * (r['median_us'] / base - 1):.0f}%)")
+    return regressions
+
+
+def main(args=None) -> int:
+    if args is None:
+        args = sys.argv[1:]
+    parser = argparse.ArgumentParser(prog="python -m face_track.bench")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_frame_args(p):
+        p.add_argument("--video", help="recorded video, default synthetic frames")
+        p.add_argument("--face", default=DEFAULT_FACE, help="synthetic face image")
+        p.add_argument("--detector", default="haar", choices=sorted(DETECTORS))
+        p.add_argument("--frames", type=int, default=200)
+
+    p = sub.add_parser("scale", help="detection time and accuracy per scale")
+    add_frame_args(p)
+    p.add_argument("--scales",
+                   type=float,
+                   nargs="+",
+                   default=[1.0, 0.75, 0.5, 0.375, 0.25])
+
+    p = sub.add_parser("pool", help="detection throughput per worker count")
+    add_frame_args(p)
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 3, 4])
+    p.add_argument("--scale", type=float, default=1.0)
+
+    p = sub.add_parser("hotpath", help="time the hot functions of the main loop")
+    add_frame_args(p)
+    p.add_argument("--count", type=int, default=100, help="calls per function")
+    p.add_argument("--save", metavar="JSON", help="save the results as baseline")
+    p.add_argument("--baseline", metavar="JSON", help="compare to a baseline")
+    p.add_argument("--threshold",
+                   type=float,
+                   default=0.25,
+                   help="allowed slowdown against the baseline, default 0.25")
+    opts = parser.parse_args(args)
+
+    if opts.command == "scale":
+        frames = load_frames(opts)
+        print(f"{'scale':>6} {'mean ms':>8} {'p95 ms':>8} {'recall':>7} "
+              f"{'extra':>6} {'err px':>7}")
+        for r in bench_scale(frames, opts.scales, opts.detector):
+            print(f"{r['scale']:>6.3f} {r['mean_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+                  f"{r['recall']:>7.2f} {r['extra']:>6d} "
+                  f"{r['center_err_px']:>7.1f}")
+    elif opts.command == "pool":
+        frames = load_frames(opts)
+        print(f"{'workers':>8} {'fps':>8} {'speedup':>8}")
+        for r in bench_pool(frames, [0] + opts.workers, opts.detector,
+                            opts.scale):
+            name = r['workers'] if r['workers'] else 'thread'
+            print(f"{name:>8} {r['fps']:>8.1f} {r['speedup']:>8.2f}")
+    elif opts.command == "hotpath":
+        frames = load_frames(opts, 960, 720)
+        results = bench_hotpath(frames, opts.count)
+        print(f"{'function':>18} {'median us':>10} {'mean us':>10} {'min us':>10}")
+        for name, r in results.items():
+            print(f"{name:>18} {r['median_us']:>10.1f} {r['mean_us']:>10.1f} "
+                  f"{r['min_us']:>10.1f}")
+        if opts.save:
+            save_baseline(opts.save, results)
+        if opts.baseline:
+            regressions = compare_baseline(opts.baseline, results,
+                                           opts.threshold)
+            for msg in regressions:
+                print(f"regression: {msg}")
+            if regressions:
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
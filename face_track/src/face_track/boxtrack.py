@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from typing import Optional, Tuple
+
+import cv2
+
+Box = Tuple[int, int, int, int]  # (x, y, w, h) in pixel
+
+
+class TemplateTracker(object):
+    """Propagate a face box between detections by template matching.
+
+    The template is the face patch cut out at the last detection. Each frame
+    it is matched inside a window around the last box, which costs a fraction
+    of a cascade detection.
+    """
+    def __init__(self, margin: float = 0.5, min_score: float = 0.6) -> None:
+        """Initialize a TemplateTracker instance
+        :param margin: the search border around the last box, in units of the box size
+        :param min_score: the minimum normalized correlation to accept a match
+        :return: None
+        """
+        super().__init__()
+        self.margin: float = margin
+        self.min_score: float = min_score
+        self.template = None
+        self.box: Optional[Box] = None
+        self.score: float = 0.0
+
+    def reset(self) -> None:
+        self.template = None
+        self.box = None
+        self.score = 0.0
+
+    def init(self, gray, box: Box) -> None:
+        """Start tracking a detected face
+        :param gray: the grayscale image the face was detected in
+        :param box: the face box (x, y, w, h)
+        :return: None
+        """
+        x, y, w, h = (int(v) for v in box)
+        self.template = gray[y:y + h, x:x + w].copy()
+        self.box = (x, y, w, h)
+        self.score = 1.0
+
+    def track(self, gray) -> Optional[Box]:
+        """Find the face in a new frame
+        :param gray: the grayscale image
+        :return: the new face box, None if the match is below min_score
+        """
+        if self.box is None:
+            return None
+        ih, iw = gray.shape[:2]
+        x, y, w, h = self.box
+        mx, my = int(w * self.margin), int(h * self.margin)
+        x0, y0 = max(0, x - mx), max(0, y - my)
+        x1, y1 = min(iw, x + w + mx), min(ih, y + h + my)
+        if x1 - x0 < w or y1 - y0 < h:
+            self.reset()
+            return None
+        res = cv2.matchTemplate(gray[y0:y1, x0:x1], self.template,
+                                cv2.TM_CCOEFF_NORMED)
+        _, self.score, _, (bx, by) = cv2.minMaxLoc(res)
+        if self.score < self.min_score:
+            self.box = None
+            return None
+        self.box = (x0 + bx, y0 + by, w, h)
+        return self.box
+
+
+class PathCost(object):
+    """Per-path timing statistics in seconds"""
+    def __init__(self, name: str = '') -> None:
+        super().__init__()
+        self.name: str = name
+        self.count: int = 0
+        self.total: float = 0.0
+        self.last: float = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.name} {self.count} frames, "
+                f"last {self.last * 1000:.1f} ms, mean {self.mean * 1000:.1f} ms")
@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""Face detector backends, selected by name.
+
+All backends return a list of face boxes (x, y, w, h) in pixel of the input
+image, and load their model on first use.
+
+```python
+detector = create_detector("haar")
+faces = detector.detect(gray, minSize=(20, 20), maxSize=(200, 200), scale=0.5)
+```
+"""
+import functools
+import logging
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+Box = Tuple[int, int, int, int]  # (x, y, w, h) in pixel
+
+HANDLER = logging.StreamHandler()
+FORMATTER = logging.Formatter(
+    '[%(levelname)s] %(filename)s - %(lineno)d - %(message)s')
+HANDLER.setFormatter(FORMATTER)
+
+LOGGER = logging.getLogger('detector')
+LOGGER.addHandler(HANDLER)
+LOGGER.setLevel(logging.INFO)
+
+# directory of the OpenCV pre-trained cascades
+CV2_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(cv2.__file__)),
+                            "data")
+# directory of downloaded models, e.g. the DNN face detector
+MODEL_DIR = os.environ.get(
+    "FACE_TRACK_MODELS",
+    os.path.join(os.path.expanduser("~"), ".face_track", "models"))
+
+DETECTORS: Dict[str, Callable[..., 'Detector']] = {}
+
+
+def register_detector(name: str) -> Callable:
+    """Class decorator to register a detector backend under a name"""
+    def decorate(cls):
+        DETECTORS[name] = cls
+        return cls
+
+    return decorate
+
+
+def create_detector(name: str, **kwargs) -> 'Detector':
+    """Create a detector backend by name. The model is loaded on first use.
+    :param name: the registered backend name, see DETECTORS
+    :param kwargs: the backend options
+    :return: the detector
+    """
+    try:
+        factory = DETECTORS[name]
+    except KeyError:
+        raise ValueError(f"unknown face detector {name}, "
+                         f"choose from {', '.join(sorted(DETECTORS))}")
+    return factory(**kwargs)
+
+
+@functools.lru_cache(maxsize=None)
+def load_cascade(path: str) -> cv2.CascadeClassifier:
+    """Load a cascade classifier once, later calls return the same instance
+    :param path: the cascade XML file
+    :return: the classifier
+    """
+    cascade = cv2.CascadeClassifier(path)
+    if cascade.empty():
+        raise FileNotFoundError(f"Error loading cascade {path}")
+    LOGGER.info(f"loaded cascade {path}")
+    return cascade
+
+
+def find_file(name: str, dirs: List[str]) -> str:
+    """Return the first existing path of name in dirs, or name itself."""
+    for d in dirs:
+        path = os.path.join(d, name)
+        if os.path.isfile(path):
+            return path
+    return name
+
+
+class Detector(object):
+    """Face detector interface"""
+
+    # the cv2.cvtColor code from BGR to the detector input, None for BGR
+    COLOR: Optional[int] = cv2.COLOR_BGR2GRAY
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.loaded: bool = False
+        # reused output buffers of prepare() and the downscale in detect()
+        self.prepared: Optional[np.ndarray] = None
+        self.small: Optional[np.ndarray] = None
+
+    def load(self) -> None:
+        """Load the model. Called on first detection."""
+        self.loaded = True
+
+    def warmup(self, w: int, h: int) -> None:
+        """Load the model and detect once on a blank w x h BGR image, so the
+        first frame does not pay for the allocations"""
+        blank = np.zeros((h, w, 3), dtype=np.uint8)
+        self.detect(self.prepare(blank), (20, 20), (200, 200))
+
+    def prepare(self, img: np.ndarray) -> np.ndarray:
+        """Convert a BGR image to the input format of the detector.
+        The result is valid until the next call.
+        """
+        if self.COLOR is None:
+            return img
+        # cv2 writes into dst if the size matches, else allocates a new one
+        self.prepared = cv2.cvtColor(img, self.COLOR, dst=self.prepared)
+        return self.prepared
+
+    def detect(self,
+               image: np.ndarray,
+               minSize: Tuple[int, int],
+               maxSize: Tuple[int, int],
+               scale: float = 1.0) -> List[Box]:
+        """detect faces, optionally on a downscaled image.
+        :param image: the image in the format returned by prepare()
+        :param minSize: the smallest face size in pixel of image
+        :param maxSize: the largest face size in pixel of image
+        :param scale: the detection scale, e.g. 0.5 detects on a half size image
+        :return: the list of face boxes (x, y, w, h) in pixel of image
+        """
+        if not self.loaded:
+            self.load()
+        if scale == 1.0:
+            return self.detectFaces(image, minSize, maxSize)
+        small = self.small = cv2.resize(image,
+                                        None,
+                                        dst=self.small,
+                                        fx=scale,
+                                        fy=scale,
+                                        interpolation=cv2.INTER_AREA)
+        faces = self.detectFaces(
+            small, tuple(max(1, int(v * scale)) for v in minSize),
+            tuple(max(1, int(v * scale)) for v in maxSize))
+        return [tuple(int(round(v / scale)) for v in f) for f in faces]
+
+    def detectFaces(self, image: np.ndarray, minSize: Tuple[int, int],
+                    maxSize: Tuple[int, int]) -> List[Box]:
+        raise NotImplementedError
+
+    @staticmethod
+    def filterSize(faces: List[Box], minSize: Tuple[int, int],
+                   maxSize: Tuple[int, int]) -> List[Box]:
+        return [
+            f for f in faces if minSize[0] <= f[2] <= maxSize[0]
+            and minSize[1] <= f[3] <= maxSize[1]
+        ]
+
+
+class CascadeDetector(Detector):
+    """OpenCV cascade classifier"""
+    def __init__(self,
+                 path: str,
+                 scaleFactor: float = 1.3,
+                 minNeighbors: int = 5) -> None:
+        """Initialize a CascadeDetector instance
+        :param path: the cascade xml file
+        :param scaleFactor: the image size reduction at each scale
+        :param minNeighbors: the number of neighbors each candidate needs to be kept
+        :return: None
+        """
+        super().__init__()
+        self.path: str = path
+        self.scaleFactor: float = scaleFactor
+        self.minNeighbors: int = minNeighbors
+        self.cascade = None
+
+    def load(self) -> None:
+        self.cascade = load_cascade(self.path)
+        super().load()
+
+    def detectFaces(self, image, minSize, maxSize):
+        faces = self.cascade.detectMultiScale(image=image,
+                                              scaleFactor=self.scaleFactor,
+                                              minNeighbors=self.minNeighbors,
+                                              minSize=minSize,
+                                              maxSize=maxSize)
+        return [tuple(int(v) for v in f) for f in faces]
+
+
+@register_detector("haar")
+class HaarDetector(CascadeDetector):
+    """Haar frontal face cascade shipped with OpenCV"""
+    FILE = "haarcascade_frontalface_default.xml"
+
+    def __init__(self, path: Optional[str] = None, **kwargs) -> None:
+        super().__init__(path or find_file(self.FILE, [CV2_DATA_DIR]),
+                         **kwargs)
+
+
+@register_detector("lbp")
+class LbpDetector(CascadeDetector):
+    """LBP frontal face cascade, faster than Haar but less accurate.
+    The opencv-python wheel does not ship LBP cascades, it is searched in
+    the model directory and the system OpenCV data directories.
+    """
+    FILE = "lbpcascade_frontalface_improved.xml"
+    DIRS = [
+        MODEL_DIR, CV2_DATA_DIR, "/usr/share/opencv4/lbpcascades",
+        "/usr/share/opencv/lbpcascades",
+        "/usr/local/share/opencv4/lbpcascades"
+    ]
+
+    def __init__(self, path: Optional[str] = None, **kwargs) -> None:
+        super().__init__(path or find_file(self.FILE, self.DIRS), **kwargs)
+
+
+@register_detector("dnn")
+class DnnDetector(Detector):
+    """OpenCV DNN SSD face detector with a ResNet-10 backbone, run on CPU.
+    Download deploy.prototxt and res10_300x300_ssd_iter_140000.caffemodel
+    from the OpenCV face detector sample into the model directory.
+    """
+    COLOR = None
+    PROTOTXT = "deploy.prototxt"
+    MODEL = "res10_300x300_ssd_iter_140000.caffemodel"
+    SIZE = (300, 300)
+    MEAN = (104.0, 177.0, 123.0)
+
+    def __init__(self,
+                 prototxt: Optional[str] = None,
+                 model: Optional[str] = None,
+                 confidence: float = 0.5) -> None:
+        """Initialize a DnnDetector instance
+        :param prototxt: the network definition, default in MODEL_DIR
+        :param model: the network weights, default in MODEL_DIR
+        :param confidence: the minimum detection confidence [0, 1]
+        :return: None
+        """
+        super().__init__()
+        self.prototxt: str = prototxt or os.path.join(MODEL_DIR, self.PROTOTXT)
+        self.model: str = model or os.path.join(MODEL_DIR, self.MODEL)
+        self.confidence: float = confidence
+        self.net = None
+
+    def load(self) -> None:
+        for path in (self.prototxt, self.model):
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"Error loading DNN face model {path}")
+        self.net = cv2.dnn.readNetFromCaffe(self.prototxt, self.model)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        LOGGER.info(f"loaded DNN face model {self.model}")
+        super().load()
+
+    def detectFaces(self, image, minSize, maxSize):
+        ih, iw = image.shape[:2]
+        blob = cv2.dnn.blobFromImage(cv2.resize(image, self.SIZE), 1.0,
+                                     self.SIZE, self.MEAN)
+        self.net.setInput(blob)
+        out = self.net.forward()[0, 0]
+        out = out[out[:, 2] >= self.confidence]
+        boxes = np.clip(out[:, 3:7], 0.0, 1.0) * [iw, ih, iw, ih]
+        faces = [(int(x0), int(y0), int(x1 - x0), int(y1 - y0))
+                 for x0, y0, x1, y1 in boxes]
+        return self.filterSize(faces, minSize, maxSize)
+
+
+@register_detector("mediapipe")
+class MediaPipeDetector(Detector):
+    """MediaPipe face detection, requires the optional mediapipe package"""
+    COLOR = cv2.COLOR_BGR2RGB
+
+    def __init__(self, confidence: float = 0.5) -> None:
+        """Initialize a MediaPipeDetector instance
+        :param confidence: the minimum detection confidence [0, 1]
+        :return: None
+        """
+        super().__init__()
+        self.confidence: float = confidence
+        self.face_detection = None
+
+    def load(self) -> None:
+        try:
+            import mediapipe as mp
+        except ImportError:
+            raise ImportError(
+                "mediapipe face detector requires: pip install mediapipe")
+        self.face_detection = mp.solutions.face_detection.FaceDetection(
+            min_detection_confidence=self.confidence)
+        super().load()
+
+    def detectFaces(self, image, minSize, maxSize):
+        results = self.face_detection.process(image)
+        if not results.detections:
+            return []
+        ih, iw = image.shape[:2]
+        faces = []
+        for detection in results.detections:
+            box = detection.location_data.relative_bounding_box
+            faces.append((int(box.xmin * iw), int(box.ymin * ih),
+                          int(box.width * iw), int(box.height * ih)))
+        return self.filterSize(faces, minSize, maxSize)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Per control step flight data for offline analysis and PID tuning.
+
+The log is written to a numpy .npz file with the arrays:
+
+* names: the axis names, e.g. lr, fb, ud, yaw
+* sp: the setpoint of each axis
+* limit: the rc output limit of each axis
+* kP, kI, kD: the PID gains of each axis
+* t: the time.monotonic() of each control step
+* pv: the process variable of each axis and step, NaN when no face was found
+* rc: the rc command of each axis and step
+* found: True if a face was found in the step
+"""
+from typing import List, Sequence
+
+import numpy as np
+
+
+class FlightLog(object):
+    """Collect (t, pv, rc) per control step, see the module doc for the file format"""
+    def __init__(self, names: Sequence[str], sp: Sequence[float],
+                 limit: Sequence[float], kP: Sequence[float],
+                 kI: Sequence[float], kD: Sequence[float]) -> None:
+        """Initialize a FlightLog instance
+        :param names: the axis names
+        :param sp: the setpoint of each axis
+        :param limit: the rc output limit of each axis
+        :param kP: the proportional gain of each axis
+        :param kI: the integral gain of each axis
+        :param kD: the derivative gain of each axis
+        :return: None
+        """
+        super().__init__()
+        self.names: tuple = tuple(names)
+        self.sp = np.asarray(sp, dtype=np.float64)
+        self.limit = np.asarray(limit, dtype=np.float64)
+        self.gains = {
+            'kP': np.asarray(kP, dtype=np.float64),
+            'kI': np.asarray(kI, dtype=np.float64),
+            'kD': np.asarray(kD, dtype=np.float64)
+        }
+        self.t: List[float] = []
+        self.pv: List[tuple] = []
+        self.rc: List[tuple] = []
+        self.found: List[bool] = []
+
+    def add(self, t: float, pv, rc, found: bool = True) -> None:
+        """Record a control step
+        :param t: the time.monotonic() of the step
+        :param pv: the process variable of each axis, ignored if not found
+        :param rc: the rc command of each axis
+        :param found: True if a face was found
+        :return: None
+        """
+        self.t.append(t)
+        self.pv.append(tuple(pv) if found else (np.nan, ) * len(self.names))
+        self.rc.append(tuple(rc))
+        self.found.append(found)
+
+    def __len__(self) -> int:
+        return len(self.t)
+
+    def save(self, path: str) -> None:
+        n = len(self.names)
+        np.savez_compressed(path,
+                            names=np.asarray(self.names),
+                            sp=self.sp,
+                            limit=self.limit,
+                            t=np.asarray(self.t, dtype=np.float64),
+                            pv=np.asarray(self.pv,
+                                          dtype=np.float64).reshape(-1, n),
+                            rc=np.asarray(self.rc,
+                                          dtype=np.float64).reshape(-1, n),
+                            found=np.asarray(self.found, dtype=bool),
+                            **self.gains)
+
+
+def load(path: str) -> dict:
+    """Load a flight log written by FlightLog.save"""
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+class FrameRing(object):
+    """A fixed pool of preallocated frame buffers, reused in turn.
+
+    The producer writes the next slot returned by acquire() and publishes it;
+    each published frame gets the next sequence number. Consumers get
+    read-only views of the published frames. A slot is overwritten `count`
+    frames after it was published, so a consumer must be done with a frame
+    by then or copy it, or hold the frame until it releases it: acquire()
+    waits while the next slot is held, which slows the producer down to the
+    consumers.
+
+    ```python
+    ring = FrameRing(4, (720, 960, 3))
+    ok, frame = cap.read(ring.acquire())  # decode in place
+    seq = ring.publish()
+    view = ring.latest()
+    ring.hold(seq)  # pass the frame to another thread, which then
+    ring.release(seq)
+    ```
+    """
+    def __init__(self,
+                 count: int,
+                 shape: Tuple[int, ...],
+                 dtype=np.uint8) -> None:
+        """Initialize a FrameRing instance
+        :param count: the number of buffers
+        :param shape: the frame shape, e.g. (h, w, 3)
+        :param dtype: the frame data type
+        :return: None
+        """
+        super().__init__()
+        self.count: int = count
+        self.shape: Tuple[int, ...] = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.buffers: List[np.ndarray] = [
+            np.zeros(shape, dtype=dtype) for _ in range(count)
+        ]
+        self.views: List[np.ndarray] = []
+        for buf in self.buffers:
+            view = buf.view()
+            view.flags.writeable = False
+            self.views.append(view)
+        self.seqs: List[int] = [-1] * count  # the frame in each slot
+        self.seq: int = -1  # the last published sequence number
+        self.holds: List[int] = [0] * count  # the holders of each slot
+        self._released = threading.Condition()
+
+    def matches(self, frame: np.ndarray) -> bool:
+        """Return True if frame fits the buffers"""
+        return frame.shape == self.shape and frame.dtype == self.dtype
+
+    def acquire(self, timeout: Optional[float] = None) -> Optional[np.ndarray]:
+        """Return the writable buffer of the next frame
+        :param timeout: the maximum wait in seconds for the frame in the
+            buffer to be released, None to wait forever
+        :return: the buffer, None on timeout
+        """
+        slot = (self.seq + 1) % self.count
+        with self._released:
+            if not self._released.wait_for(lambda: self.holds[slot] == 0,
+                                           timeout):
+                return None
+        return self.buffers[slot]
+
+    def publish(self) -> int:
+        """Publish the buffer returned by acquire() as the next frame
+        :return: the sequence number of the frame
+        """
+        self.seq += 1
+        self.seqs[self.seq % self.count] = self.seq
+        return self.seq
+
+    def latest(self) -> Optional[np.ndarray]:
+        """Return a read-only view of the last published frame"""
+        return self.get(self.seq)
+
+    def get(self, seq: int) -> Optional[np.ndarray]:
+        """Return a read-only view of frame seq, None if it was overwritten"""
+        slot = seq % self.count
+        if seq < 0 or self.seqs[slot] != seq:
+            return None
+        return self.views[slot]
+
+    def hold(self, seq: int) -> bool:
+        """Keep frame seq from being overwritten until release(seq)
+        :return: False if the frame was overwritten already
+        """
+        slot = seq % self.count
+        with self._released:
+            if seq < 0 or self.seqs[slot] != seq:
+                return False
+            self.holds[slot] += 1
+            return True
+
+    def release(self, seq: int) -> None:
+        """Release a frame held by hold(seq)"""
+        slot = seq % self.count
+        with self._released:
+            if self.seqs[slot] == seq and self.holds[slot] > 0:
+                self.holds[slot] -= 1
+                self._released.notify_all()
@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""A frame bus in shared memory, for consumers in other processes.
+
+The producer writes each frame and its metadata (sequence number, capture
+time and face boxes) once into a ring of slots in a
+`multiprocessing.shared_memory` segment. Any number of local processes attach
+to the segment by name and map it read-only, so a frame is never pickled,
+whatever the number of consumers.
+
+Each slot is guarded by a seqlock: the producer makes its lock counter odd
+before writing the slot and even again after. A reader copies the slot and
+retries if the counter was odd or changed meanwhile, so the producer never
+waits for a reader, and a reader never sees a torn frame.
+
+The seqlock has no memory fences, numpy stores and loads are plain memory
+accesses. It relies on the stores of the producer becoming visible in
+program order, as on x86 (TSO). A weakly ordered CPU such as ARM may reorder
+them, so the reader also checks that the slot still holds its sequence
+number after the copy, which catches a slot overwritten meanwhile, but not
+every reordering within a single write.
+
+```python
+bus = FrameBus((720, 960, 3))  # producer
+bus.publish(img, capture_time, faces)
+
+reader = FrameBusReader(bus.name)  # consumer, in any local process
+item = reader.wait(seq)  # (seq, capture time, faces, frame), or None
+```
+
+```bash
+face_track --frame-bus alpha
+face_track framebus alpha --record bus.avi
+```
+"""
+import argparse
+import logging
+import multiprocessing
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import List, Optional, Set, Tuple
+
+import cv2
+import numpy as np
+
+MAGIC: int = int.from_bytes(b"FRAMEBUS", "little")  # the segment layout
+ALIGN: int = 64  # the frames start on cache line boundaries
+
+BusFrame = Tuple[int, float, np.ndarray, np.ndarray]  # seq, time, faces, frame
+
+_CREATED: Set[str] = set()  # the names of the buses created in this process
+
+HEADER = np.dtype([
+    ('magic', '<u8'),
+    ('slots', '<i8'),
+    ('shape', '<i8', (3, )),
+    ('max_faces', '<i8'),
+    ('seq', '<i8'),  # the last published sequence number
+])
+
+
+def _slot_dtype(max_faces: int) -> np.dtype:
+    return np.dtype([
+        ('lock', '<u8'),  # the seqlock, odd while the slot is written
+        ('seq', '<i8'),
+        ('time', '<f8'),
+        ('count', '<i8'),  # the number of faces
+        ('faces', '<i4', (max_faces, 4)),  # x, y, w, h
+    ])
+
+
+def _aligned(size: int) -> int:
+    return (size + ALIGN - 1) // ALIGN * ALIGN
+
+
+class _Layout(object):
+    """The numpy views of a frame bus segment"""
+    def __init__(self, buf, slots: int, shape: Tuple[int, int, int],
+                 max_faces: int) -> None:
+        super().__init__()
+        slot = _slot_dtype(max_faces)
+        meta_offset = _aligned(HEADER.itemsize)
+        frame_offset = _aligned(meta_offset + slots * slot.itemsize)
+        frame_size = _aligned(int(np.prod(shape)))
+        self.header = np.ndarray((), HEADER, buf, 0)
+        self.meta = np.ndarray((slots, ), slot, buf, meta_offset)
+        self.frames: List[np.ndarray] = [
+            np.ndarray(shape, np.uint8, buf, frame_offset + i * frame_size)
+            for i in range(slots)
+        ]
+
+    @staticmethod
+    def size(slots: int, shape: Tuple[int, int, int], max_faces: int) -> int:
+        slot = _slot_dtype(max_faces)
+        frame_offset = _aligned(
+            _aligned(HEADER.itemsize) + slots * slot.itemsize)
+        return frame_offset + slots * _aligned(int(np.prod(shape)))
+
+
+class FrameBus(object):
+    """The producer side of a frame bus, see the module doc"""
+    HANDLER = logging.StreamHandler()
+    FORMATTER = logging.Formatter(
+        '[%(levelname)s] %(filename)s - %(lineno)d - %(message)s')
+    HANDLER.setFormatter(FORMATTER)
+
+    LOGGER = logging.getLogger('framebus')
+    LOGGER.addHandler(HANDLER)
+    LOGGER.setLevel(logging.INFO)
+
+    def __init__(self,
+                 shape: Tuple[int, int, int],
+                 name: Optional[str] = None,
+                 slots: int = 4,
+                 max_faces: int = 8) -> None:
+        """Initialize a FrameBus instance and create its shared memory
+        :param shape: the BGR frame shape (h, w, 3)
+        :param name: the shared memory name, default a unique name
+        :param slots: the number of frames kept, a reader must copy a frame
+            before the producer wraps around to its slot
+        :param max_faces: the number of face boxes kept per frame
+        :return: None
+        """
+        super().__init__()
+        shape = tuple(shape)
+        self.shm = shared_memory.SharedMemory(
+            name, create=True, size=_Layout.size(slots, shape, max_faces))
+        self.name: str = self.shm.name
+        _CREATED.add(self.shm._name)
+        self.layout = _Layout(self.shm.buf, slots, shape, max_faces)
+        header = self.layout.header
+        header['slots'] = slots
+        header['shape'] = shape
+        header['max_faces'] = max_faces
+        header['seq'] = -1
+        self.layout.meta['seq'] = -1
+        header['magic'] = MAGIC  # last, readers check it
+        self.slots: int = slots
+        self.shape: Tuple[int, ...] = shape
+        self.max_faces: int = max_faces
+        self.seq: int = -1
+        FrameBus.LOGGER.info(
+            f"frame bus {self.name}: {slots} x {shape}, "
+            f"{self.shm.size / 1e6:.1f} MB")
+
+    def publish(self,
+                frame: np.ndarray,
+                timestamp: Optional[float] = None,
+                faces=()) -> int:
+        """Write a frame to the next slot, never blocks
+        :param frame: the BGR frame, copied, resized if it does not fit
+        :param timestamp: the capture time.monotonic(), default now
+        :param faces: the face boxes (x, y, w, h) detected in the frame
+        :return: the sequence number of the frame
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        seq = self.seq + 1
+        slot = seq % self.slots
+        meta = self.layout.meta[slot]
+        count = min(len(faces), self.max_faces)
+        meta['lock'] += 1  # odd, readers retry
+        meta['seq'] = seq
+        meta['time'] = timestamp
+        meta['count'] = count
+        if count:
+            meta['faces'][:count] = faces[:count]
+        dst = self.layout.frames[slot]
+        if frame.shape == self.shape:
+            np.copyto(dst, frame)
+        else:
+            cv2.resize(frame, (self.shape[1], self.shape[0]), dst=dst)
+        meta['lock'] += 1  # even, the slot is consistent
+        self.layout.header['seq'] = seq
+        self.seq = seq
+        return seq
+
+    def close(self) -> None:
+        """Close and remove the shared memory, readers keep their mapping"""
+        if self.layout is None:
+            return
+        self.layout = None  # the views must go before the buffer is closed
+        self.shm.close()
+        self.shm.unlink()
+        _CREATED.discard(self.shm._name)
+        FrameBus.LOGGER.info(f"frame bus {self.name}: {self.seq + 1} frames")
+
+
+class FrameBusReader(object):
+    """A consumer of a frame bus, attached by name, see the module doc"""
+    RETRIES: int = 3  # copies of a slot the producer is writing
+    POLL_TIME: float = 0.002  # in seconds, the wait between checks for a frame
+
+    def __init__(self, name: str) -> None:
+        """Initialize a FrameBusReader instance and attach to the bus
+        :param name: the shared memory name of the bus
+        :return: None
+        """
+        super().__init__()
+        self.shm = shared_memory.SharedMemory(name)
+        if (self.shm._name not in _CREATED
+                and multiprocessing.parent_process() is None):
+            # attaching registers the segment with the resource tracker,
+            # which removes it when the process exits: a process of its own
+            # hands it back, while the producer process and its spawned
+            # children share the tracker, where the producer unregisters
+            # it on close
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        header = np.ndarray((), HEADER, self.shm.buf, 0)
+        magic = int(header['magic'])
+        self.slots: int = int(header['slots'])
+        self.shape: Tuple[int, ...] = tuple(int(n) for n in header['shape'])
+        self.max_faces: int = int(header['max_faces'])
+        del header  # the buffer cannot be closed while exported
+        if magic != MAGIC:
+            self.shm.close()
+            raise ValueError(f"{name} is not a frame bus")
+        self.layout = _Layout(self.shm.buf, self.slots, self.shape,
+                              self.max_faces)
+        for view in self.layout.frames:
+            view.flags.writeable = False
+        self.layout.meta.flags.writeable = False
+        self.layout.header.flags.writeable = False
+        self.torn: int = 0  # reads given up while the producer wrote the slot
+
+    @property
+    def seq(self) -> int:
+        """The last published sequence number, -1 before the first frame"""
+        return int(self.layout.header['seq'])
+
+    def read(self,
+             seq: Optional[int] = None,
+             out: Optional[np.ndarray] = None) -> Optional[BusFrame]:
+        """Copy a consistent frame and its metadata
+        :param seq: the sequence number, default the last published frame
+        :param out: the buffer to copy the frame into, default a new array
+        :return: (seq, capture time, faces, frame), None if the frame was
+            not published yet or was overwritten
+        """
+        if seq is None:
+            seq = self.seq
+        if seq < 0 or seq > self.seq:
+            return None
+        slot = seq % self.slots
+        meta = self.layout.meta[slot]
+        if out is None:
+            out = np.empty(self.shape, np.uint8)
+        for _ in range(FrameBusReader.RETRIES):
+            lock = int(meta['lock'])
+            if lock & 1:
+                time.sleep(0)  # let the producer finish the slot
+                continue
+            if meta['seq'] != seq:
+                return None
+            timestamp = float(meta['time'])
+            faces = meta['faces'][:int(meta['count'])].copy()
+            np.copyto(out, self.layout.frames[slot])
+            if int(meta['lock']) == lock and meta['seq'] == seq:
+                return seq, timestamp, faces, out
+        self.torn += 1
+        return None
+
+    def wait(self,
+             after: int = -1,
+             timeout: Optional[float] = 1.0,
+             out: Optional[np.ndarray] = None) -> Optional[BusFrame]:
+        """Wait for a frame newer than after and copy the last one
+        :param after: the sequence number of the last frame read
+        :param timeout: the maximum wait in seconds, None to wait forever
+        :param out: the buffer to copy the frame into, default a new array
+        :return: (seq, capture time, faces, frame), None on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.seq > after:
+                item = self.read(out=out)
+                if item is not None:
+                    return item
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(FrameBusReader.POLL_TIME)
+
+    def close(self) -> None:
+        if self.layout is None:
+            return
+        self.layout = None
+        self.shm.close()
+
+
+def main(args=None) -> int:
+    """Follow a frame bus from another process, log its rate and lag, and
+    record its frames"""
+    parser = argparse.ArgumentParser(
+        prog="face_track framebus",
+        description="read the frames of face_track --frame-bus NAME")
+    parser.add_argument("name", help="the frame bus name")
+    parser.add_argument("--record",
+                        metavar="FILE",
+                        help="write the frames to the video FILE")
+    parser.add_argument("--fps",
+                        type=float,
+                        default=30.0,
+                        help="frame rate of the recorded video")
+    parser.add_argument("--timeout",
+                        type=float,
+                        default=5.0,
+                        metavar="SEC",
+                        help="stop when no frame arrived for SEC")
+    opts = parser.parse_args(args)
+
+    reader = FrameBusReader(opts.name)
+    h, w = reader.shape[:2]
+    writer = None
+    if opts.record:
+        writer = cv2.VideoWriter(opts.record, cv2.VideoWriter_fourcc(*'XVID'),
+                                 opts.fps, (w, h))
+    frame = np.empty(reader.shape, np.uint8)
+    seq, frames, skipped, lags = -1, 0, 0, []
+    report_time = time.monotonic()
+    try:
+        while True:
+            item = reader.wait(seq, opts.timeout, frame)
+            if item is None:
+                break
+            if seq >= 0:
+                skipped += item[0] - seq - 1
+            seq, timestamp, faces, frame = item
+            lags.append(time.monotonic() - timestamp)
+            frames += 1
+            if writer is not None:
+                writer.write(frame)
+            now = time.monotonic()
+            if now - report_time >= 1.0:
+                p50, p95 = np.percentile(np.asarray(lags) * 1000, (50, 95))
+                FrameBus.LOGGER.info(
+                    f"seq {seq} frames {frames} skipped {skipped} "
+                    f"faces {len(faces)} lag ms: p50 {p50:.1f} p95 {p95:.1f}")
+                report_time, lags = now, []
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if writer is not None:
+            writer.release()
+        reader.close()
+    FrameBus.LOGGER.info(f"{frames} frames read, {skipped} skipped, "
+                         f"{reader.torn} torn")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+Color = Tuple[int, int, int]  # BGR
+Rect = Tuple[int, int, int, int]  # (x0, y0, x1, y1) in pixel
+
+
+class Widget(object):
+    """A text item of the HUD"""
+    def __init__(self,
+                 name: str,
+                 org: Tuple[int, int],
+                 font: int = cv2.FONT_HERSHEY_PLAIN,
+                 scale: float = 1.0,
+                 thickness: int = 1) -> None:
+        """Initialize a Widget instance
+        :param name: the widget name
+        :param org: the bottom-left corner of the text in pixel, as cv2.putText
+        :param font: the cv2 font face
+        :param scale: the font scale
+        :param thickness: the line thickness
+        :return: None
+        """
+        super().__init__()
+        self.name: str = name
+        self.org: Tuple[int, int] = org
+        self.font: int = font
+        self.scale: float = scale
+        self.thickness: int = thickness
+        self.text: Optional[str] = None
+        self.color: Optional[Color] = None
+        self.rect: Optional[Rect] = None  # the rasterized area in the frame
+        # flat byte offsets of the covered pixels in a (h, w, 3) frame, and the
+        # byte values to write there
+        self.index = np.empty(0, dtype=np.intp)
+        self.values = np.empty(0, dtype=np.uint8)
+        self.raster_count: int = 0
+
+
+class Hud(object):
+    """Retained-mode HUD compositor.
+
+    A widget is rasterized only when its text or color changes, into the
+    flat offsets of the frame bytes it covers and their values. compose()
+    writes the cached bytes of all widgets onto a frame in one vectorized
+    assignment, so the per-frame cost is proportional to the text pixels,
+    not to the frame size or the number of cv2.putText calls.
+    """
+    def __init__(self, w: int, h: int) -> None:
+        """Initialize a Hud instance
+        :param w: the frame width in pixel
+        :param h: the frame height in pixel
+        :return: None
+        """
+        super().__init__()
+        self.w: int = w
+        self.h: int = h
+        self.widgets: Dict[str, Widget] = {}
+        self.dirty: bool = True
+        self.index = np.empty(0, dtype=np.intp)
+        self.values = np.empty(0, dtype=np.uint8)
+
+    def add(self, name: str, org: Tuple[int, int], **kwargs) -> Widget:
+        """Add a widget, see Widget for the arguments"""
+        widget = Widget(name, org, **kwargs)
+        self.widgets[name] = widget
+        self.dirty = True
+        return widget
+
+    def set(self, name: str, text: str, color: Color) -> bool:
+        """Update the value of a widget, rasterizing it if it changed
+        :param name: the widget name
+        :param text: the text to show
+        :param color: the text color in BGR
+        :return: True if the widget was rasterized again
+        """
+        widget = self.widgets[name]
+        if text == widget.text and color == widget.color:
+            return False
+        (tw, th), base = cv2.getTextSize(text, widget.font, widget.scale,
+                                         widget.thickness)
+        x, y = widget.org
+        x0, y0 = max(0, x - widget.thickness), max(0, y - th - widget.thickness)
+        x1 = min(self.w, x + tw + widget.thickness)
+        y1 = min(self.h, y + base + widget.thickness)
+        # text coverage, drawn like cv2.putText on the frame with LINE_8
+        coverage = np.zeros((max(0, y1 - y0), max(0, x1 - x0)), dtype=np.uint8)
+        cv2.putText(coverage, text, (x - x0, y - y0), widget.font, widget.scale,
+                    255, widget.thickness)
+        rows, cols = np.nonzero(coverage)
+        pixels = (rows + y0) * self.w + cols + x0
+        widget.index = (pixels[:, None] * 3 + np.arange(3)).ravel()
+        widget.values = np.tile(np.asarray(color, dtype=np.uint8), len(pixels))
+        widget.text, widget.color, widget.rect = text, color, (x0, y0, x1, y1)
+        widget.raster_count += 1
+        self.dirty = True
+        return True
+
+    def compose(self, img: np.ndarray) -> None:
+        """Draw the HUD onto a contiguous (h, w, 3) frame in place"""
+        if img.shape != (self.h, self.w, 3) or not img.flags.c_contiguous:
+            raise ValueError(f"HUD needs a contiguous {self.w}x{self.h} BGR frame")
+        if self.dirty:
+            drawn = [w for w in self.widgets.values() if w.text is not None]
+            if drawn:
+                self.index = np.concatenate([w.index for w in drawn])
+                self.values = np.concatenate([w.values for w in drawn])
+            self.dirty = False
+        img.reshape(-1)[self.index] = self.values
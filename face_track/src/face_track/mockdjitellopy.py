@@ -7,11 +7,12 @@ import logging
 import random
 import socket
 import time
-from threading import Thread
 from typing import Dict, Optional, Type, Union
 
 import cv2  # type: ignore
 
+from face_track.source import FrameReader, open_source
+
 
 class Tello:
     """Mock Python wrapper to interact with the Ryze Tello drone using the official Tello api.
@@ -35,6 +36,11 @@ class Tello:
     CONTROL_UDP_PORT = 8889
     STATE_UDP_PORT = 8890
 
+    # Mock video stream, see face_track.source.open_source
+    VIDEO_SOURCE = 'webcam:0'
+    VIDEO_PACING = 'original'  # original, fixed or none
+    VIDEO_FPS = 30.0
+
     # Set up logger
     HANDLER = logging.StreamHandler()
     FORMATTER = logging.Formatter(
@@ -54,9 +60,25 @@ class Tello:
     stream_on = False
     is_flying = False
 
-    def __init__(self, host=TELLO_IP, retry_count=RETRY_COUNT):
+    def __init__(self,
+                 host=TELLO_IP,
+                 retry_count=RETRY_COUNT,
+                 source=VIDEO_SOURCE,
+                 pacing=VIDEO_PACING,
+                 fps=VIDEO_FPS,
+                 loop=True):
+        """Arguments:
+            source: the mock video stream, a camera index, "webcam:<index>", a video file or an image directory
+            pacing: replay by the original timestamps, at a fixed fps, or as fast as possible (none)
+            fps: the frame rate of fixed pacing and of image directories
+            loop: replay a video file or image directory from the start when it ends
+        """
         self.host = host
         self.retry_count = retry_count
+        self.source = source
+        self.pacing = pacing
+        self.fps = fps
+        self.loop = loop
         self.stream_on = False
         self.battery = 70
         self.temph = 46
@@ -67,6 +89,20 @@ class Tello:
         """
         pass
 
+    def get_current_state(self) -> dict:
+        """Call this function to attain the state of the Tello. Returns a dict
+        with all fields.
+        Internal method, you normally wouldn't call this yourself.
+        """
+        return {
+            'bat': self.get_battery(),
+            'temph': self.get_highest_temperature(),
+            'agx': self.get_acceleration_x(),
+            'agy': self.get_acceleration_y(),
+            'agz': self.get_acceleration_z(),
+            'tof': self.get_distance_tof(),
+        }
+
     def get_battery(self) -> int:
         """Get current battery percentage
         Returns:
@@ -180,7 +216,7 @@ class Tello:
             BackgroundFrameRead
         """
         if self.background_frame_read is None:
-            address = 0  #self.get_udp_video_address()
+            address = self.get_udp_video_address()
             self.background_frame_read = BackgroundFrameRead(
                 self, address)  # also sets self.cap
             self.background_frame_read.start()
@@ -192,7 +228,7 @@ class Tello:
         #address_schema = 'udp://@{ip}:{port}'  # + '?overrun_nonfatal=1&fifo_size=5000'
         #address = address_schema.format(ip=self.VS_UDP_IP, port=self.VS_UDP_PORT)
         #return address
-        return "0"
+        return self.source
 
     def get_video_capture(self):
         """Get the VideoCapture object from the camera drone.
@@ -202,10 +238,7 @@ class Tello:
         """
 
         if self.cap is None:
-            self.cap = cv2.VideoCapture(self.get_udp_video_address())
-
-        if not self.cap.isOpened():
-            self.cap.open(self.get_udp_video_address())
+            self.get_frame_read()  # also sets self.cap
 
         return self.cap
 
@@ -244,8 +277,8 @@ class Tello:
                                           clamp100(forward_backward_velocity),
                                           clamp100(up_down_velocity),
                                           clamp100(yaw_velocity))
-        #self.send_command_without_return(cmd)
-        self.send_control_command(cmd)
+            #self.send_command_without_return(cmd)
+            self.send_control_command(cmd)
 
     def move(self, direction: str, x: int):
         """Tello fly up, down, left, right, forward or back with distance x cm.
@@ -264,46 +297,15 @@ class Tello:
         self.move("up", x)
 
 
-class BackgroundFrameRead:
+class BackgroundFrameRead(FrameReader):
     """
-    Mock This class read frames from a VideoCapture in background. Use
-    backgroundFrameRead.frame to get the current frame.
+    Mock This class read frames from a frame source (webcam, video file or
+    image directory) in background. Use backgroundFrameRead.frame to get the
+    current frame.
     """
     def __init__(self, tello, address):
-        tello.cap = cv2.VideoCapture(address)
-
-        self.cap = tello.cap
-
-        if not self.cap.isOpened():
-            self.cap.open(address)
-
-        self.grabbed, self.frame = self.cap.read()
-        if not self.grabbed or self.frame is None:
-            raise Exception('Failed to grab first frame from video stream')
-
-        self.stopped = False
-        self.worker = Thread(target=self.update_frame, args=(), daemon=True)
-
-    def start(self):
-        """Start the frame update worker
-        Internal method, you normally wouldn't call this yourself.
-        """
-        self.worker.start()
-
-    def update_frame(self):
-        """Thread worker function to retrieve frames from a VideoCapture
-        Internal method, you normally wouldn't call this yourself.
-        """
-        while not self.stopped:
-            if not self.grabbed or not self.cap.isOpened():
-                self.stop()
-            else:
-                self.grabbed, frame = self.cap.read()
-                self.frame = frame.copy()
-
-    def stop(self):
-        """Stop the frame update worker
-        Internal method, you normally wouldn't call this yourself.
-        """
-        self.stopped = True
-        self.worker.join()
+        super().__init__(open_source(address, fps=tello.fps),
+                         pacing=tello.pacing,
+                         fps=tello.fps,
+                         loop=tello.loop)
+        tello.cap = getattr(self.source, 'cap', None)
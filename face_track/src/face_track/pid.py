@@ -1,6 +1,11 @@
 # -*- coding: utf-8 -*-
 import logging
 import time
+from typing import Optional, Sequence
+
+import numpy as np
+
+from face_track.profiler import hotpath
 
 
 class PID(object):
@@ -63,6 +68,7 @@ class PID(object):
         self.cD = 0.0
         self.cV = 0.0
 
+    @hotpath
     def update(self, pv: float) -> float:
         """ calculate the control value
         :param pv: the process variable, the error = SP - PV (SP is the setpoint, and PV(t) is the process variable)
@@ -92,12 +98,229 @@ class PID(object):
         self.prevError = error
 
         # sum the terms and return
-        self.cV = sum(
-            [self.kP * self.cP, self.kI * self.cI, self.kD * self.cD])
-        PID.LOGGER.debug(
-            f"{self.name} {self.cP} {self.cI} {self.cD} {self.cV}")
+        self.cV = self.kP * self.cP + self.kI * self.cI + self.kD * self.cD
+        if PID.LOGGER.isEnabledFor(logging.DEBUG):
+            PID.LOGGER.debug(
+                f"{self.name} {self.cP} {self.cI} {self.cD} {self.cV}")
 
         return self.cV
 
     def __str__(self) -> str:
         return f"{self.name} {self.cP} {self.cI} {self.cD} {self.cV}"
+
+
+def _clamp(x: float, limit: float) -> float:
+    """Clip a float to [-limit, limit], x itself if it is within"""
+    return limit if x > limit else -limit if x < -limit else x
+
+
+def _bleed(i: float, excess: float) -> float:
+    """Add excess to the integral term, towards zero but not beyond"""
+    if not excess:
+        return i
+    bled = i + excess
+    if i < 0.0:
+        return i if bled < i else 0.0 if bled > 0.0 else bled
+    return 0.0 if bled < 0.0 else i if bled > i else bled
+
+
+def _clamp_array(x: np.ndarray, limit: np.ndarray) -> np.ndarray:
+    return np.clip(x, -limit, limit)
+
+
+def _bleed_array(i: np.ndarray, excess: np.ndarray) -> np.ndarray:
+    return np.clip(i + excess, np.minimum(i, 0.0), np.maximum(i, 0.0))
+
+
+class _Param(object):
+    """A PIDBank parameter, a read-only array of the bank shape, so that
+    only an assignment changes it, which the next update sees"""
+    def __set_name__(self, owner, name: str) -> None:
+        self.name = '_' + name
+
+    def __get__(self, bank, owner=None):
+        return self if bank is None else getattr(bank, self.name)
+
+    def __set__(self, bank, value) -> None:
+        value = np.array(np.broadcast_to(
+            np.asarray(value, dtype=np.float64), bank.shape))
+        value.flags.writeable = False
+        setattr(bank, self.name, value)
+        bank._axes = None  # split again by the next update
+
+
+class PIDBank(object):
+    """Several PID controllers updated together from one timestamp.
+
+    The axes are the last dimension of the parameters, and leading
+    dimensions run a batch of independent controllers, e.g. a grid of gains
+    in simulation. The integral term is clamped, and corrected by
+    back-calculation while the output saturates. The derivative of the
+    error is low-pass filtered with time constant tau.
+
+    The update runs the same code for each axis: on Python floats for a
+    single bank, like the four axes of the drone, as a numpy call costs
+    about a microsecond whatever the array size, or on the numpy vectors of
+    the batch. The parameters are read-only arrays, assign them to change
+    them.
+
+    ```python
+    bank = PIDBank(('fb', 'ud'), kP=0.5, kI=0.01, kD=0.1, SP=(120, 240),
+                   limit=(30, 20))
+    fb_v, ud_v = bank.update((pv_fb, pv_ud))
+    ```
+    """
+    LOST_TIME = PID.LOST_TIME
+
+    kP = _Param()
+    kI = _Param()
+    kD = _Param()
+    SP = _Param()
+    limit = _Param()
+    i_limit = _Param()
+    kAW = _Param()
+    tau = _Param()
+
+    def __init__(self,
+                 names: Sequence[str] = (),
+                 kP=0.0,
+                 kI=0.0,
+                 kD=0.0,
+                 SP=0.0,
+                 limit=100.0,
+                 i_limit=None,
+                 kAW=10.0,
+                 tau=0.05) -> None:
+        """Initialize a PIDBank instance, the parameters broadcast together
+        :param names: the axis names
+        :param kP: the proportional gains
+        :param kI: the integral gains
+        :param kD: the derivative gains
+        :param SP: the setpoints
+        :param limit: the output limits, the output is clipped to [-limit, limit]
+        :param i_limit: the integral term limits, default limit
+        :param kAW: the back-calculation anti-windup gain in 1/s, 0 to disable
+        :param tau: the derivative filter time constant in seconds, 0 to disable
+        :return: None
+        """
+        super().__init__()
+        self.names: tuple = tuple(names)
+        if i_limit is None:
+            i_limit = limit
+        self.shape: tuple = np.broadcast(
+            *(np.asarray(v) for v in (kP, kI, kD, SP, limit, i_limit, kAW,
+                                      tau))).shape
+        # the batch shape and the number of axes, a 0-d bank has one axis
+        self.batch: tuple = self.shape[:-1]
+        self.size: int = self.shape[-1] if self.shape else 1
+        if self.batch:
+            self._clamp, self._bleed = _clamp_array, _bleed_array
+        else:
+            self._clamp, self._bleed = _clamp, _bleed
+        self.kP, self.kI, self.kD, self.SP = kP, kI, kD, SP
+        self.limit, self.i_limit, self.kAW, self.tau = limit, i_limit, kAW, tau
+        self.reset()
+
+    def reset(self, t: Optional[float] = None) -> None:
+        """Reset the terms and the time
+        :param t: the current time in seconds, default time.monotonic()
+        :return: None
+        """
+        self.prevTime: float = time.monotonic() if t is None else t
+        self.started: bool = False  # no previous error for the derivative
+        # the terms of each axis: the error, the integral term including kI,
+        # the filtered error derivative and the limited control value, as
+        # floats or the vectors of the batch
+        self._terms: list = [(zero, zero, zero, zero)
+                             for zero in self._split(0.0)]
+
+    def _split(self, a) -> list:
+        """Return the values of each axis of a, broadcast to the bank shape,
+        a itself if it is a sequence of the axis values of a single bank"""
+        if not self.batch:
+            if isinstance(a, (tuple, list)) and len(a) == self.size:
+                return a
+            if isinstance(a, np.ndarray) and a.shape == self.shape == (
+                    self.size, ):
+                return a.tolist()
+        a = np.broadcast_to(np.asarray(a, dtype=np.float64),
+                            self.shape).reshape(self.batch + (self.size, ))
+        if not self.batch:
+            return a.tolist()
+        return [a[..., k] for k in range(self.size)]
+
+    def _join(self, values: list) -> np.ndarray:
+        """Return the values of the axes as an array of the bank shape"""
+        if self.batch:
+            return np.stack(values, axis=-1).reshape(self.shape)
+        values = np.array(values)  # of floats
+        return values if self.shape else values.reshape(())
+
+    @property
+    def cP(self) -> np.ndarray:
+        """The proportional terms, the errors of the last update"""
+        return self._join([terms[0] for terms in self._terms])
+
+    prevError = cP
+
+    @property
+    def cI(self) -> np.ndarray:
+        """The integral terms, including kI"""
+        return self._join([terms[1] for terms in self._terms])
+
+    @property
+    def cD(self) -> np.ndarray:
+        """The filtered error derivatives"""
+        return self._join([terms[2] for terms in self._terms])
+
+    @property
+    def cV(self) -> np.ndarray:
+        """The limited control values of the last update"""
+        return self._join([terms[3] for terms in self._terms])
+
+    @hotpath
+    def update(self, pv, t: Optional[float] = None) -> np.ndarray:
+        """calculate the control values of all controllers
+        :param pv: the process variables, broadcast to the parameter shape
+        :param t: the time of pv in seconds, default time.monotonic()
+        :return: the limited control values, a tuple of floats, a float for
+            a 0-d bank, or a new array for a batch
+        """
+        now = time.monotonic() if t is None else t
+        dt = min(now - self.prevTime, PIDBank.LOST_TIME)
+        axes = self._axes
+        if axes is None:
+            axes = self._axes = list(
+                zip(*(self._split(a)
+                      for a in (self._SP, self._kP, self._kI, self._kD,
+                                self._limit, self._i_limit, self._kAW,
+                                self._tau))))
+        clamp, bleed = self._clamp, self._bleed
+        derive = self.started and dt > 0.0
+        terms, outputs = [], []
+        for p, (e0, i, d, _), (sp, kP, kI, kD, limit, i_limit, kAW,
+                               tau) in zip(self._split(pv), self._terms, axes):
+            e = sp - p
+            if derive:
+                d = d + ((e - e0) / dt - d) * (dt / (tau + dt))
+            i = clamp(i + kI * e * dt, i_limit)
+            raw = kP * e + i + kD * d
+            v = clamp(raw, limit)
+            if v is not raw and dt > 0.0:
+                # back-calculation: bleed off the integral term while the
+                # output saturates, towards zero but not beyond
+                i = bleed(i, (v - raw) * kAW * dt)
+            terms.append((e, i, d, v))
+            outputs.append(v)
+        self._terms = terms
+        self.prevTime = now
+        self.started = True
+        if PID.LOGGER.isEnabledFor(logging.DEBUG):
+            PID.LOGGER.debug(f"{self}")
+        if self.batch:
+            return self._join(outputs)
+        return tuple(outputs) if self.shape else outputs[0]
+
+    def __str__(self) -> str:
+        return (f"{' '.join(self.names)} P {self.cP} I {self.cI} "
+                f"D {self.cD} V {self.cV}")
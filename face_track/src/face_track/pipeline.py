@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""Pipelined main loop: capture -> detect -> control -> render on separate threads.
+"""
+import collections
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+
+import cv2
+
+from face_track.pool import DetectorPool
+from face_track.tracker import FaceTracker
+
+
+class LatestQueue(object):
+    """A bounded queue between two pipeline stages.
+
+    When the queue is full the oldest pending item is discarded, so a slow
+    consumer always gets the newest data instead of a backlog.
+    """
+    def __init__(self,
+                 name: str = '',
+                 maxsize: int = 1,
+                 on_drop: Optional[Callable[[Any], None]] = None) -> None:
+        """Initialize a LatestQueue instance
+        :param name: the name of the queue, used in statistics
+        :param maxsize: the maximum number of pending items
+        :param on_drop: called with each discarded item
+        :return: None
+        """
+        super().__init__()
+        self.name: str = name
+        self.on_drop: Optional[Callable[[Any], None]] = on_drop
+        self._items: collections.deque = collections.deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._closed: bool = False
+        self.put_count: int = 0
+        self.drop_count: int = 0
+
+    def put(self, item: Any) -> None:
+        """Add an item, dropping the oldest pending one if the queue is full
+        :param item: the item to add
+        :return: None
+        """
+        with self._cond:
+            dropped = len(self._items) == self._items.maxlen
+            if dropped:
+                old = self._items.popleft()
+                self.drop_count += 1
+            self._items.append(item)
+            self.put_count += 1
+            self._cond.notify()
+        if dropped and self.on_drop is not None:
+            self.on_drop(old)
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """Remove and return the oldest pending item
+        :param timeout: the maximum time to wait in seconds, None waits forever
+        :return: the item, or None on timeout or when the queue is closed
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._closed,
+                                       timeout):
+                return None
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def close(self) -> None:
+        """Wake up all consumers, further get() calls return None"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __str__(self) -> str:
+        return f"{self.name} put {self.put_count} dropped {self.drop_count}"
+
+
+class Pipeline(object):
+    """Run FaceTracker as a pipeline of stages connected by LatestQueue.
+
+    Capture, detection and control run on worker threads. Rendering (HUD,
+    imshow, waitKey) runs on the calling thread because most GUI backends
+    require it. The control stage always uses the newest detection result
+    and never waits on rendering or display.
+
+    With a DetectorPool, the capture stage submits frames to the worker
+    processes and the detect stage collects the newest results. ROI search
+    and tracking between detections are not used in this mode, since each
+    frame may go to a different worker.
+
+    The stages pass the FrameRing buffers of FaceTracker.readFrame without a
+    copy. Capture holds the buffer of each frame, and it is released after
+    rendering or when the frame is dropped, so capture waits for a buffer
+    instead of overwriting a frame a stage still uses. The queue items
+    start with the ring sequence number of their frame.
+    """
+    HANDLER = logging.StreamHandler()
+    FORMATTER = logging.Formatter(
+        '[%(levelname)s] %(filename)s - %(lineno)d - %(message)s')
+    HANDLER.setFormatter(FORMATTER)
+
+    LOGGER = logging.getLogger('pipeline')
+    LOGGER.addHandler(HANDLER)
+    LOGGER.setLevel(logging.INFO)
+
+    POLL_TIME: float = 0.1  # queue wait timeout in seconds, bounds stop latency
+
+    def __init__(self,
+                 tracker: FaceTracker,
+                 pool: Optional[DetectorPool] = None,
+                 display: bool = True) -> None:
+        """Initialize a Pipeline instance
+        :param tracker: the FaceTracker performing the stage work
+        :param pool: the detection worker processes, None detects on the detect thread
+        :param display: show the frames, False skips imshow and waitKey
+        :return: None
+        """
+        super().__init__()
+        self.display: bool = display
+        self.tracker: FaceTracker = tracker
+        self.pool: Optional[DetectorPool] = pool
+        self.inflight: dict = {}  # frames submitted to the pool by sequence number
+        self._lock = threading.Lock()
+        self.detect_q = LatestQueue('detect', on_drop=self.release)
+        self.control_q = LatestQueue('control')
+        self.render_q = LatestQueue('render', on_drop=self.release)
+        self.stopped = threading.Event()
+        stages = (('capture', self.capture), ('detect', self.detect),
+                  ('control', self.control))
+        self.workers = [
+            threading.Thread(target=self._run,
+                             args=(stage, ),
+                             name=name,
+                             daemon=True) for name, stage in stages
+        ]
+        self.latency: float = 0.0  # smoothed capture to rc command latency
+        self.control_count: int = 0
+
+    def _run(self, stage: Callable[[], None]) -> None:
+        try:
+            while not self.stopped.is_set():
+                stage()
+        except Exception:
+            Pipeline.LOGGER.exception(
+                f"{threading.current_thread().name} stage failed")
+            self.stop()
+
+    def capture(self) -> None:
+        """Capture stage: push each new camera frame to the detect stage"""
+        img = self.tracker.readFrame(Pipeline.POLL_TIME)
+        if img is None:
+            return
+        t = self.tracker.frame_time
+        frame = self.tracker.frames.seq
+        self.tracker.frames.hold(frame)
+        if self.pool is None:
+            self.detect_q.put((frame, t, img))
+            return
+        with self._lock:
+            seq = self.pool.submit(img)
+            if seq is None:
+                self.release((frame, ))
+            else:
+                self.inflight[seq] = (frame, t, img)
+
+    def detect(self) -> None:
+        """Detect stage: find faces in the newest frame"""
+        if self.pool is not None:
+            self.detectPool()
+            return
+        item = self.detect_q.get(Pipeline.POLL_TIME)
+        if item is None:
+            return
+        frame, t, img = item
+        img, info = self.tracker.findFace(img)
+        self.control_q.put((t, info))
+        self.render_q.put((frame, img))
+
+    def detectPool(self) -> None:
+        """Detect stage: collect the newest result of the detection workers"""
+        result = self.pool.get(Pipeline.POLL_TIME)
+        if result is None:
+            return
+        seq, faces = result
+        with self._lock:
+            item = self.inflight.pop(seq, None)
+            if item is None:
+                # stale, the frame was released when a newer result came in
+                return
+            frame, t, img = item
+            # frames submitted before seq will not be used any more
+            for old in [s for s in self.inflight if s < seq]:
+                self.release(self.inflight.pop(old))
+        img, info = self.tracker.pickFace(img, faces)
+        self.control_q.put((t, info))
+        self.render_q.put((frame, img))
+
+    def control(self) -> None:
+        """Control stage: send rc command for the newest detection result"""
+        item = self.control_q.get(Pipeline.POLL_TIME)
+        if item is None:
+            return
+        t, info = item
+        self.tracker.trackFace(info, t)
+        latency = time.monotonic() - t
+        self.control_count += 1
+        # exponential moving average, seeded by the first sample
+        alpha = 0.1 if self.control_count > 1 else 1.0
+        self.latency += alpha * (latency - self.latency)
+
+    def render(self) -> bool:
+        """Render stage: draw HUD and show the newest annotated frame
+        :return: False if a key was pressed to stop the flight
+        """
+        item = self.render_q.get(Pipeline.POLL_TIME)
+        if item is None:
+            return not self.display or cv2.waitKey(1) == -1
+        frame, img = item
+        try:
+            tracer = self.tracker.tracer
+            with tracer.span('hud'):
+                self.tracker.putHud(img)
+            self.tracker.setAnnotatedImage(img)
+            if not self.display:
+                return True
+            with tracer.span('display'):
+                cv2.imshow("Alpha Drone", img)
+                key = cv2.waitKey(1)
+            return key == -1
+        finally:
+            self.release(item)
+
+    def release(self, item: tuple) -> None:
+        """Release the ring buffer of the frame of a queue item"""
+        self.tracker.frames.release(item[0])
+
+    def start(self) -> None:
+        for w in self.workers:
+            w.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        for q in (self.detect_q, self.control_q, self.render_q):
+            q.close()
+
+    def join(self) -> None:
+        for w in self.workers:
+            if w is not threading.current_thread():
+                w.join()
+        Pipeline.LOGGER.info(
+            f"{self.detect_q}, {self.control_q}, {self.render_q}, "
+            f"capture to rc latency {self.latency * 1000:.1f} ms")
+
+    def run(self, keep_running: Callable[[], bool] = lambda: True) -> None:
+        """Run the pipeline until a key is pressed or keep_running() is False
+        :param keep_running: polled on the render thread once per iteration
+        :return: None
+        """
+        self.start()
+        try:
+            while keep_running() and not self.stopped.is_set():
+                if not self.render():
+                    break
+        finally:
+            self.stop()
+            self.join()
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""Face detection on a pool of worker processes.
+
+Each worker process owns its own detector, so detection runs on several
+cores instead of contending for the GIL.
+"""
+import logging
+import multiprocessing
+import queue
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from face_track.detector import create_detector
+
+
+def _work(inq, outq, detector: str, scale: float, minSize: Tuple[int, int],
+          maxSize: Tuple[int, int]) -> None:
+    """Worker process: detect faces in (seq, image) items until None arrives."""
+    # one OpenCV thread per worker, the pool itself provides the parallelism
+    cv2.setNumThreads(1)
+    try:
+        det = create_detector(detector)
+        det.load()
+    except Exception as e:
+        outq.put((-1, e))  # raised by the pool in the main process
+        return
+    outq.put((-1, []))  # ready
+    while True:
+        item = inq.get()
+        if item is None:
+            break
+        seq, image = item
+        outq.put((seq, det.detect(image, minSize, maxSize, scale)))
+
+
+class DetectorPool(object):
+    """Distribute frames to N detection worker processes.
+
+    In ordered mode every submitted frame is detected and results are
+    returned in submission order. In latest-wins mode a frame is dropped
+    when every worker has a frame in flight, so no frame waits in the queue
+    for a worker, and only results newer than the last returned one are
+    kept.
+    """
+    HANDLER = logging.StreamHandler()
+    FORMATTER = logging.Formatter(
+        '[%(levelname)s] %(filename)s - %(lineno)d - %(message)s')
+    HANDLER.setFormatter(FORMATTER)
+
+    LOGGER = logging.getLogger('pool')
+    LOGGER.addHandler(HANDLER)
+    LOGGER.setLevel(logging.INFO)
+
+    READY_TIMEOUT: float = 60.0  # in seconds, to load the detectors
+    CLOSE_TIMEOUT: float = 1.0  # in seconds, to stop a worker
+
+    def __init__(self,
+                 workers: int = 2,
+                 detector: str = 'haar',
+                 scale: float = 1.0,
+                 minSize: Tuple[int, int] = (20, 20),
+                 maxSize: Tuple[int, int] = (200, 200),
+                 ordered: bool = True) -> None:
+        """Initialize a DetectorPool instance and start the worker processes
+        :param workers: the number of worker processes
+        :param detector: the face detector backend name
+        :param scale: the detection scale
+        :param minSize: the smallest face size in pixel
+        :param maxSize: the largest face size in pixel
+        :param ordered: return every result in order, otherwise latest wins
+        :return: None
+        """
+        super().__init__()
+        self.workers: int = workers
+        self.ordered: bool = ordered
+        # converts BGR frames to the detector input before they are pickled
+        self.prepare = create_detector(detector).prepare
+        # spawn, forking a process that runs OpenCV threads may deadlock
+        ctx = multiprocessing.get_context('spawn')
+        self.inq = ctx.Queue(maxsize=2 * workers)
+        self.outq = ctx.Queue()
+        self.procs = [
+            ctx.Process(target=_work,
+                        args=(self.inq, self.outq, detector, scale, minSize,
+                              maxSize),
+                        daemon=True) for _ in range(workers)
+        ]
+        self.next_seq: int = 0  # the next sequence number to submit
+        self.next_out: int = 0  # the next sequence number to return, ordered mode
+        self.pending: Dict[int, List[tuple]] = {}  # out of order results
+        self.submit_count: int = 0
+        self.done_count: int = 0  # results received, returned or not
+        self.drop_count: int = 0
+        for p in self.procs:
+            p.start()
+        try:
+            self.waitReady()
+        except BaseException:
+            self.close()
+            raise
+
+    def waitReady(self) -> None:
+        """Wait until every worker loaded its detector
+        :raise: the exception of a worker that failed to load, or
+            RuntimeError if a worker died or the detectors did not load in time
+        """
+        deadline = time.monotonic() + DetectorPool.READY_TIMEOUT
+        ready = 0
+        while ready < self.workers:
+            try:
+                _, result = self.outq.get(timeout=0.5)
+            except queue.Empty:
+                if not all(p.is_alive() for p in self.procs):
+                    raise RuntimeError("a detection worker died on startup")
+                if time.monotonic() > deadline:
+                    raise RuntimeError(
+                        f"detection workers not ready after "
+                        f"{DetectorPool.READY_TIMEOUT} s")
+                continue
+            if isinstance(result, BaseException):
+                raise result
+            ready += 1
+
+    @property
+    def inflight(self) -> int:
+        """The number of frames submitted and not detected yet"""
+        # each counter is written by one thread, submit() or get()
+        return self.submit_count - self.done_count
+
+    def submit(self, img: np.ndarray) -> Optional[int]:
+        """Submit a BGR frame for detection
+        :param img: the frame
+        :return: the frame sequence number, None if dropped in latest-wins mode
+        """
+        if not self.ordered and self.inflight >= self.workers:
+            self.drop_count += 1  # a newer frame goes to the next free worker
+            return None
+        # the queue pickles on a feeder thread, and prepare() reuses its buffer
+        item = (self.next_seq, self.prepare(img).copy())
+        self.inq.put(item)
+        self.next_seq += 1
+        self.submit_count += 1
+        return item[0]
+
+    def get(self, timeout: Optional[float] = None) -> Optional[tuple]:
+        """Return the next detection result
+        :param timeout: the maximum time to wait in seconds, None waits forever
+        :return: (seq, faces), or None on timeout
+        """
+        while True:
+            if self.ordered and self.next_out in self.pending:
+                seq = self.next_out
+                self.next_out += 1
+                return seq, self.pending.pop(seq)
+            try:
+                seq, faces = self.outq.get(timeout=timeout)
+            except queue.Empty:
+                return None
+            self.done_count += 1
+            if not self.ordered:
+                if seq < self.next_out:
+                    continue  # older than a result already returned
+                self.next_out = seq + 1
+                return seq, faces
+            self.pending[seq] = faces
+
+    def close(self) -> None:
+        DetectorPool.LOGGER.info(str(self))
+        # the frames not started yet are not needed, make room for the stops
+        try:
+            while True:
+                self.inq.get_nowait()
+        except queue.Empty:
+            pass
+        for _ in self.procs:
+            try:
+                self.inq.put(None, timeout=DetectorPool.CLOSE_TIMEOUT)
+            except queue.Full:
+                break  # terminated below
+        for p in self.procs:
+            p.join(timeout=DetectorPool.CLOSE_TIMEOUT)
+            if p.is_alive():
+                p.terminate()
+        self.procs = []
+
+    def __enter__(self) -> 'DetectorPool':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __str__(self) -> str:
+        return (f"pool {self.workers} workers, submitted {self.submit_count} "
+                f"dropped {self.drop_count}")
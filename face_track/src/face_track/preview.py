@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""Low-rate MJPEG preview over HTTP, instead of a window.
+
+The frame loop hands each annotated frame to `PreviewServer.submit`, which
+keeps a copy only when a client is connected and the next preview frame is
+due. An encoder thread compresses it to JPEG, and every connected client
+gets the newest JPEG as a multipart/x-mixed-replace stream, which browsers
+show as video:
+
+* http://HOST:PORT/ a page with the stream and a stop button
+* http://HOST:PORT/stream the MJPEG stream, e.g. for ffplay or VLC
+* POST http://HOST:PORT/stop stops the flight, like a key press in the window
+"""
+import http.server
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+PAGE: bytes = b"""<!DOCTYPE html>
+<html><head><title>Alpha Drone</title></head>
+<body style="margin:0;background:#000">
+<img src="/stream" style="display:block;margin:auto;max-width:100%">
+<form method="post" action="/stop" style="text-align:center">
+<button type="submit">Stop</button></form>
+</body></html>
+"""
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Serve the page, the MJPEG stream and the stop command"""
+    server_version = "AlphaDrone"
+
+    def do_GET(self) -> None:
+        preview: PreviewServer = self.server.preview
+        if self.path == '/':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(PAGE)))
+            self.end_headers()
+            self.wfile.write(PAGE)
+        elif self.path == '/stream':
+            self.send_response(200)
+            self.send_header('Content-Type',
+                             'multipart/x-mixed-replace; boundary=frame')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            preview.stream(self.wfile)
+        else:
+            self.send_error(404)
+
+    def do_POST(self) -> None:
+        preview: PreviewServer = self.server.preview
+        if self.path != '/stop':
+            self.send_error(404)
+            return
+        body = b"stopping\n"
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        preview.requestStop()
+
+    def log_message(self, format: str, *args) -> None:
+        PreviewServer.LOGGER.debug(f"{self.address_string()} {format % args}")
+
+
+class PreviewServer(object):
+    """Serve the annotated frames as MJPEG at a low rate, see the module doc.
+
+    ```python
+    preview = PreviewServer(port=8080, fps=5, on_stop=stop)
+    preview.start()
+    preview.submit(img)  # from the frame loop, copies only when due
+    preview.stop()
+    ```
+    """
+    HANDLER = logging.StreamHandler()
+    FORMATTER = logging.Formatter(
+        '[%(levelname)s] %(filename)s - %(lineno)d - %(message)s')
+    HANDLER.setFormatter(FORMATTER)
+
+    LOGGER = logging.getLogger('preview')
+    LOGGER.addHandler(HANDLER)
+    LOGGER.setLevel(logging.INFO)
+
+    WAIT_TIME: float = 0.5  # in seconds, to check for stop
+
+    def __init__(self,
+                 host: str = '127.0.0.1',
+                 port: int = 8080,
+                 fps: float = 5.0,
+                 quality: int = 70,
+                 on_stop: Optional[Callable[[], None]] = None) -> None:
+        """Initialize a PreviewServer instance
+        :param host: the address to listen on
+        :param port: the HTTP port
+        :param fps: the preview frame rate
+        :param quality: the JPEG quality, 0 to 100
+        :param on_stop: called when a client posts /stop
+        :return: None
+        """
+        super().__init__()
+        self.address: Tuple[str, int] = (host, port)
+        self.interval: float = 1.0 / fps
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+        self.on_stop = on_stop
+        self.clients: int = 0  # the connected stream clients
+        self.due: float = 0.0  # time.monotonic() of the next preview frame
+        self._frame: Optional[np.ndarray] = None  # waiting for the encoder
+        self._frame_cond = threading.Condition()
+        self.jpeg: Optional[bytes] = None  # the newest encoded frame
+        self.jpeg_seq: int = -1
+        self._jpeg_cond = threading.Condition()
+        self.stats: Dict[str, int] = {
+            'frames': 0,  # frames passed to submit()
+            'encoded': 0,  # frames encoded to JPEG
+            'idle': 0,  # frames not encoded, no client connected
+        }
+        self.stopped = threading.Event()
+        self.httpd: Optional[http.server.ThreadingHTTPServer] = None
+        self.server_thread: Optional[threading.Thread] = None
+        self.encoder = threading.Thread(target=self.update,
+                                        name='preview',
+                                        daemon=True)
+
+    def start(self) -> None:
+        self.httpd = http.server.ThreadingHTTPServer(self.address, _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.preview = self
+        self.server_thread = threading.Thread(target=self.httpd.serve_forever,
+                                              name='preview-http',
+                                              daemon=True)
+        self.server_thread.start()
+        self.encoder.start()
+        host, port = self.httpd.server_address[:2]
+        PreviewServer.LOGGER.info(f"preview on http://{host}:{port}/")
+
+    def submit(self, frame: np.ndarray) -> None:
+        """Offer an annotated frame, copied if a client waits for the next
+        preview frame, else ignored"""
+        self.stats['frames'] += 1
+        if self.clients == 0:
+            self.stats['idle'] += 1
+            return
+        now = time.monotonic()
+        if now < self.due:
+            return
+        self.due = now + self.interval
+        with self._frame_cond:
+            self._frame = frame.copy()
+            self._frame_cond.notify()
+
+    def update(self) -> None:
+        """Thread worker function to encode the submitted frames"""
+        while not self.stopped.is_set():
+            with self._frame_cond:
+                self._frame_cond.wait_for(
+                    lambda: self._frame is not None or self.stopped.is_set(),
+                    PreviewServer.WAIT_TIME)
+                frame, self._frame = self._frame, None
+            if frame is None:
+                continue
+            ok, buf = cv2.imencode('.jpg', frame, self.params)
+            if not ok:
+                continue
+            self.stats['encoded'] += 1
+            with self._jpeg_cond:
+                self.jpeg = buf.tobytes()
+                self.jpeg_seq += 1
+                self._jpeg_cond.notify_all()
+
+    def stream(self, wfile) -> None:
+        """Write the JPEG frames to a client until it disconnects"""
+        with self._jpeg_cond:
+            self.clients += 1
+        seq = -1
+        try:
+            while not self.stopped.is_set():
+                with self._jpeg_cond:
+                    ready = self._jpeg_cond.wait_for(
+                        lambda: self.jpeg_seq > seq or self.stopped.is_set(),
+                        PreviewServer.WAIT_TIME)
+                    if not ready:
+                        continue
+                    if self.stopped.is_set():
+                        break
+                    seq, jpeg = self.jpeg_seq, self.jpeg
+                wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n"
+                            b"Content-Length: %d\r\n\r\n" % len(jpeg))
+                wfile.write(jpeg)
+                wfile.write(b"\r\n")
+                wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with self._jpeg_cond:
+                self.clients -= 1
+
+    def requestStop(self) -> None:
+        PreviewServer.LOGGER.info("stop requested")
+        if self.on_stop is not None:
+            self.on_stop()
+
+    def stop(self) -> None:
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+        with self._jpeg_cond:
+            self._jpeg_cond.notify_all()
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+        if self.encoder.is_alive():
+            self.encoder.join()
+        PreviewServer.LOGGER.info(f"preview {self.stats}")
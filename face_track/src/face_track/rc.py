@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+import numpy as np
+
+from face_track.trace import Tracer
+
+Command = Tuple[int, int, int, int]  # (lr, fb, ud, yaw) velocities
+
+
+class RCSender(object):
+    """Send the latest rc setpoint to the Tello at a fixed rate.
+
+    The controller only sets the setpoint; a thread sends it every 1/rate
+    seconds, independent of the frame timing. A setpoint replaced before it
+    was sent is dropped, and a packet identical to the last one sent is
+    skipped unless keepalive seconds have passed since.
+    """
+    HANDLER = logging.StreamHandler()
+    FORMATTER = logging.Formatter(
+        '[%(levelname)s] %(filename)s - %(lineno)d - %(message)s')
+    HANDLER.setFormatter(FORMATTER)
+
+    LOGGER = logging.getLogger('rc')
+    LOGGER.addHandler(HANDLER)
+    LOGGER.setLevel(logging.INFO)
+
+    def __init__(self,
+                 drone,
+                 rate: float = 30.0,
+                 keepalive: float = 1.0,
+                 max_rate: float = 100.0,
+                 tracer: Optional[Tracer] = None) -> None:
+        """Initialize a RCSender instance
+        :param drone: the connected Tello
+        :param rate: the send rate per second
+        :param keepalive: resend an unchanged command after this many seconds
+        :param max_rate: the maximum number of commands per second, caps rate
+        :param tracer: records the rc_send spans
+        :return: None
+        """
+        super().__init__()
+        self.drone = drone
+        if rate > max_rate:
+            RCSender.LOGGER.warning(f"rc rate {rate} capped to {max_rate}")
+        self.rate: float = min(rate, max_rate)
+        self.keepalive: float = keepalive
+        self.tracer: Tracer = tracer or Tracer()
+        self._lock = threading.Lock()
+        self.command: Command = (0, 0, 0, 0)  # the latest setpoint
+        self.pending: bool = False  # the setpoint was not sent yet
+        # the capture time.monotonic() of the frame of the setpoint
+        self.capture_time: Optional[float] = None
+        # capture to send seconds of the recent setpoints sent
+        self.latencies: Deque[float] = deque(maxlen=10000)
+        self.last: Optional[Command] = None  # the last command sent
+        self.last_time: float = 0.0  # when it was sent, time.monotonic()
+        self.stats: Dict[str, int] = {
+            'set': 0,  # setpoints received
+            'sent': 0,  # packets sent
+            'skipped': 0,  # identical packets not sent
+            'dropped': 0,  # setpoints replaced before they were sent
+        }
+        self.stopped = threading.Event()
+        self.worker = threading.Thread(target=self.update,
+                                       name='rc',
+                                       daemon=True)
+
+    def set(self,
+            lr: int,
+            fb: int,
+            ud: int,
+            yaw: int,
+            capture_time: Optional[float] = None) -> None:
+        """Set the rc setpoint, sent on the next tick
+        :param capture_time: the capture time.monotonic() of the frame the
+            setpoint was computed from, to measure the latency
+        :return: None
+        """
+        with self._lock:
+            if self.pending:
+                self.stats['dropped'] += 1
+            self.command = (lr, fb, ud, yaw)
+            self.capture_time = capture_time
+            self.pending = True
+            self.stats['set'] += 1
+
+    def tick(self, now: float) -> bool:
+        """Send the latest setpoint, unless it repeats the last packet
+        :param now: the time.monotonic()
+        :return: True if a packet was sent
+        """
+        with self._lock:
+            command, capture_time = self.command, self.capture_time
+            self.capture_time = None
+            self.pending = False
+        if command == self.last and now - self.last_time < self.keepalive:
+            self.stats['skipped'] += 1
+            return False
+        with self.tracer.span('rc_send'):
+            self.drone.send_rc_control(*command)
+        self.last, self.last_time = command, now
+        self.stats['sent'] += 1
+        if capture_time is not None:
+            self.latencies.append(now - capture_time)
+        return True
+
+    def update(self) -> None:
+        """Thread worker function to send at the configured rate"""
+        interval = 1.0 / self.rate
+        due = time.monotonic()
+        while not self.stopped.wait(max(0.0, due - time.monotonic())):
+            now = time.monotonic()
+            try:
+                self.tick(now)
+            except Exception as e:
+                RCSender.LOGGER.warning(f"rc command failed: {e}")
+            # keep the schedule, skip ticks missed by a stall
+            due += interval * max(1, int((now - due) / interval) + 1)
+
+    def start(self) -> None:
+        self.worker.start()
+
+    def stop(self) -> None:
+        """Stop sending, the drone is told to hover"""
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        if self.worker.is_alive():
+            self.worker.join()
+        with self._lock:
+            self.command, self.capture_time = (0, 0, 0, 0), None
+            self.pending = False
+        self.last = None
+        try:
+            self.tick(time.monotonic())
+        except Exception as e:
+            RCSender.LOGGER.warning(f"rc command failed: {e}")
+        RCSender.LOGGER.info(f"rc commands {self.stats}")
+        if self.latencies:
+            p50, p95, p99 = np.percentile(
+                np.asarray(self.latencies) * 1000, (50, 95, 99))
+            RCSender.LOGGER.info(f"capture to rc send ms: p50 {p50:.1f} "
+                                 f"p95 {p95:.1f} p99 {p99:.1f}")
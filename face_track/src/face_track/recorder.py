@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""Video recording on an encoder process.
+
+Frames are timestamped on a monotonic clock and passed through a bounded
+queue, so a slow encoder never blocks the main loop and never competes with
+detection for the GIL. The output has a constant frame rate: a frame is
+written for each 1/fps slot of wall-clock time, the first frame of a slot
+is sent, and a slot without a frame repeats the previous one.
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+
+def _encode(path: str, w: int, h: int, fps: float, fourcc: str, inq,
+            outq) -> None:
+    """Encoder process: write (slot, frame) items until None arrives."""
+    # the main process stops the recorder on Ctrl-C and SIGTERM, so the
+    # encoder runs in a session of its own, out of reach of the signals to the
+    # process group. A SIGTERM to the encoder itself, which multiprocessing
+    # sends to daemon processes at exit, still ends it.
+    if hasattr(os, 'setsid'):
+        os.setsid()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Python 3.8, else the encoder waits for None after a kill of the parent
+    parent_process = getattr(multiprocessing, 'parent_process', None)
+    parent = parent_process() if parent_process is not None else None
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, (w, h))
+    written, duplicated = 0, 0
+    last_slot, last = -1, None
+    while True:
+        try:
+            item = inq.get(timeout=1.0)
+        except queue.Empty:
+            if parent is not None and not parent.is_alive():
+                break  # the main process was killed, finish the file
+            continue
+        if item is None:
+            break
+        slot, frame = item
+        if frame.shape[1] != w or frame.shape[0] != h:
+            frame = cv2.resize(frame, (w, h))
+        # repeat the previous frame for the slots without a frame
+        if last is not None:
+            for _ in range(slot - last_slot - 1):
+                writer.write(last)
+                duplicated += 1
+        writer.write(frame)
+        written += 1
+        last_slot, last = slot, frame
+    writer.release()
+    outq.put({'written': written + duplicated, 'duplicated': duplicated})
+
+
+class VideoRecorder(object):
+    """Record frames to a video file at a constant frame rate.
+
+    ```python
+    recorder = VideoRecorder("vid.avi", 640, 480, fps=10.0)
+    recorder.start()
+    recorder.write(img)  # from the main loop, never blocks
+    stats = recorder.stop()
+    ```
+    """
+    HANDLER = logging.StreamHandler()
+    FORMATTER = logging.Formatter(
+        '[%(levelname)s] %(filename)s - %(lineno)d - %(message)s')
+    HANDLER.setFormatter(FORMATTER)
+
+    LOGGER = logging.getLogger('recorder')
+    LOGGER.addHandler(HANDLER)
+    LOGGER.setLevel(logging.INFO)
+
+    def __init__(self,
+                 path: str,
+                 w: int,
+                 h: int,
+                 fps: float = 10.0,
+                 fourcc: str = 'XVID',
+                 maxsize: int = 16) -> None:
+        """Initialize a VideoRecorder instance
+        :param path: the video file to write
+        :param w: the video width in pixel
+        :param h: the video height in pixel
+        :param fps: the output frame rate
+        :param fourcc: the video codec
+        :param maxsize: the number of frames the queue holds before dropping
+        :return: None
+        """
+        super().__init__()
+        self.path: str = path
+        self.interval: float = 1.0 / fps
+        ctx = multiprocessing.get_context('spawn')
+        self.inq = ctx.Queue(maxsize)
+        self.outq = ctx.Queue()
+        self.process = ctx.Process(target=_encode,
+                                   args=(path, w, h, fps, fourcc, self.inq,
+                                         self.outq),
+                                   name='recorder',
+                                   daemon=True)
+        self.start_time: Optional[float] = None
+        self.slot: int = -1  # the last slot sent to the encoder
+        self.stats: Dict[str, int] = {
+            'frames': 0,  # frames passed to write()
+            'sent': 0,  # frames sent to the encoder
+            'skipped': 0,  # later frames of a slot already sent
+            'dropped': 0,  # frames lost because the queue was full
+        }
+
+    def start(self) -> None:
+        self.process.start()
+
+    def write(self, frame: np.ndarray, timestamp: Optional[float] = None) -> None:
+        """Record a frame, without blocking
+        :param frame: the BGR frame, copied if it is the first of its slot
+        :param timestamp: the time.monotonic() of the frame, default now
+        :return: None
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if self.start_time is None:
+            self.start_time = timestamp
+        self.stats['frames'] += 1
+        slot = int((timestamp - self.start_time) / self.interval)
+        if slot <= self.slot:
+            self.stats['skipped'] += 1
+            return
+        # the queue pickles on a feeder thread, so send a copy of the frame
+        self._send(slot, frame.copy())
+
+    def _send(self, slot: int, frame: np.ndarray) -> None:
+        try:
+            self.inq.put_nowait((slot, frame))
+            self.stats['sent'] += 1
+        except queue.Full:
+            self.stats['dropped'] += 1
+        self.slot = slot
+
+    def stop(self, timeout: float = 10.0) -> Dict[str, int]:
+        """Flush the queue, finish the video file and return the statistics"""
+        if self.process.is_alive():
+            try:
+                self.inq.put(None, timeout=timeout)
+                self.stats.update(self.outq.get(timeout=timeout))
+            except queue.Full:
+                VideoRecorder.LOGGER.warning(f"encoder is stuck on {self.path}")
+            except queue.Empty:
+                VideoRecorder.LOGGER.warning(f"encoder did not finish {self.path}")
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+        VideoRecorder.LOGGER.info(f"{self.path}: {self.stats}")
+        return self.stats
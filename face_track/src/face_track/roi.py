@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+from typing import Optional, Tuple
+
+Box = Tuple[int, int, int, int]  # (x, y, w, h) in pixel
+Window = Tuple[int, int, int, int]  # (x0, y0, x1, y1) in pixel
+
+
+class RoiSearch(object):
+    """Region-of-interest scheduling for face detection.
+
+    After a face is found, the next detection only searches a window around
+    the last face box, with face sizes near the last face size. A full frame
+    scan is done again after a number of consecutive misses, and on a fixed
+    schedule so that a new, closer face is not missed.
+    """
+    def __init__(self,
+                 margin: float = 1.0,
+                 scale_range: Tuple[float, float] = (0.7, 1.4),
+                 max_misses: int = 3,
+                 full_scan_every: int = 30) -> None:
+        """Initialize a RoiSearch instance
+        :param margin: the window border around the last box, in units of the box size
+        :param scale_range: the min and max face size relative to the last face size
+        :param max_misses: the number of consecutive ROI misses before a full scan
+        :param full_scan_every: force a full scan every N frames, 0 disables it
+        :return: None
+        """
+        super().__init__()
+        self.margin: float = margin
+        self.scale_range: Tuple[float, float] = scale_range
+        self.max_misses: int = max_misses
+        self.full_scan_every: int = full_scan_every
+
+        self.box: Optional[Box] = None  # the last detected face box
+        self.misses: int = 0  # consecutive frames without a face
+        self.since_full: int = 0  # frames since the last full scan
+        self.full_count: int = 0
+        self.roi_count: int = 0
+
+    def reset(self) -> None:
+        self.box = None
+        self.misses = 0
+        self.since_full = 0
+
+    def window(self, w: int, h: int) -> Optional[Window]:
+        """Return the search window for the next detection
+        :param w: the image width in pixel
+        :param h: the image height in pixel
+        :return: the window (x0, y0, x1, y1), or None for a full frame scan
+        """
+        if (self.box is None or self.misses >= self.max_misses
+                or (self.full_scan_every > 0
+                    and self.since_full >= self.full_scan_every)):
+            return None
+        x, y, bw, bh = self.box
+        # the window must be able to hold the largest face searched for
+        mx = max(int(bw * self.margin), int(bw * self.scale_range[1] - bw))
+        my = max(int(bh * self.margin), int(bh * self.scale_range[1] - bh))
+        x0, y0 = max(0, x - mx), max(0, y - my)
+        x1, y1 = min(w, x + bw + mx), min(h, y + bh + my)
+        if x1 - x0 >= w and y1 - y0 >= h:
+            return None
+        return x0, y0, x1, y1
+
+    def sizes(self, minSize: Tuple[int, int],
+              maxSize: Tuple[int, int]) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+        """Return the face size range for an ROI search
+        :param minSize: the smallest face size of a full scan
+        :param maxSize: the largest face size of a full scan
+        :return: (minSize, maxSize) around the last face size, within the full scan range
+        """
+        _, _, bw, bh = self.box
+        lo, hi = self.scale_range
+        smin = (max(minSize[0], int(bw * lo)), max(minSize[1], int(bh * lo)))
+        smax = (min(maxSize[0], int(bw * hi)), min(maxSize[1], int(bh * hi)))
+        smax = (max(smax[0], smin[0]), max(smax[1], smin[1]))
+        return smin, smax
+
+    def update(self, box: Optional[Box], full: bool) -> None:
+        """Record the result of a detection
+        :param box: the chosen face box, None if no face was found
+        :param full: whether the detection was a full frame scan
+        :return: None
+        """
+        if full:
+            self.since_full = 0
+            self.full_count += 1
+        else:
+            self.since_full += 1
+            self.roi_count += 1
+        if box is None:
+            self.misses += 1
+            if self.misses > self.max_misses:
+                self.box = None
+        else:
+            self.misses = 0
+            self.box = tuple(int(v) for v in box)
+
+    def follow(self, box: Box) -> None:
+        """Move the search window to a face box found by tracking
+        :param box: the tracked face box
+        :return: None
+        """
+        self.misses = 0
+        self.box = tuple(int(v) for v in box)
+
+    def __str__(self) -> str:
+        return f"roi {self.roi_count} full {self.full_count}"
@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+"""A Tello SDK 1.3 simulator on local UDP ports.
+
+Unlike the in-process mock Tello, the simulator runs the real protocol: it
+answers the SDK commands from the command port, sends the state string to
+port 8890 of the client at 10 Hz and, after streamon, streams a raw H.264
+(Annex-B) file to port 11111 in 1460 byte packets at the frame rate.
+Latency, jitter and packet loss are injected on every packet, and the
+arrival of the rc commands is timed against the video frames sent.
+
+djitellopy binds the command port 8889 of its own host, so the simulator
+listens on port 9889, see the --tello option of face_track:
+
+```bash
+python -m face_track.simulator --video flight.h264 --latency 0.02 --loss 0.01
+face_track --tello 127.0.0.1:9889
+```
+
+A H.264 file of a recording is made with e.g.
+`ffmpeg -i vid.avi -c:v libx264 -bsf:v h264_mp4toannexb -an flight.h264`.
+"""
+import argparse
+import asyncio
+import logging
+import random
+import re
+import sys
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from face_track.aiotello import Datagrams
+
+PORT: int = 9889  # the command port, 8889 is taken by the client
+START_CODE = re.compile(b'\x00\x00\x01')
+
+
+def split_frames(data: bytes) -> List[bytes]:
+    """Split a H.264 Annex-B stream into frames, each ending with a slice
+    NAL unit, a single slice per frame as the Tello encodes
+    :param data: the stream
+    :return: the frames, with their start codes and parameter sets
+    """
+    starts = [m.start() for m in START_CODE.finditer(data)]
+    frames, begin = [], 0
+    for i, start in enumerate(starts):
+        if start + 3 >= len(data) or data[start + 3] & 0x1f not in (1, 5):
+            continue
+        end = starts[i + 1] if i + 1 < len(starts) else len(data)
+        frames.append(data[begin:end])
+        begin = end
+    return frames
+
+
+class Link(object):
+    """The network between simulator and client: each packet is lost with
+    probability loss, else delayed by latency plus up to jitter seconds"""
+    def __init__(self,
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 loss: float = 0.0,
+                 seed: Optional[int] = None) -> None:
+        super().__init__()
+        self.latency: float = latency
+        self.jitter: float = jitter
+        self.loss: float = loss
+        self.random = random.Random(seed)
+
+    def lost(self) -> bool:
+        return self.loss > 0 and self.random.random() < self.loss
+
+    def delay(self) -> float:
+        return self.latency + self.random.uniform(0.0, self.jitter)
+
+
+class TelloSimulator(object):
+    """Serve the Tello SDK 1.3 protocol, see the module doc"""
+    HANDLER = logging.StreamHandler()
+    FORMATTER = logging.Formatter(
+        '[%(levelname)s] %(filename)s - %(lineno)d - %(message)s')
+    HANDLER.setFormatter(FORMATTER)
+
+    LOGGER = logging.getLogger('simulator')
+    LOGGER.addHandler(HANDLER)
+    LOGGER.setLevel(logging.INFO)
+
+    STATE: str = (
+        "pitch:{pitch};roll:{roll};yaw:{yaw};vgx:{vgx};vgy:{vgy};vgz:{vgz};"
+        "templ:{templ};temph:{temph};tof:{tof};h:{h};bat:{bat};"
+        "baro:{baro:.2f};time:{time};agx:{agx:.2f};agy:{agy:.2f};"
+        "agz:{agz:.2f};\r\n")
+    PACKET_SIZE: int = 1460  # the video payload per datagram
+    TAKEOFF_HEIGHT: int = 80  # cm
+    MOVES = ('up', 'down', 'left', 'right', 'forward', 'back')
+
+    def __init__(self,
+                 host: str = '127.0.0.1',
+                 port: int = PORT,
+                 video: Optional[str] = None,
+                 fps: float = 30.0,
+                 state_rate: float = 10.0,
+                 link: Optional[Link] = None,
+                 takeoff_time: float = 1.0) -> None:
+        """Initialize a TelloSimulator instance
+        :param host: the address to listen on
+        :param port: the command port
+        :param video: the H.264 Annex-B file streamed after streamon, looped
+        :param fps: the video frame rate
+        :param state_rate: the state packets per second
+        :param link: the injected latency, jitter and loss, none by default
+        :param takeoff_time: the seconds takeoff and land take to answer
+        :return: None
+        """
+        super().__init__()
+        self.address: Tuple[str, int] = (host, port)
+        self.frames: List[bytes] = []
+        if video is not None:
+            with open(video, 'rb') as f:
+                self.frames = split_frames(f.read())
+            if not self.frames:
+                raise ValueError(f"no H.264 frames in {video}")
+        self.fps: float = fps
+        self.state_rate: float = state_rate
+        self.link: Link = link or Link()
+        self.takeoff_time: float = takeoff_time
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.client: Optional[str] = None  # the client ip, after "command"
+        self.state_port: int = 8890
+        self.video_port: int = 11111
+        self.streaming: bool = False
+        # flight model
+        self.flying: bool = False
+        self.h: float = 0.0  # height in cm
+        self.yaw: float = 0.0  # in degrees
+        self.speed: float = 100.0  # in cm/s, of the move commands
+        self.rc: Tuple[int, int, int, int] = (0, 0, 0, 0)
+        self.battery: float = 100.0
+        self.flight_time: float = 0.0  # in seconds
+        self.start_time: float = time.monotonic()
+        # the send times of the recent video frames, time.monotonic()
+        self.frame_times: Deque[float] = deque(maxlen=256)
+        self.rc_ages: List[float] = []  # rc arrival - newest frame sent
+        self.stats: Dict[str, int] = {
+            'commands': 0,  # command packets received, including rc
+            'rc': 0,  # rc packets received
+            'lost_in': 0,  # command packets lost
+            'lost_out': 0,  # response, state and video packets lost
+            'responses': 0,
+            'states': 0,
+            'frames': 0,
+            'packets': 0,  # video packets sent
+        }
+
+    def send(self, data: bytes, addr: Tuple[str, int],
+             delay: Optional[float] = None) -> None:
+        """Send a packet through the link"""
+        if self.link.lost():
+            self.stats['lost_out'] += 1
+            return
+        if delay is None:
+            delay = self.link.delay()
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self.transport.sendto,
+                                                  data, addr)
+        else:
+            self.transport.sendto(data, addr)
+
+    def received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        now = time.monotonic()
+        if self.link.lost():
+            self.stats['lost_in'] += 1
+            return
+        self.stats['commands'] += 1
+        command = data.decode('utf-8', errors='replace').strip()
+        if command == 'command':
+            self.client = addr[0]
+        elif self.client is None:
+            return  # not in SDK mode, the Tello ignores everything
+        if command.startswith('rc '):
+            self.stats['rc'] += 1
+            self.rc_received(command, now)
+            return
+        asyncio.ensure_future(self.answer(command, addr))
+
+    def rc_received(self, command: str, now: float) -> None:
+        try:
+            lr, fb, ud, yaw = (int(v) for v in command.split()[1:5])
+        except ValueError:
+            return
+        self.rc = (lr, fb, ud, yaw)
+        # the newest frame that has reached the network by now
+        for sent in reversed(self.frame_times):
+            if sent <= now:
+                self.rc_ages.append(now - sent)
+                break
+
+    async def answer(self, command: str, addr: Tuple[str, int]) -> None:
+        try:
+            response = await self.execute(command)
+        except ValueError:
+            response = 'error'  # a malformed argument
+        if response is not None:
+            self.stats['responses'] += 1
+            self.send(response.encode('utf-8'), addr)
+
+    async def execute(self, command: str) -> Optional[str]:
+        """Run a SDK command and return the response, None for no response"""
+        name, *args = command.split()
+        if name == 'command':
+            return 'ok'
+        if name == 'takeoff':
+            await asyncio.sleep(self.takeoff_time)
+            self.flying, self.h = True, TelloSimulator.TAKEOFF_HEIGHT
+            return 'ok'
+        if name == 'land':
+            await asyncio.sleep(self.takeoff_time)
+            self.flying, self.h, self.rc = False, 0.0, (0, 0, 0, 0)
+            return 'ok'
+        if name == 'emergency':
+            self.flying, self.h, self.rc = False, 0.0, (0, 0, 0, 0)
+            return 'ok'
+        if name in ('streamon', 'streamoff'):
+            self.streaming = name == 'streamon'
+            return 'ok'
+        if name == 'port' and len(args) == 2:
+            self.state_port, self.video_port = int(args[0]), int(args[1])
+            return 'ok'
+        if name == 'speed' and args:
+            self.speed = float(args[0])
+            return 'ok'
+        if name in TelloSimulator.MOVES + ('cw', 'ccw', 'flip'):
+            if not self.flying:
+                return 'error Not flying'
+            x = float(args[0]) if args and name != 'flip' else 0.0
+            if name in ('cw', 'ccw'):
+                self.yaw += x if name == 'cw' else -x
+                await asyncio.sleep(x / 90.0)
+            else:
+                if name in ('up', 'down'):
+                    self.h = max(0.0, self.h + (x if name == 'up' else -x))
+                await asyncio.sleep(x / self.speed if x else 1.0)
+            return 'ok'
+        if name == 'keepalive':
+            return 'ok'
+        read = self.read(name)
+        if read is not None:
+            return read
+        return f"unknown command: {command}"
+
+    def read(self, name: str) -> Optional[str]:
+        """Return the value of a read command, e.g. battery?"""
+        values = {
+            'speed?': f"{self.speed:.1f}",
+            'battery?': f"{int(self.battery)}",
+            'time?': f"{int(self.flight_time)}s",
+            'height?': f"{int(self.h / 10)}dm",
+            'temp?': "60~63C",
+            'attitude?': f"pitch:0;roll:0;yaw:{int(self.yaw)};",
+            'baro?': f"{self.h / 100:.2f}",
+            'acceleration?': "agx:0.00;agy:0.00;agz:-1000.00;",
+            'tof?': f"{int(self.h * 10) + 100}mm",
+            'wifi?': "90",
+            'sn?': "0TQDG000000000",
+        }
+        return values.get(name)
+
+    def update(self, dt: float) -> None:
+        """Advance the flight model by dt seconds"""
+        if not self.flying:
+            return
+        lr, fb, ud, yaw = self.rc
+        self.h = max(0.0, self.h + ud * dt)  # rc 100 is about 1 m/s
+        self.yaw = (self.yaw + yaw * dt + 180.0) % 360.0 - 180.0
+        self.flight_time += dt
+        self.battery = max(0.0, self.battery - dt / 6.0)  # 10 minutes
+
+    def state(self) -> bytes:
+        lr, fb, ud, _ = self.rc if self.flying else (0, 0, 0, 0)
+        return TelloSimulator.STATE.format(pitch=0,
+                                           roll=0,
+                                           yaw=int(self.yaw),
+                                           vgx=fb,
+                                           vgy=lr,
+                                           vgz=-ud,
+                                           templ=60,
+                                           temph=63,
+                                           tof=int(self.h) + 10,
+                                           h=int(self.h),
+                                           bat=int(self.battery),
+                                           baro=self.h / 100,
+                                           time=int(self.flight_time),
+                                           agx=0.0,
+                                           agy=0.0,
+                                           agz=-1000.0).encode('ascii')
+
+    async def send_state(self) -> None:
+        interval = 1.0 / self.state_rate
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            self.update(now - last)
+            last = now
+            if self.client is not None:
+                self.stats['states'] += 1
+                self.send(self.state(), (self.client, self.state_port))
+
+    async def send_video(self) -> None:
+        interval = 1.0 / self.fps
+        due, index = time.monotonic(), 0
+        size = TelloSimulator.PACKET_SIZE
+        while True:
+            due += interval
+            await asyncio.sleep(max(0.0, due - time.monotonic()))
+            if not self.streaming or self.client is None:
+                continue
+            frame = self.frames[index]
+            index = (index + 1) % len(self.frames)
+            # the packets of a frame share one delay, so they stay in order
+            delay = self.link.delay()
+            addr = (self.client, self.video_port)
+            for offset in range(0, len(frame), size):
+                self.send(frame[offset:offset + size], addr, delay)
+                self.stats['packets'] += 1
+            self.stats['frames'] += 1
+            self.frame_times.append(time.monotonic() + delay)
+
+    async def serve(self, duration: Optional[float] = None) -> None:
+        """Serve until cancelled, or for duration seconds"""
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: Datagrams(self.received), local_addr=self.address)
+        TelloSimulator.LOGGER.info(
+            f"Tello simulator on {self.address[0]}:{self.address[1]}")
+        tasks = [asyncio.ensure_future(self.send_state())]
+        if self.frames:
+            tasks.append(asyncio.ensure_future(self.send_video()))
+        try:
+            await asyncio.sleep(duration if duration else float('inf'))
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.transport.close()
+
+    def report(self) -> str:
+        elapsed = time.monotonic() - self.start_time
+        lines = [f"{key} {value}" for key, value in self.stats.items()]
+        lines.append(f"rc rate {self.stats['rc'] / elapsed:.1f}/s")
+        if self.rc_ages:
+            p50, p95, p99 = np.percentile(
+                np.asarray(self.rc_ages) * 1000, (50, 95, 99))
+            lines.append(f"rc age since the newest frame ms: p50 {p50:.1f} "
+                         f"p95 {p95:.1f} p99 {p99:.1f}")
+        return "\n".join(lines)
+
+
+def main(args=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m face_track.simulator",
+        description="Tello SDK 1.3 simulator on local UDP ports")
+    parser.add_argument("--host", default="127.0.0.1", help="listen address")
+    parser.add_argument("--port", type=int, default=PORT, help="command port")
+    parser.add_argument("--video",
+                        help="H.264 Annex-B file streamed after streamon")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--state-rate",
+                        type=float,
+                        default=10.0,
+                        metavar="HZ",
+                        help="state packets per second")
+    parser.add_argument("--latency",
+                        type=float,
+                        default=0.0,
+                        metavar="SEC",
+                        help="delay of each packet")
+    parser.add_argument("--jitter",
+                        type=float,
+                        default=0.0,
+                        metavar="SEC",
+                        help="additional random delay up to SEC")
+    parser.add_argument("--loss",
+                        type=float,
+                        default=0.0,
+                        metavar="P",
+                        help="probability a packet is lost, each way")
+    parser.add_argument("--seed", type=int, help="random seed of the link")
+    parser.add_argument("--takeoff-time",
+                        type=float,
+                        default=1.0,
+                        metavar="SEC")
+    parser.add_argument("--duration",
+                        type=float,
+                        metavar="SEC",
+                        help="stop after SEC, default on Ctrl-C")
+    opts = parser.parse_args(args)
+
+    sim = TelloSimulator(opts.host,
+                         opts.port,
+                         video=opts.video,
+                         fps=opts.fps,
+                         state_rate=opts.state_rate,
+                         link=Link(opts.latency, opts.jitter, opts.loss,
+                                   opts.seed),
+                         takeoff_time=opts.takeoff_time)
+    try:
+        asyncio.run(sim.serve(opts.duration))
+    except KeyboardInterrupt:
+        pass
+    print(sim.report())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
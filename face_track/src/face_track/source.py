@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""Frame sources: live Tello, local webcam, video file and image directory.
+
+A FrameReader reads a source on a background thread, paced in real time by
+the original timestamps, at a fixed rate, or as fast as possible, and
+exposes the latest frame as `frame` like djitellopy's BackgroundFrameRead.
+Each frame gets a sequence number and a capture time, and consumers can
+block until a newer frame arrives with `wait_for_frame`.
+Video sources decode into the preallocated buffers of a FrameRing, and
+`frame` is a read-only view of the buffer.
+
+```python
+reader = FrameReader(open_source("vid-20211010_101010.avi"), pacing="none")
+reader.start()
+seq, img, capture_time = reader.wait_for_frame(-1)
+```
+"""
+import logging
+import os
+import time
+from threading import Condition, Thread
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from face_track.framebuf import FrameRing
+
+HANDLER = logging.StreamHandler()
+FORMATTER = logging.Formatter(
+    '[%(levelname)s] %(filename)s - %(lineno)d - %(message)s')
+HANDLER.setFormatter(FORMATTER)
+
+LOGGER = logging.getLogger('source')
+LOGGER.addHandler(HANDLER)
+LOGGER.setLevel(logging.INFO)
+
+PACINGS = ("original", "fixed", "none")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp")
+
+Read = Tuple[bool, Optional[np.ndarray], float]  # (ok, frame, timestamp)
+
+
+class FrameSource(object):
+    """A source of BGR frames with timestamps in seconds"""
+    def read(self, dst: Optional[np.ndarray] = None) -> Read:
+        """Read the next frame
+        :param dst: a buffer the source may decode the frame into
+        :return: (ok, frame, timestamp), ok is False at the end of the source
+        """
+        raise NotImplementedError
+
+    def rewind(self) -> bool:
+        """Restart from the first frame
+        :return: False if the source cannot be replayed
+        """
+        return False
+
+    def interrupt(self) -> None:
+        """Make a blocking read() return, called from another thread"""
+        pass
+
+    def release(self) -> None:
+        pass
+
+
+class CaptureSource(FrameSource):
+    """Frames of a cv2.VideoCapture"""
+    def __init__(self, address) -> None:
+        super().__init__()
+        self.address = address
+        self.cap = cv2.VideoCapture(address)
+        if not self.cap.isOpened():
+            self.cap.open(address)
+        if not self.cap.isOpened():
+            raise IOError(f"Error opening video source {address}")
+
+    def read(self, dst: Optional[np.ndarray] = None) -> Read:
+        grabbed, frame = self.cap.read(dst)
+        return grabbed and frame is not None, frame, self.timestamp()
+
+    def timestamp(self) -> float:
+        return time.monotonic()
+
+    def release(self) -> None:
+        self.cap.release()
+
+
+class WebcamSource(CaptureSource):
+    """Frames of a local camera, timestamped when read"""
+    def __init__(self, index: int = 0) -> None:
+        super().__init__(index)
+
+
+class VideoFileSource(CaptureSource):
+    """Frames of a video file, timestamped by their position in the file"""
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        self.fps: float = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.count: int = 0
+
+    def read(self, dst: Optional[np.ndarray] = None) -> Read:
+        ok, frame, _ = super().read(dst)
+        ts = self.count / self.fps
+        self.count += 1
+        return ok, frame, ts
+
+    def rewind(self) -> bool:
+        self.count = 0
+        return self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+
+class ImageDirSource(FrameSource):
+    """Frames of the image files in a directory, in name order"""
+    def __init__(self, path: str, fps: float = 30.0) -> None:
+        """Initialize an ImageDirSource instance
+        :param path: the image directory
+        :param fps: the frame rate the images were captured at, for timestamps
+        :return: None
+        """
+        super().__init__()
+        self.files: List[str] = sorted(
+            os.path.join(path, f) for f in os.listdir(path)
+            if f.lower().endswith(IMAGE_EXTENSIONS))
+        if not self.files:
+            raise IOError(f"Error no images in {path}")
+        self.fps: float = fps
+        self.count: int = 0
+
+    def read(self, dst: Optional[np.ndarray] = None) -> Read:
+        if self.count >= len(self.files):
+            return False, None, self.count / self.fps
+        frame = cv2.imread(self.files[self.count])
+        ts = self.count / self.fps
+        self.count += 1
+        return frame is not None, frame, ts
+
+    def rewind(self) -> bool:
+        self.count = 0
+        return True
+
+
+class ArraySource(FrameSource):
+    """Frames of a list of images in memory, e.g. synthetic test frames"""
+    def __init__(self, frames: List[np.ndarray], fps: float = 30.0) -> None:
+        super().__init__()
+        if not frames:
+            raise IOError("Error no frames")
+        self.frames: List[np.ndarray] = frames
+        self.fps: float = fps
+        self.count: int = 0
+
+    def read(self, dst: Optional[np.ndarray] = None) -> Read:
+        if self.count >= len(self.frames):
+            return False, None, self.count / self.fps
+        ts = self.count / self.fps
+        self.count += 1
+        return True, self.frames[self.count - 1], ts
+
+    def rewind(self) -> bool:
+        self.count = 0
+        return True
+
+
+class TelloSource(FrameSource):
+    """Frames of a live Tello video stream"""
+    POLL_TIME: float = 0.002  # in seconds
+    WAIT_TIME: float = 0.1  # in seconds, to check for interrupt
+
+    def __init__(self, drone) -> None:
+        super().__init__()
+        self.frame_read = drone.get_frame_read()
+        self.last = None
+        self.seq: int = 0
+        self.interrupted: bool = False
+
+    def read(self, dst: Optional[np.ndarray] = None) -> Read:
+        if hasattr(self.frame_read, 'wait_for_frame'):
+            # a FrameReader, e.g. of the mock Tello
+            while not self.interrupted and not self.frame_read.stopped:
+                item = self.frame_read.wait_for_frame(self.seq,
+                                                      TelloSource.WAIT_TIME,
+                                                      hold=True)
+                if item is not None:
+                    self.seq, frame, capture_time = item
+                    # copy the frame out of the ring of the reader meanwhile
+                    try:
+                        if (dst is not None and dst.shape == frame.shape
+                                and dst.dtype == frame.dtype):
+                            np.copyto(dst, frame)
+                            frame = dst
+                        else:
+                            frame = frame.copy()
+                    finally:
+                        self.frame_read.release(self.seq)
+                    return True, frame, capture_time
+            return False, None, time.monotonic()
+        # djitellopy replaces the frame object for each new frame
+        while not self.interrupted and not self.frame_read.stopped:
+            frame = self.frame_read.frame
+            if frame is not None and frame is not self.last:
+                self.last = frame
+                return True, frame, time.monotonic()
+            time.sleep(TelloSource.POLL_TIME)
+        return False, None, time.monotonic()
+
+    def interrupt(self) -> None:
+        self.interrupted = True
+
+
+def open_source(spec, drone=None, fps: float = 30.0) -> FrameSource:
+    """Open a frame source.
+    :param spec: "tello", "webcam", "webcam:<index>", a camera index, a video file,
+        an image directory, or a FrameSource which is returned as is
+    :param drone: the Tello for the "tello" source
+    :param fps: the frame rate of an image directory
+    :return: the frame source
+    """
+    if isinstance(spec, FrameSource):
+        return spec
+    spec = str(spec)
+    if spec == "tello":
+        return TelloSource(drone)
+    if spec.isdigit():
+        return WebcamSource(int(spec))
+    if spec.startswith("webcam"):
+        _, _, index = spec.partition(":")
+        return WebcamSource(int(index or 0))
+    if os.path.isdir(spec):
+        return ImageDirSource(spec, fps)
+    return VideoFileSource(spec)
+
+
+class Pacer(object):
+    """Pace frame delivery: by the original timestamps, at a fixed rate, or not at all"""
+    def __init__(self, pacing: str = "original", fps: float = 30.0) -> None:
+        """Initialize a Pacer instance
+        :param pacing: "original", "fixed" or "none" (as fast as possible)
+        :param fps: the frame rate of fixed pacing
+        :return: None
+        """
+        super().__init__()
+        if pacing not in PACINGS:
+            raise ValueError(f"unknown pacing {pacing}, choose from {PACINGS}")
+        self.pacing: str = pacing
+        self.interval: float = 1.0 / fps if fps > 0 else 0.0
+        self.reset()
+
+    def reset(self) -> None:
+        self.start: Optional[float] = None  # monotonic time of the first frame
+        self.first_ts: float = 0.0  # timestamp of the first frame
+        self.count: int = 0
+
+    def wait(self, ts: float) -> None:
+        """Sleep until the frame with timestamp ts is due
+        :param ts: the frame timestamp in seconds
+        :return: None
+        """
+        now = time.monotonic()
+        if self.start is None:
+            self.start, self.first_ts = now, ts
+        if self.pacing == "original":
+            due = self.start + ts - self.first_ts
+        elif self.pacing == "fixed":
+            due = self.start + self.count * self.interval
+        else:
+            due = now
+        self.count += 1
+        if due > now:
+            time.sleep(due - now)
+
+
+class FrameReader(object):
+    """Read frames of a FrameSource on a background thread.
+    Use frameReader.frame to get the latest frame, do not modify it, or
+    frameReader.wait_for_frame to wait for a new one. The frames are decoded
+    into a ring of SLOTS buffers, so a frame is overwritten a few frames
+    later, unless it is held by wait_for_frame(hold=True) until release().
+    """
+    SLOTS: int = 4  # the frame buffers, published, being decoded and spare
+    WAIT_TIME: float = 0.1  # in seconds, to check for stop while a slot is held
+
+    def __init__(self,
+                 source: FrameSource,
+                 pacing: str = "original",
+                 fps: float = 30.0,
+                 loop: bool = False) -> None:
+        """Initialize a FrameReader instance and read the first frame
+        :param source: the frame source
+        :param pacing: "original", "fixed" or "none", see Pacer
+        :param fps: the frame rate of fixed pacing
+        :param loop: replay the source from the start when it ends
+        :return: None
+        """
+        super().__init__()
+        self.source: FrameSource = source
+        self.pacer = Pacer(pacing, fps)
+        self.loop: bool = loop
+        self.grabbed, self.frame, self.timestamp = source.read()
+        if not self.grabbed or self.frame is None:
+            raise Exception('Failed to grab first frame from video stream')
+        self.count: int = 1
+        self.seq: int = 0  # the sequence number of frame
+        self.capture_time: float = time.monotonic()  # when frame arrived
+        self.ring_seq: int = -1  # the ring sequence number of frame, if any
+        self.held: Dict[int, int] = {}  # the ring sequence numbers by seq
+        self.new_frame = Condition()
+        # decode the following frames in place, in buffers of the first frame size
+        self.ring = FrameRing(FrameReader.SLOTS, self.frame.shape,
+                              self.frame.dtype)
+        self.pacer.wait(self.timestamp)
+        self.stopped = False
+        self.worker = Thread(target=self.update_frame, args=(), daemon=True)
+
+    def start(self) -> None:
+        """Start the frame update worker"""
+        self.worker.start()
+
+    def update_frame(self) -> None:
+        """Thread worker function to read frames from the source"""
+        while not self.stopped:
+            dst = self.ring.acquire(FrameReader.WAIT_TIME)
+            if dst is None:
+                continue  # the consumer still holds the next slot
+            grabbed, frame, ts = self.source.read(dst)
+            if not grabbed:
+                if self.loop and self.source.rewind():
+                    self.pacer.reset()
+                    continue
+                LOGGER.info(f"end of video source after {self.count} frames")
+                self.grabbed = False
+                self.stop_waiting()
+                break
+            self.pacer.wait(ts)
+            ring_seq = -1
+            if frame is dst:
+                ring_seq = self.ring.publish()
+                frame = self.ring.latest()
+            with self.new_frame:
+                self.frame = frame
+                self.ring_seq = ring_seq
+                self.timestamp = ts
+                self.capture_time = time.monotonic()
+                self.seq += 1
+                self.count += 1
+                self.new_frame.notify_all()
+
+    def wait_for_frame(
+            self,
+            after_seq: int,
+            timeout: Optional[float] = None,
+            hold: bool = False) -> Optional[Tuple[int, np.ndarray, float]]:
+        """Wait for a frame newer than after_seq
+        :param after_seq: the sequence number of the last frame used, -1 for any frame
+        :param timeout: the maximum wait in seconds, None to wait until stopped
+        :param hold: keep the frame from being overwritten until release(seq)
+        :return: (seq, frame, capture_time) of the latest frame, None on timeout or stop
+        """
+        with self.new_frame:
+            if not self.new_frame.wait_for(
+                    lambda: self.seq > after_seq or self.stopped, timeout):
+                return None
+            if self.seq <= after_seq:
+                return None
+            # the reader cannot publish another frame while the lock is
+            # held, so the slot of the latest frame is not being written
+            if hold and self.ring.hold(self.ring_seq):
+                self.held[self.seq] = self.ring_seq
+            return self.seq, self.frame, self.capture_time
+
+    def release(self, seq: int) -> None:
+        """Release a frame held by wait_for_frame(hold=True)"""
+        with self.new_frame:
+            ring_seq = self.held.pop(seq, None)
+        if ring_seq is not None:
+            self.ring.release(ring_seq)
+
+    def stop_waiting(self) -> None:
+        with self.new_frame:
+            self.stopped = True
+            self.new_frame.notify_all()
+
+    def stop(self) -> None:
+        """Stop the frame update worker"""
+        self.stop_waiting()
+        self.source.interrupt()
+        if self.worker.is_alive():
+            self.worker.join()
+        self.source.release()
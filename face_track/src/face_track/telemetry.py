@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+from typing import NamedTuple
+
+
+class TelemetrySnapshot(NamedTuple):
+    """Drone state at one point in time. Immutable, safe to share between threads."""
+    battery: int = 0  # battery percentage [0, 100]
+    temperature: int = 0  # highest temperature in Celsius
+    agx: float = 0.0  # x-axis acceleration
+    agy: float = 0.0  # y-axis acceleration
+    agz: float = 0.0  # z-axis acceleration
+    tof: int = 0  # tof height in cm
+    timestamp: float = 0.0  # time.monotonic() of the refresh
+
+
+class Telemetry(object):
+    """Refresh a TelemetrySnapshot from the Tello state at its own rate.
+
+    The refresh thread replaces `snapshot` with a new immutable object, so
+    readers (HUD, controller) just read the attribute without locking.
+    """
+    HANDLER = logging.StreamHandler()
+    FORMATTER = logging.Formatter(
+        '[%(levelname)s] %(filename)s - %(lineno)d - %(message)s')
+    HANDLER.setFormatter(FORMATTER)
+
+    LOGGER = logging.getLogger('telemetry')
+    LOGGER.addHandler(HANDLER)
+    LOGGER.setLevel(logging.INFO)
+
+    def __init__(self, drone, rate: float = 5.0) -> None:
+        """Initialize a Telemetry instance and take the first snapshot
+        :param drone: the connected Tello
+        :param rate: the refresh rate per second
+        :return: None
+        """
+        super().__init__()
+        self.drone = drone
+        self.rate: float = rate
+        self.snapshot: TelemetrySnapshot = TelemetrySnapshot()
+        self.refresh()
+        self.stopped = threading.Event()
+        self.worker = threading.Thread(target=self.update,
+                                       name='telemetry',
+                                       daemon=True)
+
+    def refresh(self) -> TelemetrySnapshot:
+        """Read the drone state once and publish a new snapshot"""
+        # one state dict lookup per refresh instead of one per value
+        state = self.drone.get_current_state()
+        self.snapshot = TelemetrySnapshot(battery=int(state.get('bat', 0)),
+                                          temperature=int(
+                                              state.get('temph', 0)),
+                                          agx=float(state.get('agx', 0.0)),
+                                          agy=float(state.get('agy', 0.0)),
+                                          agz=float(state.get('agz', 0.0)),
+                                          tof=int(state.get('tof', 0)),
+                                          timestamp=time.monotonic())
+        return self.snapshot
+
+    def update(self) -> None:
+        """Thread worker function to refresh the snapshot at the configured rate"""
+        interval = 1.0 / self.rate
+        while not self.stopped.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                Telemetry.LOGGER.warning(f"telemetry refresh failed: {e}")
+
+    def start(self) -> None:
+        self.worker.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        if self.worker.is_alive():
+            self.worker.join()
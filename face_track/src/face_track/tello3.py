@@ -4,67 +4,62 @@
 # http://www.ryzerobotics.com/
 #
 # 1/1/2018
+#
+# Type SDK commands, the response of each command is printed when it
+# arrives. Runs on the asyncio client in aiotello.py: the console, the
+# commands and the state stream never block each other.
 
-import threading
-import socket
+import asyncio
 import sys
-import time
-import platform
-
-host = ''
-port = 9000
-locaddr = (host, port)
-
-# Create a UDP socket
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-
-tello_address = ('192.168.10.1', 8889)
-
-sock.bind(locaddr)
 
+from face_track.aiotello import AsyncTello, TelloError
 
-def recv():
-    count = 0
-    while True:
-        try:
-            data, server = sock.recvfrom(1518)
-            print(data.decode(encoding="utf-8"))
-        except Exception:
-            print('\nExit . . .\n')
-            break
 
+async def show_state(tello: AsyncTello) -> None:
+    """Print the battery and height when they change"""
+    last = None
+    async for state in tello.states():
+        value = (state.get('bat'), state.get('h'))
+        if value != last:
+            print(f"battery {value[0]} height {value[1]}")
+            last = value
 
-print('\r\n\r\nTello Python3 Demo.\r\n')
 
-print(
-    'Tello: command takeoff land flip forward back left right \r\n       up down cw ccw speed speed?\r\n'
-)
+async def main() -> None:
+    print('\r\n\r\nTello Python3 Demo.\r\n')
 
-print('end -- quit demo.\r\n')
+    print(
+        'Tello: command takeoff land flip forward back left right \r\n       up down cw ccw speed speed?\r\n'
+    )
 
-#recvThread create
-recvThread = threading.Thread(target=recv)
-recvThread.start()
+    print('end -- quit demo.\r\n')
 
-while True:
+    tello = AsyncTello()
     try:
-        python_version = str(platform.python_version())
-        version_init_num = int(python_version.partition('.')[0])
-        # print (version_init_num)
-        msg = input("")
-
-        if not msg:
-            break
-
-        if 'end' in msg:
-            print('...')
-            sock.close()
-            break
-
-        # Send data
-        msg = msg.encode(encoding="utf-8")
-        sent = sock.sendto(msg, tello_address)
+        await tello.connect()
+    except TelloError as e:
+        print(f"no Tello: {e}")
+        tello.close()
+        return
+    state = asyncio.create_task(show_state(tello))
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            msg = (await loop.run_in_executor(None, sys.stdin.readline)).strip()
+            if not msg or 'end' in msg:
+                print('...')
+                break
+            try:
+                print(await tello.send_command_with_return(msg))
+            except TelloError as e:
+                print(e)
+    finally:
+        state.cancel()
+        tello.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
     except KeyboardInterrupt:
         print('\n . . .\n')
-        sock.close()
-        break
\ No newline at end of file
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""Per-frame latency spans, written as a Chrome trace and summarized as
+percentiles.
+
+```python
+tracer = Tracer(enabled=True)
+with tracer.span('detect', frame=seq):
+    faces = detector.detect(gray)
+tracer.add('capture_to_rc', capture_time, time.monotonic(), seq)
+tracer.save('trace.json')  # open in chrome://tracing or ui.perfetto.dev
+print(tracer.report())
+```
+
+A disabled tracer records nothing and its span() costs a method call.
+All times are time.monotonic(), the clock of the frame capture times.
+"""
+import json
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+Event = Tuple[str, float, float, int, int]  # name, start, end, thread, frame
+
+
+class _NullSpan(object):
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    __slots__ = ('tracer', 'name', 'frame', 'start')
+
+    def __init__(self, tracer: 'Tracer', name: str, frame: int) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.frame = frame
+
+    def __enter__(self) -> None:
+        self.start = time.monotonic()
+
+    def __exit__(self, *exc) -> None:
+        self.tracer.add(self.name, self.start, time.monotonic(), self.frame)
+
+
+class Tracer(object):
+    """Record named spans of the frame stages, see the module doc"""
+    MAX_EVENTS: int = 500000  # about 30 minutes of 10 stages at 30 fps
+
+    def __init__(self,
+                 enabled: bool = False,
+                 max_events: int = MAX_EVENTS) -> None:
+        """Initialize a Tracer instance
+        :param enabled: record spans, else span() and add() do nothing
+        :param max_events: the maximum number of spans kept
+        :return: None
+        """
+        super().__init__()
+        self.enabled: bool = enabled
+        self.max_events: int = max_events
+        self.events: List[Event] = []
+        self.dropped: int = 0  # spans not kept beyond max_events
+        self.start_time: float = time.monotonic()
+        self.threads: Dict[int, str] = {}  # thread id to name
+
+    def span(self, name: str, frame: int = -1):
+        """Return a context manager recording a span around its body
+        :param name: the stage name, e.g. detect
+        :param frame: the frame sequence number, -1 for none
+        :return: the span
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, frame)
+
+    def add(self, name: str, start: float, end: float, frame: int = -1) -> None:
+        """Record a span measured by the caller, time.monotonic() start and end"""
+        if not self.enabled:
+            return
+        if len(self.events) >= self.max_events:
+            self.dropped += 1
+            return
+        tid = threading.get_ident()
+        if tid not in self.threads:
+            self.threads[tid] = threading.current_thread().name
+        self.events.append((name, start, end, tid, frame))
+
+    def durations(self) -> Dict[str, np.ndarray]:
+        """Return the span durations in seconds by name"""
+        spans: Dict[str, List[float]] = {}
+        for name, start, end, _, _ in self.events:
+            spans.setdefault(name, []).append(end - start)
+        return {name: np.asarray(d) for name, d in spans.items()}
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Return count and p50, p95, p99 milliseconds by span name"""
+        result = {}
+        for name, d in self.durations().items():
+            p50, p95, p99 = np.percentile(d * 1000, (50, 95, 99))
+            result[name] = {
+                'count': len(d),
+                'p50': p50,
+                'p95': p95,
+                'p99': p99,
+            }
+        return result
+
+    def report(self) -> str:
+        lines = [
+            f"{'span':>14} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+        ]
+        for name, s in self.summary().items():
+            lines.append(f"{name:>14} {s['count']:>7d} {s['p50']:>8.2f} "
+                         f"{s['p95']:>8.2f} {s['p99']:>8.2f}")
+        if self.dropped:
+            lines.append(f"{self.dropped} spans dropped beyond {self.max_events}")
+        return "\n".join(lines)
+
+    def save(self, path: str) -> None:
+        """Write the spans in the Chrome trace event format"""
+        tids = {tid: i for i, tid in enumerate(self.threads)}
+        events = [{
+            'name': 'thread_name',
+            'ph': 'M',
+            'pid': 0,
+            'tid': tids[tid],
+            'args': {
+                'name': name
+            }
+        } for tid, name in self.threads.items()]
+        for name, start, end, tid, frame in self.events:
+            event = {
+                'name': name,
+                'ph': 'X',
+                'ts': round((start - self.start_time) * 1e6, 1),
+                'dur': round((end - start) * 1e6, 1),
+                'pid': 0,
+                'tid': tids[tid],
+            }
+            if frame >= 0:
+                event['args'] = {'frame': frame}
+            events.append(event)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
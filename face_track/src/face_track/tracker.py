@@ -3,18 +3,30 @@
 import datetime
 import logging
 import math
-import os
 import threading
 import time
+from typing import Callable, Dict, Optional
 
 import cv2
-import numpy as np
 #from face_track.mockdjitellopy import Tello
 from djitellopy import Tello
 
-from face_track.pid import PID
-
-# import mediapipe as mp
+from face_track.adaptive import Quality, QualityController
+from face_track.boxtrack import PathCost, TemplateTracker
+from face_track.detector import (CV2_DATA_DIR, CascadeDetector,
+                                 create_detector, find_file, load_cascade)
+from face_track.flightlog import FlightLog
+from face_track.framebuf import FrameRing
+from face_track.hud import Hud
+from face_track.pid import PIDBank
+from face_track.preview import PreviewServer
+from face_track.profiler import hotpath
+from face_track.rc import RCSender
+from face_track.recorder import VideoRecorder
+from face_track.roi import RoiSearch
+from face_track.source import FrameReader, open_source
+from face_track.telemetry import Telemetry
+from face_track.trace import Tracer
 
 
 class FaceTracker(object):
@@ -28,64 +40,137 @@ class FaceTracker(object):
     LOGGER.setLevel(logging.INFO)
 
     MAX_COMMAND_SEC: int = 100  # throttle control, max number of commands per second
+    RC_RATE: float = 30.0  # the rc command send rate per second
     OVERRIDE_PERIOD: float = 0.1  # key press override period in seconds
     RECORD_FRAME_RATE: float = 10.0  # the video record frame rate per second
-
-    cv2_base_dir = os.path.dirname(os.path.abspath(cv2.__file__))
-    default_face = os.path.join(cv2_base_dir, "data",
-                                "haarcascade_frontalface_default.xml")
-    face_cascade = cv2.CascadeClassifier(default_face)
-    if face_cascade.empty():
-        LOGGER.warn(f"Error loading face cascade {default_face}")
-        exit(0)
-
-    default_eyes = os.path.join(cv2_base_dir, "data",
-                                "haarcascade_eye_tree_eyeglasses.xml")
-    eye_cascade = cv2.CascadeClassifier(default_eyes)
-    if eye_cascade.empty():
-        LOGGER.warn(f"Error loading eye cascade {default_eyes}")
-        exit(0)
-
-    # mp_face_detection = mp.solutions.face_detection
-    # #mp_drawing = mp.solutions.drawing_utils
-    # face_detection = mp_face_detection.FaceDetection(min_detection_confidence=0.5)
+    TELEMETRY_RATE: float = 5.0  # the drone state refresh rate per second
+    MIN_FACE_SIZE: int = 20  # the smallest face size to detect in pixel
+    MAX_FACE_SIZE: int = 200  # the largest face size to detect in pixel
+    RC_LIMITS: tuple = (0, 30, 20, 30)  # the lr, fb, ud, yaw rc speed limits
+    FRAME_SLOTS: int = 8  # readFrame buffers, the pipeline stages hold some of them
+    FPS_ALPHA: float = 0.1  # smoothing of the frame interval for the FPS
+    TAKEOFF_HEIGHT: int = 70  # cm to climb after takeoff
+    EYE_CASCADE: str = "haarcascade_eye_tree_eyeglasses.xml"
 
     #Tello.LOGGER.setLevel(logging.DEBUG)
     #PID.LOGGER.setLevel(logging.DEBUG)
 
-    def __init__(self, w: int = 640, h: int = 480) -> None:
+    def __init__(self,
+                 w: int = 640,
+                 h: int = 480,
+                 roi_search: bool = False,
+                 detect_every: int = 1,
+                 detect_scale: float = 1.0,
+                 detector: str = 'haar',
+                 drone: Tello = None,
+                 source=None,
+                 pacing: str = 'original',
+                 fps: float = 30.0,
+                 rc_rate: float = RC_RATE,
+                 budget: Optional[float] = None) -> None:
         """Initialize a FaceTracker instance
         :param w: the image width in pixel (x)
         :param h: the image height in pizel (y)
+        :param roi_search: search faces around the last detected face only
+        :param detect_every: run the face detector every N frames, track the face in between
+        :param detect_scale: run the face detector on an image downscaled by this factor
+        :param detector: the face detector backend name, see face_track.detector
+        :param drone: the connected Tello, None to connect, take off and start the video stream
+        :param source: the video source instead of the Tello stream, see face_track.source.open_source
+        :param pacing: the pacing of the video source, original, fixed or none
+        :param fps: the frame rate of fixed pacing
+        :param rc_rate: the rc command send rate per second
+        :param budget: the face finding time per frame in seconds, adapts the
+            detection settings to it instead of detect_every and detect_scale
         :return: None
         """
         super().__init__()
 
-        self.drone = FaceTracker.initTello()
-        self.prev_time = time.time()
+        # seconds from here to each startup step, see markStartup
+        self.start_time: float = time.monotonic()
+        self.startup: Dict[str, float] = {}
+        # per frame stage spans, recorded after startTrace()
+        self.tracer = Tracer()
+        self.drone = FaceTracker.initTello(drone)
+        self.markStartup('connected')
+        # the face detector backend, warmed up on its own thread
+        self.detector = create_detector(detector)
+        self.warmup = threading.Thread(target=self.warmupDetector,
+                                       args=(w, h),
+                                       name='warmup',
+                                       daemon=True)
+        self.warmup.start()
+        # the rc commands are held until the takeoff sequence is done, which
+        # runs while the video stream opens and the detector warms up
+        self.airborne = threading.Event()
+        # the latest rc setpoint, sent at a fixed rate on its own thread
+        self.rc = RCSender(self.drone,
+                           rc_rate,
+                           max_rate=FaceTracker.MAX_COMMAND_SEC,
+                           tracer=self.tracer)
+        # the first frame of the stream takes a while, so the stream opens on
+        # its own thread too, see getFrameRead, the drone lands if it fails
+        self.frame_read: Optional[FrameReader] = None
+        self.stream_error: Optional[Exception] = None
+        self.stream_ready = threading.Event()
+        self.flight = threading.Thread(target=self.takeoff,
+                                       name='takeoff',
+                                       daemon=True)
+        self.flight.start()
+        if source is None:
+            # the Tello stream arrives in real time, no pacing
+            source, pacing = "tello", "none"
+        self.stream = threading.Thread(target=self.openStream,
+                                       args=(source, pacing, fps),
+                                       name='stream',
+                                       daemon=True)
+        self.stream.start()
+        self.frame_seq: int = -1  # the sequence number of the last frame read
+        self.frame_time: float = 0.0  # its capture time.monotonic()
+        # drone state for the HUD, refreshed on its own thread
+        self.telemetry = Telemetry(self.drone, FaceTracker.TELEMETRY_RATE)
+        self.telemetry.start()
+        self.prev_time: float = time.monotonic()  # of the last FPS update
+        self.frame_interval: float = 0.0  # smoothed seconds between frames
         self.w: int = w  # image width in pixel
         self.h: int = h  # image height in pixel
 
-        # terms for forward and backward speed control
-        self.fb_pid = PID('fb',
-                          kP=0.5,
-                          kI=0.01,
-                          kD=0.1,
-                          SP=math.sqrt(w * h / 12))
-        # terms for up and down speed control
-        self.ud_pid = PID('ud', kP=0.5, kI=0.01, kD=0.1, SP=h / 2)
-        # terms for left and right speed control
-        self.lr_pid = PID('lr', kP=-0.5, kI=-0.01, kD=-0.1, SP=w / 2)
-        # terms for yaw speed control
-        self.yaw_pid = PID('yaw', kP=-0.5, kI=-0.01, kD=-0.1, SP=w / 2)
+        # terms for left and right (disabled), forward and backward, up and
+        # down, and yaw speed control, updated together with one timestamp
+        self.pid = PIDBank(('lr', 'fb', 'ud', 'yaw'),
+                           kP=(-0.5, 0.5, 0.5, -0.5),
+                           kI=(-0.01, 0.01, 0.01, -0.01),
+                           kD=(-0.1, 0.1, 0.1, -0.1),
+                           SP=(w / 2, math.sqrt(w * h / 12), h / 2, w / 2),
+                           limit=FaceTracker.RC_LIMITS)
+        self.pid_pv: tuple = (0.0, 0.0, 0.0, 0.0)  # (cx, sqrt(area), cy, cx)
+        # per control step data for tuning, see startFlightLog
+        self.flight_log: Optional[FlightLog] = None
         self.pid_cv: tuple = (0, 0, 0, 0)
-
-        self.fb_pid.reset()
-        self.lr_pid.reset()
-        self.ud_pid.reset()
-        self.yaw_pid.reset()
         self.fps: int = 0
-        self.track_count: int = 0
+        self.tracking: bool = False  # the first airborne control step done
+
+        # search window around the last face, None for full frame detection
+        self.roi: RoiSearch = RoiSearch() if roi_search else None
+
+        # detect on a downscaled image, boxes are mapped back to (w, h)
+        self.detect_scale: float = detect_scale
+
+        # detect every N frames, may be changed at runtime
+        self.detect_every: int = detect_every
+        self.since_detect: int = 0  # frames since the last detection
+        self.box_tracker = TemplateTracker()
+        self.path_cost = {
+            'detect': PathCost('detect'),
+            'track': PathCost('track')
+        }
+        self.last_path: str = 'detect'
+
+        # steps the detection settings to hold the budget, None keeps them
+        self.quality: Optional[QualityController] = None
+        if budget:
+            self.quality = QualityController(budget)
+            self.applyQuality(self.quality.quality)
 
         self.fb_override: int = 0
         self.lr_override: int = 0
@@ -93,51 +178,161 @@ class FaceTracker(object):
         self.yaw_override: int = 0
         self.override_time: float = 0.0
 
-        self.video = None
+        # retained-mode HUD, same layout as the put* methods
+        self.hud = Hud(w, h)
+        self.hud.add('fps', (7, 30))
+        for i, name in enumerate(('agx', 'agy', 'agz', 'tof')):
+            self.hud.add(name, (7, 30 + 22 * (i + 1)))
+        self.hud.add('battery', (w - 90, 30))
+        self.hud.add('temperature', (w // 2 - 40, 30))
+        for i, name in enumerate(('lr', 'fb', 'ud', 'yaw')):
+            self.hud.add(name, (w - 90, 30 + 22 * (i + 1)))
+        if self.quality is not None:
+            self.hud.add('quality', (7, h - 10))
+
         self.recorder = None
-        self.annotatedImage = None
-        self.keepRecording: bool = False
+        self.preview: Optional[PreviewServer] = None
+        self.bus = None  # the FrameBus, see startFrameBus
+        self.faces = []  # the face boxes of the last frame
+        self.frames = FrameRing(FaceTracker.FRAME_SLOTS, (h, w, 3))
 
     @staticmethod
-    def initTello() -> Tello:
-        drone = Tello(retry_count=1)
+    def initTello(drone: Tello = None) -> Tello:
+        """Connect to the Tello and turn on its video stream, see takeoff"""
+        if drone is None:
+            drone = Tello(retry_count=1)
         drone.connect()
         FaceTracker.LOGGER.info("battery {}".format(drone.get_battery()))
         FaceTracker.LOGGER.info("temperature {}".format(
             drone.get_highest_temperature()))
         drone.streamoff()
         drone.streamon()
-        drone.get_frame_read()
-        drone.takeoff()
-        drone.move_up(70)
         return drone
 
-    def _throttle(self) -> bool:
-        """Decide whether need to throttle commands to Tello.
-        It reduce the command frequence up to FaceTracker.MAX_COMMAND_SEC commands per second.
+    def takeoff(self) -> None:
+        """Thread worker function to take off, climb to the tracking height
+        and start sending rc commands"""
+        if self.stream_error is not None:
+            return  # the video stream failed, stay on the ground
+        try:
+            self.drone.takeoff()
+            self.drone.move_up(FaceTracker.TAKEOFF_HEIGHT)
+        except Exception as e:
+            FaceTracker.LOGGER.error(f"takeoff failed: {e}")
+            return
+        self.markStartup('airborne')
+        self.airborne.set()
+        self.rc.start()
+
+    def openStream(self, source, pacing: str, fps: float) -> None:
+        """Thread worker function to open the video source, read its first
+        frame and start the frame reader"""
+        try:
+            frame_read = FrameReader(open_source(source, self.drone, fps),
+                                     pacing, fps)
+            frame_read.start()
+            self.frame_read = frame_read
+            self.markStartup('stream')
+        except Exception as e:
+            FaceTracker.LOGGER.error(f"video stream failed: {e}")
+            self.stream_error = e
+        self.stream_ready.set()
+        if self.stream_error is not None:
+            self.abortFlight()
+
+    def abortFlight(self) -> None:
+        """Wait for the takeoff sequence, then stop the rc commands and land"""
+        self.flight.join()
+        self.rc.stop()
+        if not self.airborne.is_set():
+            return
+        self.airborne.clear()
+        try:
+            self.drone.land()
+        except Exception as e:
+            FaceTracker.LOGGER.error(f"landing failed: {e}")
+        FaceTracker.LOGGER.warning("landed, no video stream")
+
+    def warmupDetector(self, w: int, h: int) -> None:
+        """Thread worker function to load the detector model and run it once"""
+        try:
+            self.detector.warmup(w, h)
+        except Exception as e:
+            FaceTracker.LOGGER.error(f"detector warm-up failed: {e}")
+        self.markStartup('detector')
+
+    def markStartup(self, step: str) -> None:
+        """Record the time of a startup step, the first time only"""
+        self.startup.setdefault(step, time.monotonic() - self.start_time)
+
+    def startupReport(self) -> str:
+        return ", ".join(f"{step} {t:.2f} s"
+                         for step, t in sorted(self.startup.items(),
+                                               key=lambda item: item[1]))
+
+    @staticmethod
+    def eyeCascade() -> cv2.CascadeClassifier:
+        """Return the eye cascade, loaded on first use"""
+        return load_cascade(
+            find_file(FaceTracker.EYE_CASCADE, [CV2_DATA_DIR]))
+
+    def getFrameRead(self,
+                     timeout: Optional[float] = None) -> Optional[FrameReader]:
+        """Return the background frame reader of the video source or the Tello
+        stream, once the stream is open
+        :param timeout: the maximum wait in seconds, None to wait until it is open
+        :return: the frame reader, None on timeout
         """
-        t = self.fps <= FaceTracker.MAX_COMMAND_SEC
-        if not t:
-            interval = self.fps // FaceTracker.MAX_COMMAND_SEC
-            t = self.track_count % interval == 0
-        #FaceTracker.LOGGER.info(f"{self.track_count} {t} {self.fps}")
-        self.track_count += 1
-        return t
-
-    def readFrame(self):
-        """Return the latest image captured by Tello. And resize to (w, h).
+        if not self.stream_ready.wait(timeout):
+            return None
+        if self.stream_error is not None:
+            raise self.stream_error
+        return self.frame_read
+
+    def readFrame(self, timeout: Optional[float] = 1.0):
+        """Wait for a new image captured by Tello. And resize to (w, h).
+        The image is valid for the next FRAME_SLOTS - 1 calls, or until it
+        is released if it was held with frames.hold(frames.seq). Its sequence
+        number and capture time are in frame_seq and frame_time.
+        :param timeout: the maximum wait in seconds, None to wait until the stream ends
+        :return: the image, None if no new image arrived or all the buffers are held
         """
-        frame = self.drone.get_frame_read()
-        img = frame.frame
-        img = cv2.resize(img, (self.w, self.h))
+        with self.tracer.span('capture', self.frame_seq + 1):
+            frame_read = self.getFrameRead(timeout)
+            if frame_read is None:
+                return None
+            dst = self.frames.acquire(timeout)
+            if dst is None:
+                return None
+            # held until it is resized, the reader decodes into a ring
+            item = frame_read.wait_for_frame(self.frame_seq, timeout, True)
+        if item is None:
+            return None
+        self.frame_seq, frame, self.frame_time = item
+        if 'first frame' not in self.startup:
+            self.markStartup('first frame')
+        # resize into the next preallocated buffer, the image is annotated later
+        try:
+            with self.tracer.span('resize', self.frame_seq):
+                img = cv2.resize(frame, (self.w, self.h), dst=dst)
+        finally:
+            frame_read.release(self.frame_seq)
+        self.frames.publish()
         return img
 
-    def trackFace(self, info) -> tuple:
+    @hotpath
+    def trackFace(self, info, capture_time: Optional[float] = None) -> tuple:
+        """Update the PID controllers and set the rc command for a face
+        :param info: the face center and area, area 0 if no face was found
+        :param capture_time: the capture time.monotonic() of the frame,
+            default frame_time of the last frame read
+        :return: the (lr, fb, ud, yaw) rc command
+        """
         area = info[1]
         cx, cy = info[0]
-
-        def clip(x: int, lower: int = -100, upper: int = 100) -> int:
-            return max(lower, min(upper, x))
+        if not self.tracking and self.airborne.is_set():
+            # the controllers start with the first step after the takeoff
+            self.pid.reset()
 
         # lr_v = 0  left -100, right 100
         # fb_v = 0  backward -100, forward 100
@@ -148,53 +343,83 @@ class FaceTracker(object):
             fb_v = self.fb_override
             ud_v = self.ud_override
             yaw_v = self.yaw_override
+        elif not self.airborne.is_set():
+            # hold the controllers until the takeoff sequence is done
+            lr_v, fb_v, ud_v, yaw_v = 0, 0, 0, 0
         elif area == 0 or cx == 0 or cy == 0:
             lr_v = 0
             fb_v = 0
             ud_v = 0
             yaw_v = 0
+            if self.flight_log is not None:
+                self.flight_log.add(time.monotonic(), self.pid_pv, (0, 0, 0, 0),
+                                    False)
         else:
-            # left_right_velocity
-            # lr_v = int(self.lr_pid.update(cx))
-            # lr_v = clip(lr_v, -5, 5)
-            lr_v = 0
-
-            # forward_backward_velocity
-            pv = math.sqrt(area)
-            fb_v = int(self.fb_pid.update(pv))
-            fb_v = clip(fb_v, -30, 30)
-            # fb_v = 0
-
-            # up_down_velocity
-            ud_v = int(self.ud_pid.update(cy))
-            ud_v = clip(ud_v, -20, 20)
-            # ud_v = 0
-
-            # yaw_velocity
-            yaw_v = int(self.yaw_pid.update(cx))
-            yaw_v = clip(yaw_v, -30, 30)
-            # yaw_v = 0
-
-        #if self._throttle():
-        self.drone.send_rc_control(lr_v, fb_v, ud_v, yaw_v)
-        FaceTracker.LOGGER.debug(
-            f"{lr_v:>3d} {fb_v:>3d} {ud_v:>3d} {yaw_v:>3d}")
+            pv = self.pid_pv = (cx, math.sqrt(area), cy, cx)
+            now = time.monotonic()
+            # limited to RC_LIMITS, lr is disabled by a zero limit
+            with self.tracer.span('pid', self.frame_seq):
+                lr_v, fb_v, ud_v, yaw_v = (int(v)
+                                           for v in self.pid.update(pv, now))
+            if self.flight_log is not None:
+                self.flight_log.add(now, pv, (lr_v, fb_v, ud_v, yaw_v))
+
+        if capture_time is None:
+            capture_time = self.frame_time
+        self.rc.set(lr_v, fb_v, ud_v, yaw_v, capture_time)
+        if not self.tracking and self.airborne.is_set():
+            self.tracking = True
+            self.markStartup('tracking')
+            FaceTracker.LOGGER.info(f"startup: {self.startupReport()}")
+        self.tracer.add('capture_to_rc', capture_time, time.monotonic(),
+                        self.frame_seq)
+        if FaceTracker.LOGGER.isEnabledFor(logging.DEBUG):
+            FaceTracker.LOGGER.debug(
+                f"{lr_v:>3d} {fb_v:>3d} {ud_v:>3d} {yaw_v:>3d}")
         #print("fb", fb_v, "area", area, "error", error)
         self.pid_cv = (lr_v, fb_v, ud_v, yaw_v)
         return self.pid_cv
 
+    @hotpath
     def findFace(self, img):
         """detect front faces in the image. If multiple faces are detected, it returs the face with largest area.
         :param img: the image array in BGR
         :return: the detected face center and its area
         """
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(image=gray,
-                                                   scaleFactor=1.3,
-                                                   minNeighbors=5,
-                                                   minSize=(20, 20),
-                                                   maxSize=(200, 200))
-
+        if self.warmup.is_alive():
+            self.warmup.join()  # the detector buffers are not shared
+        start = time.perf_counter()
+        with self.tracer.span('gray', self.frame_seq):
+            image = self.detector.prepare(img)
+        with self.tracer.span('detect', self.frame_seq):
+            faces = self.locateFaces(image)
+        if self.quality is not None:
+            quality = self.quality.update(time.perf_counter() - start)
+            if quality is not None:
+                self.applyQuality(quality)
+        return self.pickFace(img, faces)
+
+    def applyQuality(self, quality: Quality) -> None:
+        """Use the detection settings of a quality step
+        :param quality: the detection scale, cascade scaleFactor, ROI margin and
+            detect every N frames
+        :return: None
+        """
+        self.detect_scale = quality.scale
+        self.detect_every = quality.every
+        if self.roi is not None:
+            self.roi.margin = quality.margin
+        # the other backends have no scale steps to tune
+        if isinstance(self.detector, CascadeDetector):
+            self.detector.scaleFactor = quality.scaleFactor
+
+    def pickFace(self, img, faces):
+        """draw the detected faces and pick the face with largest area.
+        :param img: the image array in BGR
+        :param faces: the face boxes (x, y, w, h) detected in img
+        :return: the detected face center and its area
+        """
+        self.faces = faces
         faceListCenter = []
         faceListArea = []
 
@@ -210,7 +435,7 @@ class FaceTracker(object):
 
             # roi_gray = gray[y:y + h, x:x + w]
             # roi_color = img[y:y + h, x:x + w]
-            # eyes = self.eye_cascade.detectMultiScale(roi_gray)
+            # eyes = self.eyeCascade().detectMultiScale(roi_gray)
             # for (ex, ey, ew, eh) in eyes:
             #     cv2.rectangle(roi_color, (ex, ey), (ex + ew, ey + eh),
             #                   (0, 255, 0), 2)
@@ -228,66 +453,95 @@ class FaceTracker(object):
         else:
             return img, [[0, 0], 0]
 
-    def findFace_mp(self, img):
-        # Convert the BGR image to RGB and process it with MediaPipe Face Detection.
-        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        results = self.face_detection.process(rgb)
-        #print(results)
-
-        if not results.detections:
-            return img, [[0, 0], 0]
-
-        faceListCenter = []
-        faceListArea = []
-
-        for detection in results.detections:
-            #print(mp_face_detection.get_key_point(detection, mp_face_detection.FaceKeyPoint.NOSE_TIP))
-            #mp_drawing.draw_detection(img, detection)
-            box = detection.location_data.relative_bounding_box
-            ih, iw, ic = img.shape
-            (x, y, w, h) = (int(box.xmin * iw), int(box.ymin * ih),
-                            int(box.width * iw), int(box.height * ih))
-            cv2.rectangle(img, (x, y), (x + w, y + h), (0, 0, 255), 2)
-            cv2.putText(img, f"{int(detection.score[0]*100)}%", (x, y),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1, (100, 255, 0), 1,
-                        cv2.LINE_AA)
-            cx = int(x + w / 2)
-            cy = int(y + h / 2)
-            area = w * h
-            faceListCenter.append([cx, cy])
-            faceListArea.append(area)
-            cv2.circle(img, (cx, cy), 5, (0, 255, 0), cv2.FILLED)
-
-        if len(faceListArea) != 0:
-            i = faceListArea.index(max(faceListArea))
-            return img, [faceListCenter[i], faceListArea[i]]
+    def locateFaces(self, image):
+        """run the face detector every detect_every frames, or when tracking is lost.
+        In between, propagate the last face box with the template tracker.
+        :param image: the image converted by the detector prepare()
+        :return: the list of face boxes (x, y, w, h) in image coordinates
+        """
+        start = time.perf_counter()
+        if self.since_detect < self.detect_every:
+            box = self.box_tracker.track(image)
+            if box is not None:
+                self.since_detect += 1
+                if self.roi is not None:
+                    self.roi.follow(box)
+                self.last_path = 'track'
+                self.path_cost['track'].add(time.perf_counter() - start)
+                return [box]
+
+        faces = self.detectFaces(image)
+        self.since_detect = 1
+        if len(faces) and self.detect_every > 1:
+            self.box_tracker.init(image, max(faces, key=lambda f: f[2] * f[3]))
         else:
-            return img, [[0, 0], 0]
-
-    def putFPS(self, img) -> None:
-        cur_time = time.time()
-        fps: int = int(1.0 / (cur_time - self.prev_time))
+            self.box_tracker.reset()
+        self.last_path = 'detect'
+        self.path_cost['detect'].add(time.perf_counter() - start)
+        return faces
+
+    def detectFaces(self, image):
+        """run the face detector on the whole image, or on the ROI window around the last face.
+        :param image: the image converted by the detector prepare()
+        :return: the list of face boxes (x, y, w, h) in image coordinates
+        """
+        minSize = (FaceTracker.MIN_FACE_SIZE, FaceTracker.MIN_FACE_SIZE)
+        maxSize = (FaceTracker.MAX_FACE_SIZE, FaceTracker.MAX_FACE_SIZE)
+        if self.roi is None:
+            return self.detector.detect(image, minSize, maxSize,
+                                        self.detect_scale)
+
+        ih, iw = image.shape[:2]
+        window = self.roi.window(iw, ih)
+        x0, y0, x1, y1 = window if window is not None else (0, 0, iw, ih)
+        if window is not None:
+            minSize, maxSize = self.roi.sizes(minSize, maxSize)
+        faces = self.detector.detect(image[y0:y1, x0:x1], minSize, maxSize,
+                                     self.detect_scale)
+        faces = [(x + x0, y + y0, w, h) for (x, y, w, h) in faces]
+        self.roi.update(
+            max(faces, key=lambda f: f[2] * f[3]) if faces else None,
+            window is None)
+        return faces
+
+    def updateFPS(self) -> int:
+        """Update the frame rate from the smoothed interval between calls"""
+        cur_time = time.monotonic()
+        interval = cur_time - self.prev_time
         self.prev_time = cur_time
-        self.fps = fps
+        if interval > 0:
+            # exponential moving average, seeded by the first interval
+            alpha = FaceTracker.FPS_ALPHA if self.frame_interval > 0 else 1.0
+            self.frame_interval += alpha * (interval - self.frame_interval)
+        if self.frame_interval > 0:
+            self.fps = int(round(1.0 / self.frame_interval))
+        return self.fps
+
+    @hotpath
+    def putFPS(self, img) -> None:
+        fps = self.updateFPS()
         cv2.putText(img, f"FPS: {fps}", (7, 30), cv2.FONT_HERSHEY_PLAIN, 1,
                     (100, 255, 0), 1, cv2.LINE_AA)
 
+    @hotpath
     def putFlight(self, img) -> None:
         #ih, iw, ic = img.shape
         #color = (100, 255, 0)
-        cv2.putText(img, f"x': {self.drone.get_acceleration_x()}",
+        state = self.telemetry.snapshot
+        cv2.putText(img, f"x': {state.agx}",
                     (7, 30 + 22), cv2.FONT_HERSHEY_PLAIN, 1, (100, 255, 0), 1,
                     cv2.LINE_AA)
-        cv2.putText(img, f"y': {self.drone.get_acceleration_y()}",
+        cv2.putText(img, f"y': {state.agy}",
                     (7, 30 + 22 + 22), cv2.FONT_HERSHEY_PLAIN, 1,
                     (100, 255, 0), 1, cv2.LINE_AA)
-        cv2.putText(img, f"z': {self.drone.get_acceleration_z()}",
+        cv2.putText(img, f"z': {state.agz}",
                     (7, 30 + 22 + 22 + 22), cv2.FONT_HERSHEY_PLAIN, 1,
                     (100, 255, 0), 1, cv2.LINE_AA)
-        cv2.putText(img, f"h : {self.drone.get_distance_tof()}",
+        cv2.putText(img, f"h : {state.tof}",
                     (7, 30 + 22 + 22 + 22 + 22), cv2.FONT_HERSHEY_PLAIN, 1,
                     (100, 255, 0), 1, cv2.LINE_AA)
 
+    @hotpath
     def putPID(self, img) -> None:
         ih, iw, ic = img.shape
         # (lr_v, fb_v, ud_v, yaw_v)
@@ -303,57 +557,127 @@ class FaceTracker(object):
                     (iw - 90, 30 + 22 + 22 + 22 + 22), cv2.FONT_HERSHEY_PLAIN,
                     1, color, 1, cv2.LINE_AA)
 
+    @hotpath
     def putBattery(self, img) -> None:
         ih, iw, ic = img.shape
-        battery = self.drone.get_battery()
+        battery = self.telemetry.snapshot.battery
         color = (100, 255, 0) if battery > 20 else (100, 0, 255)
         cv2.putText(img, f"BAT: {battery}%", (iw - 90, 30),
                     cv2.FONT_HERSHEY_PLAIN, 1, color, 1, cv2.LINE_AA)
 
+    @hotpath
     def putTemperature(self, img) -> None:
         ih, iw, ic = img.shape
-        temp = self.drone.get_highest_temperature()
+        temp = self.telemetry.snapshot.temperature
         color = (100, 255, 0) if temp < 70 else (100, 0, 255)
         cv2.putText(img, f"TEMP: {temp}", (iw // 2 - 40, 30),
                     cv2.FONT_HERSHEY_PLAIN, 1, color, 1, cv2.LINE_AA)
 
-    def setAnnotatedImage(self, img) -> None:
-        self.annotatedImage = img
-
-    def recordVideo(self):
-        """record video to an unqiue avi file"""
-        if self.video:
-            return
+    @hotpath
+    def putHud(self, img) -> None:
+        """Draw FPS, PID, battery, temperature and flight state like the put*
+        methods, re-rasterizing only the values that changed.
+        """
+        self.updateFPS()
+        green, red = (100, 255, 0), (100, 0, 255)
+        state = self.telemetry.snapshot
+        hud = self.hud
+        hud.set('fps', f"FPS: {self.fps}", green)
+        hud.set('agx', f"x': {state.agx}", green)
+        hud.set('agy', f"y': {state.agy}", green)
+        hud.set('agz', f"z': {state.agz}", green)
+        hud.set('tof', f"h : {state.tof}", green)
+        hud.set('battery', f"BAT: {state.battery}%",
+                green if state.battery > 20 else red)
+        hud.set('temperature', f"TEMP: {state.temperature}",
+                green if state.temperature < 70 else red)
+        hud.set('lr', f"L-R: {self.pid_cv[0]}", green)
+        hud.set('fb', f"F+B: {self.pid_cv[1]}", green)
+        hud.set('ud', f"U|D: {self.pid_cv[2]}", green)
+        hud.set('yaw', f"YAW: {self.pid_cv[3]}", green)
+        if self.quality is not None:
+            hud.set('quality', f"Q{self.quality}",
+                    green if self.quality.frame_time <= self.quality.budget
+                    else red)
+        hud.compose(img)
+
+    def startFlightLog(self) -> FlightLog:
+        """Record the PID input and rc output of every control step"""
+        if self.flight_log is None:
+            self.flight_log = FlightLog(self.pid.names, self.pid.SP,
+                                        self.pid.limit, self.pid.kP,
+                                        self.pid.kI, self.pid.kD)
+        return self.flight_log
+
+    def startTrace(self) -> Tracer:
+        """Record the latency spans of the frame stages"""
+        self.tracer.enabled = True
+        return self.tracer
 
-        def uniq_filename() -> str:
-            fn = f"vid-{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.avi"
-            return fn
-
-        fn = uniq_filename()
-        self.keepRecording = True
-        self.video = cv2.VideoWriter(fn, cv2.VideoWriter_fourcc(*'XVID'),
-                                     FaceTracker.RECORD_FRAME_RATE,
-                                     (self.w, self.h))
-        while self.keepRecording:
-            if self.annotatedImage is not None:
-                self.video.write(self.annotatedImage)
-                time.sleep(1.0 / FaceTracker.RECORD_FRAME_RATE)
-        self.video.release()
-
-    def startVideoRecord(self):
-        """create a thread to record video"""
+    def setAnnotatedImage(self, img) -> None:
+        """Pass an annotated frame to the video recorder, the preview and the
+        frame bus"""
+        if self.recorder is not None:
+            with self.tracer.span('record', self.frame_seq):
+                self.recorder.write(img)
+        if self.preview is not None:
+            self.preview.submit(img)
+        if self.bus is not None:
+            with self.tracer.span('bus', self.frame_seq):
+                self.bus.publish(img, self.frame_time, self.faces)
+
+    def startFrameBus(self, name: Optional[str] = None):
+        """Publish the annotated frames and face boxes in shared memory for
+        consumer processes
+        :param name: the shared memory name, default a unique name
+        :return: the FrameBus
+        """
+        # imported on use, multiprocessing.shared_memory needs Python 3.8
+        from face_track.framebus import FrameBus
+        if self.bus is None:
+            self.bus = FrameBus((self.h, self.w, 3), name)
+        return self.bus
+
+    def startPreview(self,
+                     host: str = '127.0.0.1',
+                     port: int = 8080,
+                     fps: float = 5.0,
+                     quality: int = 70,
+                     on_stop: Optional[Callable[[], None]] = None
+                     ) -> PreviewServer:
+        """Serve the annotated frames as a MJPEG stream over HTTP"""
+        if self.preview is None:
+            self.preview = PreviewServer(host, port, fps, quality, on_stop)
+            self.preview.start()
+        return self.preview
+
+    def startVideoRecord(self) -> None:
+        """Record the annotated frames to an unique avi file on an encoder process"""
         if self.recorder:
             return
-        self.recorder = threading.Thread(target=self.recordVideo)
+        fn = f"vid-{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.avi"
+        self.recorder = VideoRecorder(fn, self.w, self.h,
+                                      FaceTracker.RECORD_FRAME_RATE)
         self.recorder.start()
 
-    def stopVideoRecord(self):
-        self.keepRecording = False
+    def stopVideoRecord(self) -> None:
+        if self.recorder is None:
+            return
+        recorder, self.recorder = self.recorder, None
+        recorder.stop()
 
     def end(self) -> None:
         FaceTracker.LOGGER.info("end")
         try:
-            self.keepRecording = False
+            self.stopVideoRecord()
+            if self.preview is not None:
+                self.preview.stop()
+            if self.bus is not None:
+                self.bus.close()
+            self.rc.stop()
+            if self.frame_read is not None:
+                self.frame_read.stop()
+            self.telemetry.stop()
             self.drone.end()
         except AttributeError:
             pass
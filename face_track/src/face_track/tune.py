@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""Offline PID gain tuning from a flight log.
+
+For each axis a plant model is fitted to the logged control steps: the rc
+command, delayed by a few control steps and smoothed by a first order lag,
+moves the process variable at a rate proportional to it,
+
+    pv' = gain * lag(rc[k - delay], tau) + disturbance
+
+The residual of the fit is the disturbance, e.g. the person moving. A grid
+of candidate gains is then simulated at once with a batch PIDBank, for a
+step of the setpoint and for the logged disturbances, and ranked by
+settling time, overshoot, rc effort and disturbance error.
+
+Usage:
+```
+face_track --log-flight flight.npz
+face_track tune flight.npz --top 5
+```
+"""
+import argparse
+import collections
+import logging
+import sys
+import time
+from typing import Dict, List, NamedTuple, Sequence
+
+import numpy as np
+
+from face_track.flightlog import load
+from face_track.pid import PIDBank
+
+HANDLER = logging.StreamHandler()
+FORMATTER = logging.Formatter(
+    '[%(levelname)s] %(filename)s - %(lineno)d - %(message)s')
+HANDLER.setFormatter(FORMATTER)
+
+LOGGER = logging.getLogger('tune')
+LOGGER.addHandler(HANDLER)
+LOGGER.setLevel(logging.INFO)
+
+DELAYS = (0, 1, 2, 3, 4, 5)  # candidate plant delays in control steps
+TAUS = (0.02, 0.05, 0.1, 0.2, 0.4, 0.8)  # candidate plant lags in seconds
+
+
+class Plant(NamedTuple):
+    """A fitted axis model, see the module doc"""
+    gain: float  # pv units per second per rc unit
+    tau: float  # the lag time constant in seconds
+    delay: int  # the delay in control steps
+    dt: float  # the control period in seconds
+    disturbance: np.ndarray  # the residual pv rate of each window, pv units per second
+    residual: float  # the RMS of the fit residual, pv units
+
+
+def lag(u: np.ndarray, tau: float, dt: np.ndarray) -> np.ndarray:
+    """Filter u with a first order lag of time constant tau"""
+    out = np.empty_like(u)
+    y = 0.0
+    for k, (x, h) in enumerate(zip(u, dt)):
+        out[k] = y
+        y += h / (tau + h) * (x - y)
+    return out
+
+
+def fit_plant(t: np.ndarray,
+              pv: np.ndarray,
+              rc: np.ndarray,
+              found: np.ndarray,
+              window: int = 6,
+              lost_time: float = PIDBank.LOST_TIME) -> Plant:
+    """Fit the plant model of one axis by least squares.
+    The change of pv over `window` steps is fitted rather than the rate of
+    each step, which averages out the jitter of the face detection. And the
+    difference of two consecutive changes is fitted, which cancels a slowly
+    varying disturbance; in closed loop the rc command follows the
+    disturbance, and fitting the changes themselves underestimates the gain.
+    :param t: the time of each control step in seconds
+    :param pv: the process variable of each step
+    :param rc: the rc command of each step
+    :param found: True if the step has a valid pv
+    :param window: the number of control steps of each fitted change
+    :param lost_time: steps further apart are not used
+    :return: the best fitting plant over DELAYS and TAUS
+    """
+    dt = np.diff(t)
+    valid = found[1:] & found[:-1] & (dt > 0) & (dt < lost_time)
+    # pairs of windows of steps k..k+2*window-1 that are all valid
+    invalid = np.concatenate(([0], np.cumsum(~valid)))
+    starts = np.nonzero(invalid[2 * window:] == invalid[:-2 * window])[0]
+    if len(starts) < 10:
+        raise ValueError("not enough tracked control steps to fit a plant")
+    first, middle, last = starts, starts + window, starts + 2 * window
+    pv = np.nan_to_num(pv)
+    change = pv[middle] - pv[first]
+    y = pv[last] - pv[middle] - change
+    duration = t[middle] - t[first]
+    best = None
+    for delay in DELAYS:
+        # the command sent `delay` steps before the step, 0 before the log
+        delayed = np.concatenate((np.zeros(delay), rc[:len(rc) - delay]))
+        for tau in TAUS:
+            # the integral of the lagged command up to each step
+            lagged = lag(delayed, tau, np.append(dt, dt[-1]))[1:]
+            moved = np.concatenate(([0.0], np.cumsum(dt * lagged)))
+            x = moved[middle] - moved[first]
+            x2 = moved[last] - moved[middle] - x
+            gain = float(np.dot(x2, y) / np.dot(x2, x2)) if x2.any() else 0.0
+            rms = float(np.sqrt(np.mean((y - gain * x2)**2)))
+            if best is None or rms < best.residual:
+                # the disturbance rate, averaged over each window
+                best = Plant(gain, tau, delay, float(np.median(dt[valid])),
+                             (change - gain * x) / duration, rms)
+    return best
+
+
+class Metrics(NamedTuple):
+    """Simulated performance of each candidate, arrays over the candidates"""
+    settling: np.ndarray  # step settling time in seconds, the horizon if never
+    overshoot: np.ndarray  # step overshoot, a fraction of the step
+    effort: np.ndarray  # mean |rc|, a fraction of the limit
+    error: np.ndarray  # RMS error under the logged disturbances, a fraction of the step
+
+
+def simulate(plant: Plant,
+             sp: float,
+             limit: float,
+             kP: np.ndarray,
+             kI: np.ndarray,
+             kD: np.ndarray,
+             step: float,
+             horizon: float = 10.0,
+             band: float = 0.05,
+             max_steps: int = 3000) -> Metrics:
+    """Simulate a batch of PID gains on the plant
+    :param plant: the axis model
+    :param sp: the setpoint
+    :param limit: the rc output limit
+    :param kP: the proportional gains of the candidates
+    :param kI: the integral gains of the candidates
+    :param kD: the derivative gains of the candidates
+    :param step: the initial offset of pv from sp in the step response
+    :param horizon: the step response duration in seconds
+    :param band: the settling band, a fraction of the step
+    :param max_steps: the most logged disturbance steps to replay
+    :return: the metrics of each candidate
+    """
+    steps = int(horizon / plant.dt)
+    n = len(kP)
+    sign = np.sign(step)
+
+    def run(pv0: float, disturbance: np.ndarray, count: int):
+        """Return the largest error of sign `sign`, the last step outside the
+        settling band, the sum of squared errors and the mean |rc| / limit"""
+        # one axis, a batch of the candidates
+        bank = PIDBank(kP=np.reshape(kP, (n, 1)),
+                       kI=np.reshape(kI, (n, 1)),
+                       kD=np.reshape(kD, (n, 1)),
+                       SP=sp,
+                       limit=limit)
+        bank.reset(0.0)
+        pv = np.full(n, pv0)
+        v = np.zeros(n)
+        delayed = collections.deque(np.zeros(n) for _ in range(plant.delay))
+        alpha = plant.dt / (plant.tau + plant.dt)
+        worst = np.zeros(n)
+        last_outside = np.full(n, -1)
+        squares = np.zeros(n)
+        effort = np.zeros(n)
+        for k in range(count):
+            # trackFace sends int(cV)
+            rc = np.trunc(bank.update(pv[:, None], (k + 1) * plant.dt)[:, 0])
+            effort += np.abs(rc)
+            delayed.append(rc)
+            v += alpha * (delayed.popleft() - v)
+            pv += plant.dt * (plant.gain * v + disturbance[k % len(disturbance)])
+            error = sp - pv
+            np.maximum(worst, error * sign, out=worst)
+            last_outside[np.abs(error) > band * abs(step)] = k
+            squares += error * error
+        return worst, last_outside, squares, effort / (count * limit)
+
+    # the step starts with error -step, overshoot is an error of the other sign
+    worst, last_outside, _, effort = run(sp + step, np.zeros(1), steps)
+    overshoot = worst / abs(step)
+    settling = np.where(last_outside == steps - 1, horizon,
+                        (last_outside + 1) * plant.dt)
+
+    # the disturbance has a mean offset the fit attributes to the plant
+    disturbance = plant.disturbance - plant.disturbance.mean()
+    count = min(len(disturbance), max_steps)
+    _, _, squares, disturbed = run(sp, disturbance, count)
+    error = np.sqrt(squares / count) / abs(step)
+    return Metrics(settling, overshoot, (effort + disturbed) / 2, error)
+
+
+def score(metrics: Metrics,
+          horizon: float,
+          weights: Sequence[float] = (1.0, 1.0, 1.0, 1.0)) -> np.ndarray:
+    """Combine the metrics into one score, lower is better"""
+    return (weights[0] * metrics.settling / horizon +
+            weights[1] * metrics.overshoot + weights[2] * metrics.effort +
+            weights[3] * metrics.error)
+
+
+def gain_grid(sign: float,
+              kP: Sequence[float] = tuple(np.geomspace(0.05, 2.0, 20)),
+              kI: Sequence[float] = (0.0, ) + tuple(np.geomspace(0.001, 0.2, 12)),
+              kD: Sequence[float] = (0.0, ) + tuple(np.geomspace(0.01, 0.5, 10))):
+    """Return the flattened kP, kI, kD arrays of all combinations, signed"""
+    p, i, d = np.meshgrid(kP, kI, kD, indexing='ij')
+    return sign * p.ravel(), sign * i.ravel(), sign * d.ravel()
+
+
+def tune(path: str,
+         axes: Sequence[str] = ('fb', 'ud', 'yaw'),
+         step: float = 0.25,
+         horizon: float = 10.0,
+         top: int = 5) -> Dict[str, List[dict]]:
+    """Fit the plant of each axis and rank a grid of PID gains
+    :param path: the flight log file
+    :param axes: the axes to tune
+    :param step: the setpoint step, a fraction of the setpoint
+    :param horizon: the step response duration in seconds
+    :param top: the number of best candidates to return per axis
+    :return: the best candidates by axis, best first
+    """
+    log = load(path)
+    names = [str(n) for n in log['names']]
+    results = {}
+    for axis in axes:
+        i = names.index(axis)
+        plant = fit_plant(log['t'], log['pv'][:, i], log['rc'][:, i],
+                          log['found'])
+        LOGGER.info(f"{axis} plant gain {plant.gain:.3f} tau {plant.tau} "
+                    f"delay {plant.delay} dt {plant.dt * 1000:.1f} ms "
+                    f"residual {plant.residual:.2f}")
+        kP, kI, kD = gain_grid(np.sign(plant.gain) or 1.0)
+        # the gains flown in the log, simulated last for reference
+        kP, kI, kD = (np.append(k, log[name][i])
+                      for k, name in zip((kP, kI, kD), ('kP', 'kI', 'kD')))
+        sp, limit = float(log['sp'][i]), float(log['limit'][i])
+        start = time.perf_counter()
+        metrics = simulate(plant, sp, limit, kP, kI, kD, step * sp, horizon)
+        scores = score(metrics, horizon)
+        LOGGER.info(f"{axis} {len(kP)} candidates simulated in "
+                    f"{time.perf_counter() - start:.2f} s")
+        order = np.argsort(scores)
+        ranks = np.empty_like(order)
+        ranks[order] = np.arange(1, len(order) + 1)
+
+        def row(j: int) -> dict:
+            return {
+                'rank': int(ranks[j]),
+                'kP': float(kP[j]),
+                'kI': float(kI[j]),
+                'kD': float(kD[j]),
+                'settling': float(metrics.settling[j]),
+                'overshoot': float(metrics.overshoot[j]),
+                'effort': float(metrics.effort[j]),
+                'error': float(metrics.error[j]),
+                'score': float(scores[j]),
+                'current': j == len(kP) - 1,
+            }
+
+        rows = [row(j) for j in order[:top]]
+        if not any(r['current'] for r in rows):
+            rows.append(row(len(kP) - 1))
+        results[axis] = rows
+    return results
+
+
+def main(args=None) -> int:
+    if args is None:
+        args = sys.argv[1:]
+    parser = argparse.ArgumentParser(
+        prog="face_track tune",
+        description="fit a plant model to a flight log and rank PID gains")
+    parser.add_argument("log", help="the flight log, see face_track --log-flight")
+    parser.add_argument("--axes", nargs="+", default=["fb", "ud", "yaw"])
+    parser.add_argument("--step",
+                        type=float,
+                        default=0.25,
+                        help="the setpoint step, a fraction of the setpoint")
+    parser.add_argument("--horizon",
+                        type=float,
+                        default=10.0,
+                        help="the step response duration in seconds")
+    parser.add_argument("--top", type=int, default=5)
+    opts = parser.parse_args(args)
+    results = tune(opts.log, opts.axes, opts.step, opts.horizon, opts.top)
+    for axis, rows in results.items():
+        print(f"{axis}:")
+        print(f"{'rank':>6} {'kP':>8} {'kI':>8} {'kD':>8} {'settle s':>9} "
+              f"{'overshoot':>9} {'effort':>7} {'error':>7} {'score':>7}")
+        for r in rows:
+            print(f"{r['rank']:>6} {r['kP']:>8.3f} {r['kI']:>8.4f} "
+                  f"{r['kD']:>8.3f} {r['settling']:>9.2f} {r['overshoot']:>9.2f} "
+                  f"{r['effort']:>7.2f} {r['error']:>7.2f} {r['score']:>7.3f}"
+                  f"{'  current' if r['current'] else ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
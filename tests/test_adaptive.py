@@ -0,0 +1,64 @@
+from face_track.adaptive import LADDER, Quality, QualityController
+
+BUDGET = 0.03
+SLOW = 2 * BUDGET
+FAST = 0.1 * BUDGET
+
+
+def feed(quality, seconds, frames):
+    """Return the frame index and settings of the first step, or None"""
+    for i in range(frames):
+        step = quality.update(seconds)
+        if step is not None:
+            return i + 1, step
+    return None
+
+
+def test_steps_down_after_down_hold():
+    quality = QualityController(budget=BUDGET)
+    assert feed(quality, SLOW, QualityController.DOWN_HOLD) == (
+        QualityController.DOWN_HOLD, LADDER[1])
+    assert quality.level == 1 and quality.frames == 0
+    assert quality.changes == 1
+
+
+def test_stays_at_the_cheapest_step():
+    quality = QualityController(budget=BUDGET, level=len(LADDER) + 3)
+    assert quality.level == len(LADDER) - 1
+    assert feed(quality, SLOW, 100) is None
+
+
+def test_steps_up_after_up_hold():
+    quality = QualityController(budget=BUDGET, level=2)
+    assert feed(quality, 0.9 * BUDGET, 200) is None  # within the budget
+    quality = QualityController(budget=BUDGET, level=2)
+    assert feed(quality, FAST, 200) == (QualityController.UP_HOLD, LADDER[1])
+    assert quality.went_up
+    assert feed(QualityController(budget=BUDGET), FAST, 200) is None
+
+
+def test_failed_step_up_waits_longer():
+    quality = QualityController(budget=BUDGET, level=1)
+    holds = []
+    for _ in range(6):
+        assert feed(quality, FAST, 2000)[1] == LADDER[0]
+        # the step up goes over the budget right away
+        down = (QualityController.DOWN_HOLD, LADDER[1])
+        assert feed(quality, SLOW, 100) == down
+        holds.append(quality.up_hold)
+    up = QualityController.UP_HOLD
+    assert holds == [2 * up, 4 * up, 8 * up, 16 * up, 16 * up, 16 * up]
+    assert holds[-1] == QualityController.MAX_UP_HOLD
+    # a step up that holds for the wait resets it
+    assert feed(quality, FAST, 2000)[1] == LADDER[0]
+    assert feed(quality, FAST, QualityController.MAX_UP_HOLD) is None
+    assert feed(quality, SLOW, 100)[1] == LADDER[1]
+    assert quality.up_hold == up
+
+
+def test_str():
+    quality = QualityController(ladder=(Quality(1.0, 1.1, 1.0, 1),
+                                        Quality(0.5, 1.25, 0.5, 3)),
+                                level=1)
+    assert str(quality) == "1/1: scale 0.50 factor 1.25 margin 0.50 every 3"
+    assert quality.quality == Quality(0.5, 1.25, 0.5, 3)
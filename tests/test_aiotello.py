@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from face_track.aiotello import (AsyncTello, Datagrams, LoopThread,
+                                 TelloError, parse_state)
+
+
+def test_parse_state():
+    state = parse_state(b"pitch:0;roll:-1;temph:62;bat:87;agx:-3.00;"
+                        b"mid:-1;name:tello;\r\n")
+    assert state == {
+        'pitch': 0.0, 'roll': -1.0, 'temph': 62.0, 'bat': 87.0,
+        'agx': -3.0, 'mid': -1.0, 'name': 'tello'
+    }
+    assert parse_state(b"") == {}
+    assert parse_state(b"garbage") == {}
+
+
+class FakeDrone(object):
+    """Answer the SDK commands on a local port"""
+    ANSWERS = {'command': 'ok', 'battery?': '87', 'streamon': 'error'}
+
+    def __init__(self):
+        self.received = []
+        self.transport = None
+
+    async def open(self):
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: Datagrams(self.reply), local_addr=('127.0.0.1', 0))
+        return self.transport.get_extra_info('sockname')[1]
+
+    def reply(self, data, addr):
+        command = data.decode()
+        self.received.append(command)
+        answer = FakeDrone.ANSWERS.get(command)
+        if answer is not None:
+            self.transport.sendto(answer.encode(), addr)
+
+
+async def connected():
+    drone = FakeDrone()
+    port = await drone.open()
+    tello = AsyncTello('127.0.0.1', port, state_port=0, retry_count=0)
+    await tello.connect(1.0)
+    return drone, tello
+
+
+def test_commands_and_answers():
+    async def main():
+        drone, tello = await connected()
+        assert await tello.query_battery() == 87
+        with pytest.raises(TelloError):
+            await tello.streamon()  # answered "error"
+        with pytest.raises(TelloError):
+            await tello.send_command_with_return('land', 0.2)  # no answer
+        tello.send_rc_control(0, 150, -20, 5.7)
+        await asyncio.sleep(0.05)
+        tello.close()
+        drone.transport.close()
+        return drone.received
+
+    received = asyncio.run(main())
+    assert received == ['command', 'battery?', 'streamon', 'land',
+                        'rc 0 100 -20 5']
+
+
+def test_states_keep_the_latest():
+    async def main():
+        tello = AsyncTello(state_port=0)
+        states = tello.states()
+        first = asyncio.ensure_future(states.__anext__())
+        await asyncio.sleep(0)  # subscribed
+        for bat in (80, 79, 78):
+            tello._state_received(f"bat:{bat};".encode(), ('', 0))
+        state = await first
+        assert tello.get_battery() == 78
+        await states.aclose()
+        return state, tello._states.dropped
+
+    state, dropped = asyncio.run(main())
+    assert state == {'bat': 78.0}  # the older states were replaced
+    assert dropped == 2
+
+
+def test_loop_thread_runs_coroutines():
+    thread = LoopThread()
+    thread.start()
+
+    async def answer():
+        return 42
+
+    assert thread.run(answer()).result(1.0) == 42
+    thread.stop(1.0)
+    assert not thread.worker.is_alive()
@@ -0,0 +1,50 @@
+import cv2
+import numpy as np
+
+from face_track import analyze
+from face_track.bench import synthetic_frames
+
+
+def write_video(path, count, w=320, h=240):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), 10.0,
+                             (w, h))
+    for frame in synthetic_frames(count=count, w=w, h=h):
+        writer.write(frame)
+    writer.release()
+    return str(path)
+
+
+def test_split_chunks(tmp_path):
+    a = write_video(tmp_path / 'a.avi', 25)
+    b = write_video(tmp_path / 'b.avi', 10)
+    assert analyze.split([a, b], 10) == [(0, a, 0, 10), (0, a, 10, 20),
+                                         (0, a, 20, -1), (1, b, 0, -1)]
+    assert analyze.split([a, b], 0) == [(0, a, 0, -1), (1, b, 0, -1)]
+
+
+def test_analyze_merges_chunks_in_order(tmp_path):
+    a = write_video(tmp_path / 'a.avi', 25)
+    b = write_video(tmp_path / 'b.avi', 10)
+    output = str(tmp_path / 'detections.npz')
+    columns = analyze.analyze([a, b], output, workers=2, chunk=10, w=320,
+                              h=240)
+    assert list(columns['video']) == [0] * 25 + [1] * 10
+    assert list(columns['frame']) == list(range(25)) + list(range(10))
+    assert columns['count'].sum() > 0
+    assert len(columns['boxes']) == columns['count'].sum()
+    assert list(columns['videos']) == ['a.avi', 'b.avi']
+
+    # the chunks give the same detections as one pass over each file
+    whole = analyze.analyze([a, b], str(tmp_path / 'whole.npz'), workers=1,
+                            chunk=0, w=320, h=240)
+    for key in ('video', 'frame', 'count', 'target', 'boxes'):
+        assert np.array_equal(columns[key], whole[key]), key
+
+    loaded = analyze.load(output)
+    assert np.array_equal(loaded['boxes'], columns['boxes'])
+    for i in range(len(loaded['frame'])):
+        boxes = analyze.frame_boxes(loaded, i)
+        assert len(boxes) == loaded['count'][i]
+        if loaded['target'][i] >= 0:
+            w, h = boxes[:, 2], boxes[:, 3]
+            assert loaded['target'][i] == np.argmax(w * h)
@@ -0,0 +1,45 @@
+import json
+import os
+
+import pytest
+
+bench = pytest.importorskip("face_track.bench")
+
+# the timings depend on the machine, so the regression check is opt-in:
+#   FACE_TRACK_BENCH=1 pytest tests/test_benchmark.py
+# refresh the baseline on the target machine with
+#   python -m face_track.bench hotpath --save tests/bench_baseline.json
+ENABLED = os.environ.get("FACE_TRACK_BENCH", "") not in ("", "0")
+BASELINE = os.environ.get(
+    "FACE_TRACK_BENCH_BASELINE",
+    os.path.join(os.path.dirname(__file__), "bench_baseline.json"))
+# looser than the bench default, the suite often shares the CPU
+THRESHOLD = float(os.environ.get("FACE_TRACK_BENCH_THRESHOLD", "1.0"))
+
+
+@pytest.mark.skipif(not ENABLED, reason="set FACE_TRACK_BENCH=1 to run")
+def test_hotpath_regression():
+    frames = list(bench.synthetic_frames(count=20, w=960, h=720))
+    results = bench.bench_hotpath(frames, count=50)
+    with open(BASELINE) as f:
+        baseline = json.load(f)['results']
+    assert set(baseline) == set(results)
+    for r in results.values():
+        assert 0 < r['min_us'] <= r['median_us']
+    regressions = bench.compare_baseline(BASELINE, results, THRESHOLD)
+    assert not regressions, "\n".join(regressions)
+
+
+def test_compare_baseline(tmp_path):
+    path = str(tmp_path / "baseline.json")
+    stats = {'median_us': 10.0, 'mean_us': 11.0, 'min_us': 9.0}
+    bench.save_baseline(path, {'fast': stats, 'slow': stats})
+    results = {
+        'fast': dict(stats, median_us=12.0),
+        'slow': dict(stats, median_us=20.0),
+        'new': dict(stats, median_us=99.0),  # not in the baseline
+    }
+    assert bench.compare_baseline(path, results, 0.25) == [
+        "slow 20.0 us, baseline 10.0 us (+100%)"
+    ]
+    assert bench.compare_baseline(path, results, 1.0) == []
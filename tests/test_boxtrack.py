@@ -0,0 +1,43 @@
+import numpy as np
+
+from face_track.boxtrack import PathCost, TemplateTracker
+
+
+def textured(seed, h=240, w=320):
+    return np.random.default_rng(seed).integers(0, 255, (h, w), dtype=np.uint8)
+
+
+def test_track_follows_moved_patch():
+    gray = textured(0)
+    tracker = TemplateTracker()
+    tracker.init(gray, (100, 80, 40, 40))
+    moved = np.roll(gray, (5, -7), axis=(0, 1))
+    assert tracker.track(moved) == (93, 85, 40, 40)
+    assert tracker.score > 0.99
+
+
+def test_track_lost_forces_detection():
+    tracker = TemplateTracker(min_score=0.6)
+    tracker.init(textured(0), (100, 80, 40, 40))
+    assert tracker.track(textured(1)) is None
+    # the box is gone, the next frames need a detection
+    assert tracker.box is None
+    assert tracker.track(textured(0)) is None
+
+
+def test_track_window_leaves_frame():
+    gray = textured(0, 60, 60)
+    tracker = TemplateTracker()
+    tracker.init(gray, (10, 10, 40, 40))
+    tracker.box = (50, 50, 40, 40)
+    assert tracker.track(gray) is None
+    assert tracker.template is None
+
+
+def test_path_cost():
+    cost = PathCost('detect')
+    cost.add(0.01)
+    cost.add(0.03)
+    assert cost.count == 2
+    assert cost.last == 0.03
+    assert abs(cost.mean - 0.02) < 1e-12
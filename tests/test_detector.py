@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from face_track.detector import (DETECTORS, CascadeDetector, Detector,
+                                 create_detector, load_cascade,
+                                 register_detector)
+
+
+class FixedDetector(Detector):
+    """Report one box at (40, 20, 30, 30) of the image it is given"""
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls = []
+
+    def detectFaces(self, image, minSize, maxSize):
+        self.calls.append((image.shape, minSize, maxSize))
+        return [(40, 20, 30, 30)]
+
+
+def test_detect_full_scale():
+    det = FixedDetector()
+    image = np.zeros((480, 640), np.uint8)
+    assert det.detect(image, (20, 20), (200, 200)) == [(40, 20, 30, 30)]
+    assert det.calls == [((480, 640), (20, 20), (200, 200))]
+
+
+def test_detect_scale_maps_boxes_back():
+    det = FixedDetector()
+    image = np.zeros((480, 640), np.uint8)
+    assert det.detect(image, (20, 20), (200, 200),
+                      scale=0.5) == [(80, 40, 60, 60)]
+    assert det.calls == [((240, 320), (10, 10), (100, 100))]
+
+
+def test_detect_scale_keeps_min_size_positive():
+    det = FixedDetector()
+    det.detect(np.zeros((480, 640), np.uint8), (1, 1), (200, 200), scale=0.25)
+    assert det.calls[0][1] == (1, 1)
+
+
+def test_registry_creates_by_name():
+    assert {'haar', 'lbp', 'dnn', 'mediapipe'} <= set(DETECTORS)
+    det = create_detector('haar', scaleFactor=1.2)
+    assert isinstance(det, CascadeDetector)
+    assert det.scaleFactor == 1.2
+    assert not det.loaded  # loaded on first use
+
+
+def test_registry_unknown_name():
+    with pytest.raises(ValueError, match="unknown face detector"):
+        create_detector('nope')
+
+
+def test_register_detector():
+    register_detector('fixed-test')(FixedDetector)
+    try:
+        assert isinstance(create_detector('fixed-test'), FixedDetector)
+    finally:
+        del DETECTORS['fixed-test']
+
+
+def test_load_cascade_cached():
+    det = create_detector('haar')
+    assert load_cascade(det.path) is load_cascade(det.path)
+    with pytest.raises(FileNotFoundError):
+        load_cascade('/nonexistent/cascade.xml')
@@ -0,0 +1,53 @@
+import threading
+
+import numpy as np
+import pytest
+
+from face_track.framebuf import FrameRing
+
+
+def publish(ring, value):
+    ring.acquire()[:] = value
+    return ring.publish()
+
+
+def test_ring_reuses_buffers_in_turn():
+    ring = FrameRing(3, (2, 2))
+    assert ring.latest() is None
+    seqs = [publish(ring, i) for i in range(4)]
+    assert seqs == [0, 1, 2, 3]
+    assert ring.get(0) is None  # overwritten by frame 3
+    assert ring.get(4) is None and ring.get(-1) is None
+    assert ring.get(1)[0, 0] == 1
+    assert ring.latest()[0, 0] == 3
+    assert ring.latest().base is ring.buffers[0]
+    with pytest.raises(ValueError):
+        ring.latest()[0, 0] = 0  # the views are read-only
+    assert ring.matches(np.zeros((2, 2), np.uint8))
+    assert not ring.matches(np.zeros((2, 2), np.float32))
+
+
+def test_acquire_waits_for_a_held_frame():
+    ring = FrameRing(2, (2, 2))
+    first = publish(ring, 1)
+    assert ring.hold(first)
+    assert ring.hold(first)  # a second holder
+    publish(ring, 2)
+    assert ring.acquire(0.01) is None  # the slot of the first frame is held
+    ring.release(first)
+    assert ring.acquire(0.01) is None
+    timer = threading.Timer(0.05, ring.release, (first, ))
+    timer.start()
+    assert ring.acquire(2.0) is ring.buffers[0]
+    timer.join()
+    assert ring.get(first)[0, 0] == 1  # not overwritten while held
+
+
+def test_hold_overwritten_frame():
+    ring = FrameRing(2, (2, 2))
+    for i in range(3):
+        publish(ring, i)
+    assert not ring.hold(0)
+    assert not ring.hold(5)
+    ring.release(0)  # ignored
+    assert ring.holds == [0, 0]
@@ -0,0 +1,124 @@
+import subprocess
+import sys
+import textwrap
+
+import numpy as np
+import pytest
+
+from face_track.framebus import FrameBus, FrameBusReader
+
+
+@pytest.fixture
+def bus():
+    bus = FrameBus((24, 32, 3), slots=2, max_faces=2)
+    yield bus
+    bus.close()
+
+
+def test_publish_and_read(bus):
+    reader = FrameBusReader(bus.name)
+    assert reader.read() is None
+    assert reader.wait(timeout=0.01) is None
+    frame = np.full((24, 32, 3), 7, np.uint8)
+    faces = [(1, 2, 3, 4), (5, 6, 7, 8), (9, 9, 9, 9)]
+    assert bus.publish(frame, 1.5, faces) == 0
+    seq, timestamp, got_faces, got = reader.wait(-1, 1.0)
+    assert (seq, timestamp) == (0, 1.5)
+    assert got_faces.tolist() == [[1, 2, 3, 4], [5, 6, 7, 8]]
+    assert np.array_equal(got, frame)
+    assert reader.read(1) is None  # not published yet
+    reader.close()
+
+
+def test_overwritten_frame(bus):
+    reader = FrameBusReader(bus.name)
+    for value in range(3):
+        bus.publish(np.full((24, 32, 3), value, np.uint8))
+    assert reader.seq == 2
+    assert reader.read(0) is None  # slot 0 holds frame 2 now
+    out = np.empty((24, 32, 3), np.uint8)
+    seq, _, faces, frame = reader.read(1, out)
+    assert seq == 1 and frame is out and int(frame[0, 0, 0]) == 1
+    assert len(faces) == 0
+    assert reader.torn == 0
+    reader.close()
+
+
+def test_resize(bus):
+    reader = FrameBusReader(bus.name)
+    frame = np.full((48, 64, 3), 9, np.uint8)
+    bus.publish(frame)
+    _, _, _, got = reader.read()
+    assert got.shape == (24, 32, 3)
+    assert np.all(got == 9)
+    reader.close()
+
+
+def test_not_a_frame_bus():
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(create=True, size=4096)
+    try:
+        with pytest.raises(ValueError):
+            FrameBusReader(shm.name)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+SCRIPT = """
+import numpy as np
+from face_track.framebus import FrameBus, FrameBusReader
+
+bus = FrameBus((8, 8, 3))
+reader = FrameBusReader(bus.name)  # in the producer process
+bus.publish(np.zeros((8, 8, 3), np.uint8))
+assert reader.read()[0] == 0
+reader.close()
+bus.close()
+"""
+
+READER = """
+import sys
+from face_track.framebus import FrameBusReader
+
+reader = FrameBusReader(sys.argv[1])  # a process of its own
+print(reader.read()[0])
+reader.close()
+"""
+
+
+def test_reader_in_the_producer_process():
+    result = subprocess.run([sys.executable, '-c', textwrap.dedent(SCRIPT)],
+                            capture_output=True,
+                            text=True,
+                            timeout=30)
+    assert result.returncode == 0, result.stderr
+    assert 'KeyError' not in result.stderr
+    assert 'leaked' not in result.stderr
+
+
+def test_reader_in_another_process(bus):
+    bus.publish(np.zeros((24, 32, 3), np.uint8))
+    bus.publish(np.zeros((24, 32, 3), np.uint8))
+    result = subprocess.run([sys.executable, '-c', READER, bus.name],
+                            capture_output=True,
+                            text=True,
+                            timeout=30)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == '1'
+    assert 'leaked' not in result.stderr
+    # the segment outlives the reader process
+    reader = FrameBusReader(bus.name)
+    assert reader.seq == 1
+    reader.close()
+
+
+def test_tracker_imports_the_bus_on_use():
+    # multiprocessing.shared_memory needs Python 3.8
+    code = ("import sys, face_track.__main__; "
+            "assert 'face_track.framebus' not in sys.modules")
+    result = subprocess.run([sys.executable, '-c', code],
+                            capture_output=True,
+                            text=True,
+                            timeout=30)
+    assert result.returncode == 0, result.stderr
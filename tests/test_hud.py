@@ -0,0 +1,64 @@
+import cv2
+import numpy as np
+import pytest
+
+from face_track.hud import Hud
+
+
+def test_compose_matches_put_text():
+    hud = Hud(200, 100)
+    hud.add('fps', (5, 20), font=cv2.FONT_HERSHEY_SIMPLEX, scale=0.6,
+            thickness=2)
+    hud.add('bat', (150, 95))  # clipped at the frame border
+    hud.set('fps', 'FPS: 30', (0, 255, 0))
+    hud.set('bat', 'BAT 80%', (0, 0, 255))
+    img = np.full((100, 200, 3), 40, dtype=np.uint8)
+    expected = img.copy()
+    cv2.putText(expected, 'FPS: 30', (5, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6,
+                (0, 255, 0), 2)
+    cv2.putText(expected, 'BAT 80%', (150, 95), cv2.FONT_HERSHEY_PLAIN, 1.0,
+                (0, 0, 255), 1)
+    hud.compose(img)
+    assert np.array_equal(img, expected)
+
+
+def test_rasterize_only_on_change():
+    hud = Hud(200, 100)
+    widget = hud.add('pid', (5, 50))
+    assert hud.set('pid', 'yaw 1', (255, 255, 255))
+    assert not hud.set('pid', 'yaw 1', (255, 255, 255))
+    assert widget.raster_count == 1
+    hud.compose(np.zeros((100, 200, 3), dtype=np.uint8))
+    assert not hud.dirty
+    assert hud.set('pid', 'yaw 1', (0, 0, 255))
+    assert hud.set('pid', 'yaw 2', (0, 0, 255))
+    assert widget.raster_count == 3
+    assert hud.dirty
+
+
+def test_compose_follows_text_changes():
+    hud = Hud(100, 40)
+    hud.add('t', (2, 30))
+    hud.set('t', 'X', (255, 255, 255))
+    hud.compose(np.zeros((40, 100, 3), dtype=np.uint8))
+    hud.set('t', '-', (255, 255, 255))
+    img = np.zeros((40, 100, 3), dtype=np.uint8)
+    hud.compose(img)
+    expected = np.zeros_like(img)
+    cv2.putText(expected, '-', (2, 30), cv2.FONT_HERSHEY_PLAIN, 1.0,
+                (255, 255, 255), 1)
+    assert np.array_equal(img, expected)
+
+
+def test_compose_without_widgets():
+    img = np.full((40, 100, 3), 7, dtype=np.uint8)
+    Hud(100, 40).compose(img)
+    assert (img == 7).all()
+
+
+def test_compose_rejects_other_frames():
+    hud = Hud(100, 40)
+    with pytest.raises(ValueError):
+        hud.compose(np.zeros((40, 50, 3), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        hud.compose(np.zeros((40, 200, 3), dtype=np.uint8)[:, ::2])
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from face_track.pid import PIDBank
+
+
+def test_proportional_output_is_limited_per_axis():
+    bank = PIDBank(('fb', 'ud'), kP=1.0, SP=(100, 100), limit=(30, 20))
+    bank.reset(0.0)
+    assert list(bank.update((90, 150), 0.1)) == [10.0, -20.0]
+    assert list(bank.cP) == [10.0, -50.0]
+
+
+def test_update_returns_floats():
+    bank = PIDBank(('yaw', 'fb'), kP=1.0, SP=(10.0, 5.0))
+    bank.reset(0.0)
+    v = bank.update(np.zeros(2), 0.1)
+    assert v == (10.0, 5.0)
+    assert all(type(x) is float for x in v)
+    cV = bank.cV
+    cV[0] = 99.0
+    assert bank.cV[0] == 10.0
+
+
+def test_integral_is_clamped():
+    bank = PIDBank(('ud', ), kI=1.0, SP=(10.0, ), limit=100.0, i_limit=3.0)
+    bank.reset(0.0)
+    assert bank.update(0.0, 0.1)[0] == pytest.approx(1.0)
+    for k in range(2, 10):
+        bank.update(0.0, 0.1 * k)
+    assert bank.cI[0] == 3.0
+    assert bank.update(20.0, 1.0)[0] == pytest.approx(2.0)
+
+
+def test_lost_time_caps_the_step():
+    bank = PIDBank(('ud', ), kI=1.0, SP=(10.0, ))
+    bank.reset(0.0)
+    bank.update(0.0, 5.0)
+    assert bank.cI[0] == pytest.approx(10.0 * PIDBank.LOST_TIME)
+
+
+def test_back_calculation_bleeds_the_integral_towards_zero():
+    bank = PIDBank(('fb', ), kP=1.0, kI=1.0, SP=(0.0, ), limit=5.0,
+                   i_limit=100.0, kAW=10.0)
+    bank.reset(0.0)
+    for k in range(1, 11):
+        bank.update(-2.0, 0.1 * k)  # error 2, not saturated
+    wound = bank.cI[0]
+    assert wound == pytest.approx(2.0)
+    v = bank.update(-20.0, 1.1)  # error 20, saturated at 5
+    assert v[0] == 5.0
+    # the integral grew by 2 and bled by (5 - 24) * 10 * 0.1, down to 0
+    assert bank.cI[0] == 0.0
+    bank.update(-20.0, 1.2)
+    assert bank.cI[0] == 0.0  # not beyond zero
+
+
+def test_derivative_filter():
+    raw = PIDBank(('yaw', ), kD=1.0, SP=(0.0, ), tau=0.0)
+    raw.reset(0.0)
+    assert raw.update(0.0, 0.1)[0] == 0.0  # no previous error yet
+    assert raw.update(-1.0, 0.2)[0] == pytest.approx(10.0)
+    filtered = PIDBank(('yaw', ), kD=1.0, SP=(0.0, ), tau=0.1)
+    filtered.reset(0.0)
+    filtered.update(0.0, 0.1)
+    assert filtered.update(-1.0, 0.2)[0] == pytest.approx(5.0)
+
+
+def test_scalar_and_batch_updates_agree():
+    params = dict(kP=(0.2, 0.5, 0.4, 0.3), kI=(0.0, 0.05, 0.02, 0.01),
+                  kD=(0.1, 0.2, 0.0, 0.1), SP=(0, 120, 240, 320),
+                  limit=(0, 30, 20, 30), i_limit=(5, 10, 10, 10))
+    small = PIDBank(('lr', 'fb', 'ud', 'yaw'), **params)
+    batch = PIDBank(**{k: np.tile(v, (3, 1)) for k, v in params.items()})
+    assert small.batch == () and batch.batch == (3, )
+    small.reset(0.0)
+    batch.reset(0.0)
+    rng = np.random.default_rng(0)
+    for k in range(1, 200):
+        pv = rng.uniform(0, 400, 4)
+        t = k * rng.uniform(0.02, 0.05)
+        v = small.update(pv, t)
+        vs = batch.update(np.tile(pv, (3, 1)), t)
+        for row in vs:
+            np.testing.assert_allclose(row, v, rtol=1e-12, atol=1e-12)
+    for name in ('cP', 'cI', 'cD', 'cV'):
+        np.testing.assert_allclose(getattr(batch, name)[1],
+                                   getattr(small, name), rtol=1e-12,
+                                   atol=1e-12)
+
+
+def test_assigned_parameters_take_effect():
+    bank = PIDBank(('lr', 'fb'), kP=1.0, SP=(10.0, 20.0))
+    bank.reset(0.0)
+    assert list(bank.update((0.0, 0.0), 0.1)) == [10.0, 20.0]
+    with pytest.raises(ValueError):
+        bank.kP[0] = 2.0  # read-only, assign the parameter instead
+    bank.kP = (2.0, 0.5)
+    bank.SP = 0.0
+    assert list(bank.SP) == [0.0, 0.0]
+    assert list(bank.update((-1.0, -4.0), 0.2)) == [2.0, 2.0]
+
+
+def test_zero_dimensional_bank():
+    bank = PIDBank(kP=2.0, SP=1.0)
+    bank.reset(0.0)
+    assert bank.update(0.0, 0.1) == 2.0
+    assert bank.cV.shape == ()
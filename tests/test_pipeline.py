@@ -0,0 +1,129 @@
+import threading
+import time
+
+from face_track.framebuf import FrameRing
+from face_track.pipeline import LatestQueue, Pipeline
+from face_track.trace import Tracer
+
+
+def test_latest_queue_keeps_newest():
+    q = LatestQueue('test')
+    for i in range(3):
+        q.put(i)
+    assert q.get(0) == 2
+    assert q.put_count == 3
+    assert q.drop_count == 2
+    assert q.get(0) is None
+
+
+def test_latest_queue_maxsize_drops_oldest():
+    q = LatestQueue('test', maxsize=2)
+    for i in range(4):
+        q.put(i)
+    assert [q.get(0), q.get(0)] == [2, 3]
+    assert q.drop_count == 2
+
+
+def test_latest_queue_close_wakes_consumer():
+    q = LatestQueue('test')
+    result = []
+    consumer = threading.Thread(target=lambda: result.append(q.get()))
+    consumer.start()
+    q.close()
+    consumer.join(1.0)
+    assert not consumer.is_alive()
+    assert result == [None]
+
+
+def test_latest_queue_reports_dropped_items():
+    dropped = []
+    q = LatestQueue('test', maxsize=2, on_drop=dropped.append)
+    for i in range(5):
+        q.put(i)
+    assert dropped == [0, 1, 2]
+    assert [q.get(0), q.get(0)] == [3, 4]
+
+
+class StubTracker(object):
+    """The FaceTracker calls of the pipeline stages, on frames filled with
+    their number"""
+    def __init__(self, slots):
+        self.frames = FrameRing(slots, (8, 8, 3))
+        self.frame_time = 0.0
+        self.count = 0
+        self.rendered = []
+        self.torn = 0
+        self.tracer = Tracer(enabled=True)
+
+    def readFrame(self, timeout):
+        dst = self.frames.acquire(timeout)
+        if dst is None:
+            return None
+        self.count += 1
+        dst[:] = self.count % 256
+        self.frames.publish()
+        self.frame_time = time.monotonic()
+        return dst
+
+    def findFace(self, img):
+        value = int(img[0, 0, 0])
+        time.sleep(0.002)  # capture goes on meanwhile
+        if (img != value).any():
+            self.torn += 1
+        img[0, 0, 1] = 255 - value  # an annotation
+        return img, [[0, 0], 0]
+
+    def pickFace(self, img, faces):
+        return img, [[0, 0], 0]
+
+    def trackFace(self, info, capture_time):
+        pass
+
+    def putHud(self, img):
+        time.sleep(0.002)
+        if img[0, 0, 1] != 255 - img[0, 0, 0]:
+            self.torn += 1  # not the frame annotated by findFace
+
+    def setAnnotatedImage(self, img):
+        self.rendered.append(int(img[0, 0, 0]))
+
+
+def test_pipeline_does_not_overwrite_frames_in_use():
+    tracker = StubTracker(slots=4)
+    p = Pipeline(tracker, display=False)
+    end = time.monotonic() + 0.5
+    p.run(lambda: time.monotonic() < end)
+    assert len(tracker.rendered) > 10
+    assert tracker.torn == 0
+
+
+def test_headless_render_traces_the_hud():
+    tracker = StubTracker(slots=4)
+    p = Pipeline(tracker, display=False)
+    end = time.monotonic() + 0.2
+    p.run(lambda: time.monotonic() < end)
+    assert len(tracker.tracer.durations()['hud']) == len(tracker.rendered)
+
+
+class StalePool(object):
+    """A DetectorPool returning a result for a frame already released"""
+    def __init__(self, results):
+        self.results = list(results)
+
+    def get(self, timeout):
+        return self.results.pop(0) if self.results else None
+
+
+def test_pipeline_skips_stale_pool_results():
+    tracker = StubTracker(slots=4)
+    p = Pipeline(tracker, pool=StalePool([(2, []), (1, [])]), display=False)
+    for seq in (1, 2):
+        img = tracker.readFrame(0)
+        frame = tracker.frames.seq
+        tracker.frames.hold(frame)
+        p.inflight[seq] = (frame, tracker.frame_time, img)
+    p.detectPool()  # frame 1 is released, its result comes late
+    p.detectPool()
+    assert p.inflight == {}
+    assert p.control_q.put_count == 1
+    assert p.render_q.put_count == 1
@@ -0,0 +1,40 @@
+import time
+
+import numpy as np
+import pytest
+
+from face_track.pool import DetectorPool
+
+
+def frame():
+    return np.zeros((120, 160, 3), np.uint8)
+
+
+def test_worker_load_error_is_raised(monkeypatch, tmp_path):
+    # the workers look for the DNN model files in an empty directory
+    monkeypatch.setenv('FACE_TRACK_MODELS', str(tmp_path))
+    start = time.monotonic()
+    with pytest.raises(FileNotFoundError):
+        DetectorPool(2, 'dnn')
+    assert time.monotonic() - start < DetectorPool.READY_TIMEOUT
+
+
+def test_ordered_returns_every_frame_in_order():
+    with DetectorPool(2, 'haar', ordered=True) as pool:
+        seqs = [pool.submit(frame()) for _ in range(6)]
+        results = [pool.get(10.0) for _ in seqs]
+    assert seqs == list(range(6))
+    assert [seq for seq, _ in results] == seqs
+    assert all(faces == [] for _, faces in results)
+
+
+def test_latest_wins_limits_frames_in_flight():
+    with DetectorPool(2, 'haar', ordered=False) as pool:
+        seqs = [pool.submit(frame()) for _ in range(5)]
+        assert seqs == [0, 1, None, None, None]
+        assert pool.drop_count == 3
+        assert pool.inflight == 2
+        while pool.inflight:
+            pool.get(10.0)
+        # a worker is free again, the next frame is taken
+        assert pool.submit(frame()) == 2
@@ -0,0 +1,90 @@
+import threading
+import urllib.request
+
+import cv2
+import numpy as np
+
+from face_track.preview import PAGE, PreviewServer
+
+
+def serve(**kwargs):
+    preview = PreviewServer(port=0, **kwargs)
+    preview.start()
+    host, port = preview.httpd.server_address[:2]
+    return preview, f"http://{host}:{port}"
+
+
+def test_submit_is_idle_without_clients():
+    preview = PreviewServer(port=0)
+    frame = np.zeros((24, 32, 3), np.uint8)
+    for _ in range(3):
+        preview.submit(frame)
+    assert preview.stats == {'frames': 3, 'encoded': 0, 'idle': 3}
+    assert preview._frame is None
+
+
+def test_submit_copies_when_due():
+    preview = PreviewServer(port=0, fps=1.0)
+    preview.clients = 1
+    frame = np.zeros((24, 32, 3), np.uint8)
+    preview.submit(frame)
+    assert preview._frame is not frame
+    assert np.array_equal(preview._frame, frame)
+    preview._frame = None
+    preview.submit(frame)  # the next preview frame is due in 1 s
+    assert preview._frame is None
+    assert preview.stats['idle'] == 0
+
+
+def test_page():
+    preview, url = serve()
+    try:
+        with urllib.request.urlopen(url + '/', timeout=5) as response:
+            assert response.read() == PAGE
+    finally:
+        preview.stop()
+
+
+def test_mjpeg_stream():
+    preview, url = serve(fps=100.0)
+    frame = np.full((24, 32, 3), 128, np.uint8)
+    done = threading.Event()
+
+    def frames():
+        while not done.is_set():
+            preview.submit(frame)
+            done.wait(0.01)
+
+    feeder = threading.Thread(target=frames, daemon=True)
+    feeder.start()
+    try:
+        with urllib.request.urlopen(url + '/stream', timeout=5) as response:
+            assert response.headers['Content-Type'].startswith(
+                'multipart/x-mixed-replace')
+            assert response.readline() == b"--frame\r\n"
+            assert response.readline() == b"Content-Type: image/jpeg\r\n"
+            length = int(response.readline().split(b':')[1])
+            assert response.readline() == b"\r\n"
+            jpeg = response.read(length)
+        img = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+        assert img.shape == frame.shape
+        assert abs(int(img.mean()) - 128) <= 2
+    finally:
+        done.set()
+        feeder.join()
+        preview.stop()
+    assert preview.stats['encoded'] >= 1
+    assert not preview.encoder.is_alive()
+
+
+def test_post_stop_calls_on_stop():
+    stopped = threading.Event()
+    preview, url = serve(on_stop=stopped.set)
+    try:
+        request = urllib.request.Request(url + '/stop', data=b'', method='POST')
+        with urllib.request.urlopen(request, timeout=5) as response:
+            assert response.read() == b"stopping\n"
+        # on_stop is called after the response is sent
+        assert stopped.wait(5)
+    finally:
+        preview.stop()
@@ -0,0 +1,69 @@
+import pstats
+import threading
+import time
+
+import pytest
+
+from face_track.profiler import HOTPATH, Profile, hotpath, hotpath_report
+
+
+@hotpath
+def _hot(x):
+    if x < 0:
+        raise ValueError(x)
+    return 2 * x
+
+
+def test_hotpath_counts_calls_and_errors():
+    counter = HOTPATH[_hot.__qualname__]
+    calls = counter.calls
+    assert _hot(2) == 4
+    with pytest.raises(ValueError):
+        _hot(-1)
+    assert counter.calls == calls + 2
+    assert counter.total > 0
+    assert _hot.__name__ == '_hot'
+    assert '_hot' in hotpath_report()
+
+
+def test_profile_keep_running():
+    assert Profile('sample', frames=3).keep_running(2)
+    assert not Profile('sample', frames=3).keep_running(3)
+    assert Profile('sample', frames=0).keep_running(10 ** 6)
+    with pytest.raises(ValueError):
+        Profile('perf')
+
+
+def _spin(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_sampling_profile(tmp_path):
+    path = str(tmp_path / 'profile.folded')
+    profile = Profile('sample', path=path)
+    stop = threading.Event()
+    worker = threading.Thread(target=_spin, args=(stop, ), name='spinner')
+    worker.start()
+    profile.start()
+    time.sleep(0.2)
+    out, summary = profile.stop()
+    stop.set()
+    worker.join()
+    assert out == path and 'samples' in summary
+    lines = open(path).read().splitlines()
+    spinner = [line for line in lines if line.startswith('spinner;')]
+    assert spinner and any('_spin (test_profiler.py' in line
+                           for line in spinner)
+    assert int(spinner[0].rsplit(' ', 1)[1]) > 0
+
+
+def test_cprofile(tmp_path):
+    path = str(tmp_path / 'profile.prof')
+    profile = Profile('cprofile', path=path)
+    profile.start()
+    _hot(1)
+    out, report = profile.stop()
+    assert out == path
+    assert '_hot' in report
+    assert pstats.Stats(path).total_calls > 0
@@ -0,0 +1,55 @@
+import time
+
+from face_track.rc import RCSender
+
+
+class FakeDrone(object):
+    def __init__(self):
+        self.sent = []
+
+    def send_rc_control(self, lr, fb, ud, yaw):
+        self.sent.append((lr, fb, ud, yaw))
+
+
+def test_latest_setpoint_wins():
+    drone = FakeDrone()
+    rc = RCSender(drone)
+    rc.set(1, 2, 3, 4)
+    rc.set(5, 6, 7, 8, capture_time=9.5)
+    assert rc.tick(10.0)
+    assert drone.sent == [(5, 6, 7, 8)]
+    assert rc.stats == {'set': 2, 'sent': 1, 'skipped': 0, 'dropped': 1}
+    assert list(rc.latencies) == [0.5]
+
+
+def test_duplicates_are_skipped_until_keepalive():
+    drone = FakeDrone()
+    rc = RCSender(drone, keepalive=1.0)
+    rc.set(0, 10, 0, 0)
+    assert rc.tick(10.0)
+    rc.set(0, 10, 0, 0)
+    assert not rc.tick(10.5)  # identical packet
+    assert not rc.tick(10.9)  # no new setpoint, still the same command
+    assert rc.tick(11.0)  # keepalive
+    rc.set(0, 11, 0, 0)
+    assert rc.tick(11.1)
+    assert drone.sent == [(0, 10, 0, 0), (0, 10, 0, 0), (0, 11, 0, 0)]
+    assert rc.stats['skipped'] == 2
+
+
+def test_rate_is_capped():
+    assert RCSender(FakeDrone(), rate=500.0, max_rate=100.0).rate == 100.0
+
+
+def test_stop_sends_hover_once():
+    drone = FakeDrone()
+    rc = RCSender(drone, rate=100.0)
+    rc.set(0, 20, 0, 0)
+    rc.start()
+    time.sleep(0.1)
+    rc.stop()
+    rc.stop()
+    assert not rc.worker.is_alive()
+    assert drone.sent[0] == (0, 20, 0, 0)
+    assert drone.sent[-1] == (0, 0, 0, 0)
+    assert drone.sent.count((0, 0, 0, 0)) == 1
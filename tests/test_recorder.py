@@ -0,0 +1,68 @@
+import queue
+
+import cv2
+import numpy as np
+
+from face_track.recorder import VideoRecorder
+
+
+def frame(value, w=64, h=48):
+    return np.full((h, w, 3), value, dtype=np.uint8)
+
+
+def test_first_frame_of_each_slot_is_sent():
+    recorder = VideoRecorder('unused.avi', 8, 8, fps=10.0, maxsize=2)
+    for ts in (0.0, 0.04, 0.09, 0.1, 0.35, 0.36):
+        recorder.write(frame(int(ts * 100), 8, 8), ts)
+    # slots 0, 1 and 3, the third is dropped as the queue is full
+    assert recorder.slot == 3
+    assert recorder.stats == {
+        'frames': 6, 'sent': 2, 'skipped': 3, 'dropped': 1
+    }
+    assert recorder.inq.get(timeout=1.0)[0] == 0
+    assert recorder.inq.get(timeout=1.0)[0] == 1
+    recorder.stop()
+
+
+def test_frame_is_copied_when_sent():
+    recorder = VideoRecorder('unused.avi', 8, 8, fps=10.0)
+    img = frame(1, 8, 8)
+    recorder.write(img, 0.0)
+    img[:] = 2  # the caller reuses its buffer
+    slot, sent = recorder.inq.get(timeout=1.0)
+    assert slot == 0 and (sent == 1).all()
+    recorder.stop()
+
+
+def test_missing_slots_repeat_the_previous_frame(tmp_path):
+    path = str(tmp_path / 'vid.avi')
+    recorder = VideoRecorder(path, 64, 48, fps=10.0, fourcc='MJPG')
+    recorder.start()
+    for i, ts in enumerate((0.0, 0.12, 0.15, 0.41)):
+        recorder.write(frame(50 * (i + 1)), ts)
+    stats = recorder.stop()
+    assert stats['sent'] == 3 and stats['skipped'] == 1
+    assert stats['written'] == 5 and stats['duplicated'] == 2
+    cap = cv2.VideoCapture(path)
+    values = []
+    while True:
+        ok, img = cap.read()
+        if not ok:
+            break
+        values.append(int(round(img.mean() / 50)))
+    cap.release()
+    assert values == [1, 2, 2, 2, 4]
+
+
+class FullQueue(object):
+    def put(self, item, timeout=None):
+        raise queue.Full
+
+
+def test_stop_does_not_raise_when_the_queue_stays_full(tmp_path):
+    recorder = VideoRecorder(str(tmp_path / 'vid.avi'), 64, 48)
+    recorder.start()
+    recorder.inq = FullQueue()  # an encoder which stopped reading
+    recorder.stop(timeout=0.1)
+    recorder.process.join(5.0)  # terminated
+    assert not recorder.process.is_alive()
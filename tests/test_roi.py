@@ -0,0 +1,44 @@
+from face_track.roi import RoiSearch
+
+
+def test_full_scan_without_face():
+    roi = RoiSearch()
+    assert roi.window(640, 480) is None
+
+
+def test_window_around_last_face():
+    roi = RoiSearch(margin=1.0)
+    roi.update((300, 200, 40, 40), full=True)
+    assert roi.window(640, 480) == (260, 160, 380, 280)
+    assert roi.sizes((20, 20), (200, 200)) == ((28, 28), (56, 56))
+
+
+def test_window_clipped_to_frame():
+    roi = RoiSearch(margin=1.0)
+    roi.update((0, 0, 40, 40), full=True)
+    assert roi.window(640, 480) == (0, 0, 80, 80)
+
+
+def test_full_scan_after_misses():
+    roi = RoiSearch(max_misses=3, full_scan_every=0)
+    roi.update((300, 200, 40, 40), full=True)
+    for _ in range(2):
+        roi.update(None, full=False)
+        assert roi.window(640, 480) is not None
+    roi.update(None, full=False)
+    assert roi.window(640, 480) is None
+    roi.update(None, full=True)
+    assert roi.box is None
+
+
+def test_full_scan_schedule():
+    roi = RoiSearch(full_scan_every=5)
+    roi.update((300, 200, 40, 40), full=True)
+    windows = []
+    for _ in range(10):
+        window = roi.window(640, 480)
+        windows.append(window is None)
+        roi.update((300, 200, 40, 40), full=window is None)
+    assert windows == [False] * 5 + [True] + [False] * 4
+    assert roi.full_count == 2
+    assert roi.roi_count == 9
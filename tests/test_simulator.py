@@ -0,0 +1,66 @@
+import asyncio
+
+from face_track.aiotello import AsyncTello
+from face_track.simulator import Link, TelloSimulator, split_frames
+
+SPS = b'\x00\x00\x00\x01\x67sps'
+PPS = b'\x00\x00\x00\x01\x68pps'
+IDR = b'\x00\x00\x01\x65idr'
+SLICE = b'\x00\x00\x01\x41p'
+
+
+def test_split_frames_keeps_parameter_sets_with_the_slice():
+    frames = split_frames(SPS + PPS + IDR + SLICE + SLICE)
+    assert frames == [SPS + PPS + IDR, SLICE, SLICE]
+    # no frame without a slice
+    assert split_frames(SPS + PPS) == []
+    # the first zero of a 4 byte start code ends the frame before, a
+    # trailing zero a decoder ignores
+    assert split_frames(IDR + SPS + PPS) == [IDR + b'\x00']
+
+
+def test_link():
+    assert not any(Link().lost() for _ in range(100))
+    assert all(Link(loss=1.0).lost() for _ in range(100))
+    link = Link(latency=0.02, jitter=0.01, seed=1)
+    delays = [link.delay() for _ in range(100)]
+    assert all(0.02 <= d <= 0.03 for d in delays)
+    assert delays == [Link(0.02, 0.01, seed=1).delay()] + delays[1:]
+
+
+def test_flight_model():
+    sim = TelloSimulator()
+    sim.update(1.0)
+    assert sim.battery == 100.0  # on the ground
+    sim.flying, sim.h, sim.rc = True, 80.0, (0, 0, 20, 90)
+    sim.update(0.5)
+    assert sim.h == 90.0
+    assert sim.yaw == 45.0
+    assert sim.battery < 100.0
+    assert b'h:90;' in sim.state() and b'vgz:-20;' in sim.state()
+
+
+def test_protocol_over_udp():
+    async def main():
+        sim = TelloSimulator(port=0, takeoff_time=0.05)
+        serving = asyncio.ensure_future(sim.serve())
+        while sim.transport is None:
+            await asyncio.sleep(0.01)
+        port = sim.transport.get_extra_info('sockname')[1]
+        tello = AsyncTello('127.0.0.1', port, state_port=0, retry_count=0)
+        await tello.connect(1.0)
+        answers = [
+            await tello.send_command_with_return(c, 1.0)
+            for c in ('height?', 'up 20', 'takeoff', 'height?', 'bogus')
+        ]
+        tello.send_rc_control(0, 10, 0, -5)
+        await asyncio.sleep(0.05)
+        tello.close()
+        serving.cancel()
+        return sim, answers
+
+    sim, answers = asyncio.run(main())
+    assert answers == ['0dm', 'error Not flying', 'ok', '8dm',
+                       'unknown command: bogus']
+    assert sim.rc == (0, 10, 0, -5)
+    assert sim.stats['rc'] == 1 and sim.stats['responses'] == 6
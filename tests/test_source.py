@@ -0,0 +1,189 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from face_track.source import (ArraySource, FrameReader, FrameSource,
+                               ImageDirSource, Pacer, TelloSource,
+                               open_source)
+
+
+def solid_frames(count, w=32, h=24):
+    return [np.full((h, w, 3), i, np.uint8) for i in range(count)]
+
+
+def test_image_dir_name_order_and_rewind(tmp_path):
+    for name, value in (('b.png', 2), ('a.png', 1), ('c.jpg', 3)):
+        cv2.imwrite(str(tmp_path / name), np.full((8, 8, 3), value, np.uint8))
+    (tmp_path / 'notes.txt').write_text('not an image')
+    source = open_source(str(tmp_path), fps=10.0)
+    assert isinstance(source, ImageDirSource)
+    values, stamps = [], []
+    while True:
+        ok, frame, ts = source.read()
+        if not ok:
+            break
+        values.append(int(frame[0, 0, 0]))
+        stamps.append(ts)
+    assert values == [1, 2, 3]
+    assert stamps == pytest.approx([0.0, 0.1, 0.2])
+    assert source.rewind()
+    assert int(source.read()[1][0, 0, 0]) == 1
+
+
+def test_image_dir_without_images(tmp_path):
+    with pytest.raises(IOError):
+        ImageDirSource(str(tmp_path))
+
+
+def test_array_source_end():
+    source = ArraySource(solid_frames(2), fps=20.0)
+    assert source.read()[2] == 0.0
+    ok, frame, ts = source.read()
+    assert ok and frame[0, 0, 0] == 1 and ts == pytest.approx(0.05)
+    assert not source.read()[0]
+    assert open_source(source) is source
+
+
+def test_pacer_unknown_pacing():
+    with pytest.raises(ValueError):
+        Pacer('slow')
+
+
+def test_pacer_fixed_rate():
+    pacer = Pacer('fixed', fps=50.0)
+    start = time.monotonic()
+    for ts in range(6):
+        pacer.wait(ts)  # the timestamps do not matter at a fixed rate
+    assert time.monotonic() - start == pytest.approx(0.1, abs=0.05)
+
+
+def test_pacer_none_does_not_wait():
+    pacer = Pacer('none')
+    start = time.monotonic()
+    pacer.wait(0.0)
+    pacer.wait(10.0)
+    assert time.monotonic() - start < 0.05
+
+
+def test_reader_reads_to_the_end():
+    reader = FrameReader(ArraySource(solid_frames(5)), pacing='none')
+    assert int(reader.frame[0, 0, 0]) == 0
+    reader.start()
+    reader.worker.join(5.0)
+    assert not reader.worker.is_alive()
+    assert not reader.grabbed
+    assert reader.count == 5
+    assert int(reader.frame[0, 0, 0]) == 4
+    reader.stop()
+
+
+def test_reader_loops():
+    reader = FrameReader(ArraySource(solid_frames(3)), pacing='none',
+                         loop=True)
+    reader.start()
+    item = None
+    while item is None or item[0] < 7:
+        item = reader.wait_for_frame(-1 if item is None else item[0], 5.0)
+        assert item is not None
+    reader.stop()
+    assert reader.count > 3
+
+
+def test_wait_for_frame_timeout_and_stop():
+    reader = FrameReader(ArraySource(solid_frames(1)), pacing='none')
+    seq, frame, capture_time = reader.wait_for_frame(-1, 0)
+    assert seq == 0 and frame is reader.frame
+    assert capture_time <= time.monotonic()
+    start = time.monotonic()
+    assert reader.wait_for_frame(0, 0.05) is None
+    assert time.monotonic() - start >= 0.04
+    result = []
+    waiter = threading.Thread(
+        target=lambda: result.append(reader.wait_for_frame(0)))
+    waiter.start()
+    reader.stop_waiting()
+    waiter.join(1.0)
+    assert not waiter.is_alive()
+    assert result == [None]
+
+
+def test_wait_for_frame_returns_newer_frames(tmp_path):
+    path = str(tmp_path / 'vid.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10.0,
+                             (32, 24))
+    for i in range(6):
+        writer.write(np.full((24, 32, 3), 40 * i, np.uint8))
+    writer.release()
+    reader = FrameReader(open_source(path), pacing='fixed', fps=100.0)
+    reader.start()
+    seqs, values = [], []
+    item = reader.wait_for_frame(-1, 1.0)
+    while item is not None:
+        seq, frame, _ = item
+        seqs.append(seq)
+        values.append(int(round(frame.mean() / 40)))
+        if seq > 0:  # the frames after the first decode into the ring
+            assert not frame.flags.writeable
+        item = reader.wait_for_frame(seq, 1.0)
+    reader.stop()
+    assert seqs == sorted(set(seqs))
+    assert seqs[-1] == 5
+    assert values == seqs
+
+
+class CountingSource(FrameSource):
+    """Endless frames filled with their count, decoded into dst"""
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def read(self, dst=None):
+        self.count += 1
+        if dst is None:
+            dst = np.empty((24, 32, 3), np.uint8)
+        dst[:] = self.count % 256
+        return True, dst, self.count / 30
+
+
+def test_held_frame_is_not_overwritten():
+    reader = FrameReader(CountingSource(), pacing='none')
+    reader.start()
+    seq, frame, _ = reader.wait_for_frame(0, 1.0, hold=True)
+    value = int(frame[0, 0, 0])
+    time.sleep(0.05)
+    # the reader decodes into the other slots, then waits for the held one
+    assert (frame == value).all()
+    count = reader.count
+    time.sleep(0.05)
+    assert reader.count == count
+    assert reader.seq - seq < FrameReader.SLOTS
+    reader.release(seq)
+    reader.release(seq)  # not held anymore, ignored
+    item = reader.wait_for_frame(reader.seq, 1.0)
+    assert item is not None and reader.count > count
+    reader.stop()
+    assert not reader.worker.is_alive()
+
+
+class ReaderDrone(object):
+    def __init__(self, frame_read):
+        self.frame_read = frame_read
+
+    def get_frame_read(self):
+        return self.frame_read
+
+
+def test_tello_source_copies_the_reader_frames():
+    inner = FrameReader(CountingSource(), pacing='none')
+    inner.start()
+    source = TelloSource(ReaderDrone(inner))
+    dst = np.empty((24, 32, 3), np.uint8)
+    ok, frame, _ = source.read(dst)
+    assert ok and frame is dst
+    ok, frame, _ = source.read(np.empty((8, 8, 3), np.uint8))
+    assert ok and frame.shape == (24, 32, 3) and frame.flags.writeable
+    assert inner.held == {}
+    inner.stop()
@@ -0,0 +1,54 @@
+import time
+
+from face_track.telemetry import Telemetry, TelemetrySnapshot
+
+
+class FakeDrone(object):
+    def __init__(self, state):
+        self.state = state
+        self.calls = 0
+        self.error = None
+
+    def get_current_state(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return dict(self.state)
+
+
+def test_first_snapshot_reads_the_state_once():
+    drone = FakeDrone({'bat': '87', 'temph': 61, 'agx': '-3.0', 'tof': 10})
+    telemetry = Telemetry(drone)
+    snapshot = telemetry.snapshot
+    assert drone.calls == 1
+    assert (snapshot.battery, snapshot.temperature, snapshot.tof) == (87, 61, 10)
+    assert (snapshot.agx, snapshot.agy, snapshot.agz) == (-3.0, 0.0, 0.0)
+    assert snapshot.timestamp > 0
+    # readers get the cached snapshot, not the drone state
+    assert telemetry.snapshot is snapshot
+    assert drone.calls == 1
+
+
+def test_refresh_replaces_the_snapshot():
+    drone = FakeDrone({'bat': 50})
+    telemetry = Telemetry(drone)
+    old = telemetry.snapshot
+    drone.state['bat'] = 49
+    assert telemetry.refresh().battery == 49
+    assert telemetry.snapshot is not old
+    assert old.battery == 50
+    assert TelemetrySnapshot().battery == 0
+
+
+def test_refresh_thread_rate_and_errors():
+    drone = FakeDrone({'bat': 50})
+    telemetry = Telemetry(drone, rate=50.0)
+    telemetry.start()
+    time.sleep(0.2)
+    drone.error = IOError('no state')  # logged, the thread keeps running
+    time.sleep(0.1)
+    assert telemetry.worker.is_alive()
+    telemetry.stop()
+    assert not telemetry.worker.is_alive()
+    assert 5 <= drone.calls <= 20
+    assert telemetry.snapshot.battery == 50
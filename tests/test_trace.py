@@ -0,0 +1,64 @@
+import json
+import threading
+
+import pytest
+
+from face_track.trace import Tracer
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer()
+    with tracer.span('detect', 1):
+        pass
+    tracer.add('rc_send', 0.0, 1.0)
+    assert tracer.events == []
+    assert tracer.span('a') is tracer.span('b')  # a shared null span
+
+
+def test_percentiles():
+    tracer = Tracer(enabled=True)
+    for i in range(1, 101):
+        tracer.add('detect', 10.0, 10.0 + i / 1000, i)
+    tracer.add('hud', 0.0, 0.002)
+    summary = tracer.summary()
+    assert summary['detect']['count'] == 100
+    assert summary['detect']['p50'] == pytest.approx(50.5)
+    assert summary['detect']['p95'] == pytest.approx(95.05)
+    assert summary['detect']['p99'] == pytest.approx(99.01)
+    assert summary['hud']['p99'] == pytest.approx(2.0)
+    report = tracer.report().splitlines()
+    assert report[1].split()[:2] == ['detect', '100']
+
+
+def test_max_events():
+    tracer = Tracer(enabled=True, max_events=2)
+    for _ in range(5):
+        with tracer.span('capture'):
+            pass
+    assert len(tracer.events) == 2
+    assert tracer.dropped == 3
+    assert '3 spans dropped' in tracer.report()
+
+
+def test_save_chrome_trace(tmp_path):
+    tracer = Tracer(enabled=True)
+    start = tracer.start_time
+    tracer.add('detect', start + 0.5, start + 0.5125, 7)
+    worker = threading.Thread(target=tracer.add, args=('rc_send', start, start),
+                              name='rc')
+    worker.start()
+    worker.join()
+    path = tmp_path / 'trace.json'
+    tracer.save(str(path))
+    trace = json.loads(path.read_text())
+    assert trace['displayTimeUnit'] == 'ms'
+    names = {e['args']['name']: e['tid']
+             for e in trace['traceEvents'] if e['ph'] == 'M'}
+    assert set(names) == {threading.current_thread().name, 'rc'}
+    spans = [e for e in trace['traceEvents'] if e['ph'] == 'X']
+    assert spans[0] == {
+        'name': 'detect', 'ph': 'X', 'ts': 500000.0, 'dur': 12500.0,
+        'pid': 0, 'tid': names[threading.current_thread().name],
+        'args': {'frame': 7}
+    }
+    assert spans[1]['tid'] == names['rc'] and 'args' not in spans[1]
@@ -0,0 +1,108 @@
+import threading
+
+import numpy as np
+import pytest
+
+from face_track.mockdjitellopy import Tello as MockTello
+from face_track.source import FrameSource
+from face_track.tracker import FaceTracker
+
+
+class GatedSource(FrameSource):
+    """Gray frames, the first one once the gate opens"""
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+        self.count = 0
+
+    def read(self, dst=None):
+        self.gate.wait(5.0)
+        self.count += 1
+        return True, np.full((480, 640, 3), 100, np.uint8), self.count / 30
+
+    def interrupt(self):
+        self.gate.set()
+
+
+class BrokenSource(FrameSource):
+    def read(self, dst=None):
+        raise IOError('no stream')
+
+
+def test_takeoff_does_not_wait_for_the_stream():
+    source = GatedSource()
+    alpha = FaceTracker(drone=MockTello(), source=source, pacing='fixed')
+    try:
+        assert alpha.airborne.wait(5.0)
+        assert not alpha.stream_ready.is_set()
+        assert 'stream' not in alpha.startup
+        assert alpha.getFrameRead(0.01) is None
+        assert alpha.readFrame(0.01) is None
+        source.gate.set()
+        assert alpha.getFrameRead(5.0) is not None
+        img = alpha.readFrame(5.0)
+        assert img.shape == (480, 640, 3) and (img == 100).all()
+        assert alpha.startup['airborne'] < alpha.startup['stream']
+    finally:
+        alpha.end()
+
+
+def test_stream_error_is_raised_by_read_frame():
+    drone = MockTello()
+    alpha = FaceTracker(drone=drone, source=BrokenSource())
+    try:
+        with pytest.raises(IOError):
+            alpha.readFrame(5.0)
+        alpha.stream.join(5.0)
+        assert not alpha.flight.is_alive()
+        # the drone lands, or never took off
+        assert not alpha.airborne.is_set()
+        assert not drone.is_flying
+        assert alpha.rc.stopped.is_set()
+    finally:
+        alpha.end()
+
+
+class FailingSource(GatedSource):
+    """A stream that fails once the gate opens, after the takeoff"""
+    def read(self, dst=None):
+        self.gate.wait(5.0)
+        raise IOError('stream lost')
+
+
+def test_stream_error_after_takeoff_lands():
+    drone = MockTello()
+    source = FailingSource()
+    alpha = FaceTracker(drone=drone, source=source)
+    try:
+        assert alpha.airborne.wait(5.0)
+        assert drone.is_flying
+        source.gate.set()
+        with pytest.raises(IOError):
+            alpha.getFrameRead(5.0)
+        alpha.stream.join(5.0)
+        assert not alpha.airborne.is_set()
+        assert not drone.is_flying
+    finally:
+        alpha.end()
+
+
+def test_controllers_reset_once_after_takeoff():
+    source = GatedSource()
+    source.gate.set()
+    alpha = FaceTracker(drone=MockTello(), source=source)
+    try:
+        assert alpha.airborne.wait(5.0)
+        resets = []
+        alpha.pid.reset = lambda t=None: resets.append(t)
+        alpha.airborne.clear()  # back before the takeoff
+        alpha.tracking = False
+        for _ in range(3):
+            assert alpha.trackFace(((0, 0), 0), 0.0) == (0, 0, 0, 0)
+        assert resets == []
+        alpha.airborne.set()
+        for _ in range(3):
+            alpha.trackFace(((200, 100), 900), 0.0)
+        assert len(resets) == 1 and alpha.tracking
+    finally:
+        alpha.end()
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from face_track import tune
+
+DT = 0.033
+
+
+def synthetic_log(gain=-2.0, tau=0.1, delay=2, steps=1500, seed=0):
+    """A logged axis of the plant model, driven by random rc steps and a slow
+    disturbance"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(steps) * DT
+    rc = np.repeat(rng.integers(-30, 31, steps // 15 + 1), 15)[:steps]
+    rc = rc.astype(np.float64)
+    delayed = np.concatenate((np.zeros(delay), rc[:steps - delay]))
+    lagged = tune.lag(delayed, tau, np.full(steps, DT))
+    disturbance = 5.0 * np.sin(0.3 * t)
+    pv = 240.0 + np.concatenate(
+        ([0.0], np.cumsum(DT * (gain * lagged + disturbance)[1:])))
+    found = np.ones(steps, dtype=bool)
+    return t, pv, rc, found
+
+
+def test_fit_plant_recovers_the_model():
+    plant = tune.fit_plant(*synthetic_log())
+    assert plant.delay == 2
+    assert plant.tau == 0.1
+    assert abs(plant.gain + 2.0) < 0.1
+    assert abs(plant.dt - DT) < 1e-9
+
+
+def test_fit_plant_skips_lost_steps():
+    t, pv, rc, found = synthetic_log()
+    found[100:400] = False
+    pv[100:400] = np.nan
+    plant = tune.fit_plant(t, pv, rc, found)
+    assert abs(plant.gain + 2.0) < 0.2
+    found[:] = False
+    with pytest.raises(ValueError):
+        tune.fit_plant(t, pv, rc, found)
+
+
+def test_gain_grid_is_signed():
+    kP, kI, kD = tune.gain_grid(-1.0, kP=(0.1, 0.2), kI=(0.0, 0.01),
+                                kD=(0.0, ))
+    assert len(kP) == len(kI) == len(kD) == 4
+    assert (kP < 0).all() and (kI <= 0).all()
+
+
+def test_simulate_ranks_a_working_controller_first():
+    plant = tune.Plant(gain=2.0, tau=0.1, delay=2, dt=DT,
+                       disturbance=np.zeros(100), residual=0.0)
+    kP = np.array([0.0, 0.5, 1.0, 3.0])
+    metrics = tune.simulate(plant, 240.0, 30.0, kP, np.zeros(4), np.zeros(4),
+                            step=60.0, horizon=10.0)
+    assert metrics.settling[0] == 10.0  # no control, never settles
+    assert metrics.effort[0] == 0.0
+    assert metrics.settling[2] < metrics.settling[1] < 10.0
+    assert metrics.overshoot[3] > 0.0 and (metrics.overshoot[:3] == 0).all()
+    assert np.argmin(tune.score(metrics, 10.0)) == 2